@@ -1,23 +1,79 @@
 import random as r
+import sys
+from collections import OrderedDict
 
 import Locations
 
+IdDict = dict if sys.version_info >= (3, 7) else OrderedDict
+"""Insertion-ordered dictionary used to index actors by id: plain dicts keep insertion order from Python 3.7 and
+take half the memory of an OrderedDict"""
+
 
 class Bus(object):
+    __slots__ = ("id", "name", "network", "slot", "last_position", "is_at_bus_stop", "probability_of_advancing", "rng",
+                 "passengers", "inspectors", "tricksters")
+
     old_id = 0
 
-    def __init__(self, position, probability_of_advancing):
-        # type: (str, float) -> None
+    def __init__(self, position, probability_of_advancing, rng=r, network=Locations.DEFAULT_NETWORK, slot=None):
+        # type: (str, float, r.Random, Locations.RouteNetwork, int) -> None
+        """
+        Creates a new Bus at the given bus stop
+        :param position: the bus stop where the bus starts
+        :param probability_of_advancing: probability of advancing to the next bus stop at each new turn
+        :param rng: the random number generator used to decide when the bus advances
+        :param network: the network the bus runs on
+        :param slot: the slot of the network where the bus starts (which also sets its line),
+        None for the first slot of the given bus stop
+        """
         self.id = Bus.old_id
         Bus.old_id = Bus.old_id + 1
+        self.name = "Bus %d" % self.id
+        """Name of the bus, shared as position by all of its passengers"""
 
-        self.last_position = position
+        self.network = network
+        self.slot = network.first_slot(position) if slot is None else slot
+        """Slot of the network of the last bus stop visited"""
+        self.last_position = network.slot_location[self.slot]
         """Pointer to the last bus stop visited"""
 
         self.is_at_bus_stop = True
         self.probability_of_advancing = probability_of_advancing
-
-        self.passengers = list()
+        self.rng = rng
+
+        self.passengers = IdDict()
+        """Passengers on board, indexed by their id, in order of boarding"""
+        self.inspectors = IdDict()
+        """Inspectors on board, indexed by their id, in order of boarding"""
+        self.tricksters = IdDict()
+        """Passengers on board without a ticket, indexed by their id, in order of boarding"""
+
+    @classmethod
+    def restore(cls, bus_id, slot, is_at_bus_stop, probability_of_advancing, rng=r,
+                network=Locations.DEFAULT_NETWORK):
+        """
+        Recreates an empty bus from a checkpoint, with its own id: Bus.old_id is not changed
+        :param bus_id: the id of the bus
+        :param slot: the slot of the network of the last bus stop visited
+        :param is_at_bus_stop: whether the bus is at a bus stop
+        :param probability_of_advancing: probability of advancing to the next bus stop at each new turn
+        :param rng: the random number generator used to decide when the bus advances
+        :param network: the network the bus runs on
+        :return: the bus
+        """
+        bus = cls.__new__(cls)
+        bus.id = bus_id
+        bus.name = "Bus %d" % bus_id
+        bus.network = network
+        bus.slot = slot
+        bus.last_position = network.slot_location[slot]
+        bus.is_at_bus_stop = is_at_bus_stop
+        bus.probability_of_advancing = probability_of_advancing
+        bus.rng = rng
+        bus.passengers = IdDict()
+        bus.inspectors = IdDict()
+        bus.tricksters = IdDict()
+        return bus
 
     def __contains__(self, passenger):
         """
@@ -25,60 +81,82 @@ class Bus(object):
         :param passenger: the passenger to check for
         :return: True if the given passenger is on board
         """
-        return passenger in self.passengers
+        return passenger.id in self.passengers
 
     def has_inspector(self):
         """
         Checks if this bus has an inspector on board
         :return: True if this bus has an inspector on board, False otherwise
         """
-        return len(self.get_inspectors()) > 0
+        return len(self.inspectors) > 0
 
     def get_tricksters(self):
         """
         If the bus has some tricksters on board, return them
         :return: tricksters on board
         """
-        return [trickster for trickster in self if not trickster.has_ticket]
+        return list(self.tricksters.values())
 
     def get_inspectors(self):
         """
-        If the bus has some tricksters on board, return them
-        :return: tricksters on board
+        If the bus has some inspectors on board, return them
+        :return: inspectors on board
         """
-        return [inspector for inspector in self if inspector.mark is "T"]
+        return list(self.inspectors.values())
 
-    def should_advance(self):
+    def should_advance(self, draw=None):
         """
         Returns true if the bus should advance to the next bus stop
+        :param draw: a random number in [0, 1) drawn in advance, None to draw it now
         :return: true if the bus has to advance
         """
+        if draw is None:
+            draw = self.rng.random()
 
-        if r.random() <= self.probability_of_advancing:
+        if draw <= self.probability_of_advancing:
             return True
         else:
             return False
 
-    def try_to_advance(self):
+    def try_to_advance(self, draw=None):
         """
         Try to advance with this bus, the Italian way. If the bus is travelling, it won't be at a bus stop.
         If it has arrived somewhere, it will be at the next bus stop from the last position recorded.
         Advancement is random
+        :param draw: a random number in [0, 1) drawn in advance, None to draw it now
         :return:
         """
-        if self.should_advance():
-            self.last_position = Locations.get_next(self.last_position)
-            self.is_at_bus_stop = True
+        if self.should_advance(draw):
+            self.advance()
         else:
             self.is_at_bus_stop = False
 
+    def advance(self):
+        """
+        Moves this bus to the next bus stop of its line, where it will be at a bus stop
+        """
+        self.slot = self.network.slot_next[self.slot]
+        self.last_position = self.network.slot_location[self.slot]
+        self.is_at_bus_stop = True
+
+    def is_at_destination(self):
+        """
+        Checks if the last bus stop visited is a destination of the line of this bus
+        :return: True if the bus is at a destination
+        """
+        return self.network.slot_is_destination[self.slot]
+
     def drop_all_passengers(self, passengers):
         """
         Drops all passengers specified
         :param passengers: list of passengers to drop
         """
         for passenger in passengers:
-            self.passengers.remove(passenger)
+            del self.passengers[passenger.id]
+            if passenger.mark == "T":
+                del self.inspectors[passenger.id]
+            if not passenger.has_ticket:
+                del self.tricksters[passenger.id]
 
     def collect_all_passengers(self, passengers):
         """
@@ -86,14 +164,18 @@ class Bus(object):
         :param passengers: list of passengers to collect
         """
         for p in passengers:
-            self.passengers.append(p)
-            p.position = str(self)
+            self.passengers[p.id] = p
+            if p.mark == "T":
+                self.inspectors[p.id] = p
+            if not p.has_ticket:
+                self.tricksters[p.id] = p
+            p.position = self.name
 
     def __str__(self):
-        return "Bus %d" % self.id
+        return self.name
 
     def __iter__(self):
-        return iter(self.passengers)
+        return iter(self.passengers.values())
 
     def __cmp__(self, other):
         """
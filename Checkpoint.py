@@ -0,0 +1,211 @@
+"""
+Checkpoints of whole simulations, to resume them later or to fork several branches from the same state.
+
+A checkpoint is a single binary file: a header, the scalar state of the simulation as JSON, then the columns of
+numbers of the actors and buses, each one aligned to ALIGNMENT bytes. Columns are memory-mapped when a checkpoint is
+loaded (copy on write), so restoring a ColumnarTransportManagement doesn't read its columns until they are used.
+Checkpoints are meant to be loaded on a machine with the same byte order as the one where they were saved.
+"""
+
+import importlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+import Bus as B
+import Commuter as C
+import Locations
+import RandomStreams as RS
+
+MAGIC = b"COMMCKPT"
+VERSION = 1
+HEADER = struct.Struct("<8sIQ")
+"""Magic bytes, format version and length of the JSON metadata"""
+ALIGNMENT = 64
+
+
+def aligned(offset):
+    # type: (int) -> int
+    """
+    Rounds an offset up to the next multiple of ALIGNMENT
+    :param offset: the offset
+    :return: the aligned offset
+    """
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def rng_state_to_json(state):
+    # type: (dict) -> dict
+    """
+    Converts the state of random number streams (RandomStreams.getstate) into JSON serializable lists
+    :param state: the state of the streams
+    :return: the JSON serializable state
+    """
+    converted = dict()
+    for name, (internal_state, buffer, generator_state) in state.items():
+        if generator_state is not None:
+            generator_state = [generator_state[0], [int(n) for n in generator_state[1]]] + list(generator_state[2:])
+        converted[name] = [[internal_state[0], list(internal_state[1]), internal_state[2]], buffer, generator_state]
+    return converted
+
+
+def rng_state_from_json(converted):
+    # type: (dict) -> dict
+    """
+    Converts back the state of random number streams from rng_state_to_json
+    :param converted: the JSON serializable state
+    :return: the state of the streams, for RandomStreams.setstate
+    """
+    state = dict()
+    for name, (internal_state, buffer, generator_state) in converted.items():
+        internal_state = (internal_state[0], tuple(internal_state[1]), internal_state[2])
+        state[name] = (internal_state, buffer, tuple(generator_state) if generator_state is not None else None)
+    return state
+
+
+def snapshot(simulation):
+    # type: (TransportManagement.TransportManagement) -> tuple
+    """
+    Captures the state of a simulation between two turns in memory, as it is saved in a checkpoint file
+    :type simulation: TransportManagement.TransportManagement
+    :param simulation: the simulation
+    :return: the metadata of the checkpoint (JSON serializable) and its columns of numbers, by name
+    """
+    if not simulation.CHECKPOINTS:
+        raise ValueError("{} doesn't support checkpoints".format(type(simulation).__name__))
+    state, columns = simulation.checkpoint_state()
+    engine = type(simulation)
+    meta = {
+        "engine": "{}.{}".format(engine.__module__, engine.__name__),
+        "parameters": simulation.parameters(),
+        "network": simulation.network.to_dict(),
+        "capture_events": simulation.events.enabled,
+        "state": state,
+        "rng": rng_state_to_json(simulation.rng.getstate()),
+        "ids": {"commuter": C.Commuter.old_id, "bus": B.Bus.old_id},
+        "byteorder": sys.byteorder
+    }
+    return meta, columns
+
+
+def save(simulation, path):
+    """
+    Saves the state of a simulation between two turns into a checkpoint file.
+    The file is written next to its final path and then moved in place, so that an interrupted save never leaves
+    a broken checkpoint behind
+    :type simulation: TransportManagement.TransportManagement
+    :param simulation: the simulation
+    :param path: the path of the checkpoint file
+    """
+    meta, columns = snapshot(simulation)
+    column_views = dict((name, memoryview(column)) for name, column in columns.items())
+    layout = dict()
+    offset = 0
+    for name in sorted(column_views):
+        view = column_views[name]
+        layout[name] = [view.format, view.itemsize, offset, len(view)]
+        offset = aligned(offset + view.nbytes)
+    meta["columns"] = layout
+    meta = json.dumps(meta).encode("utf-8")
+
+    data_start = aligned(HEADER.size + len(meta))
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(meta)))
+        f.write(meta)
+        for name in sorted(column_views):
+            f.seek(data_start + layout[name][2])
+            f.write(column_views[name])
+        f.truncate(data_start + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_path, path)
+
+
+def read(path):
+    # type: (str) -> tuple
+    """
+    Reads a checkpoint file, memory-mapping its columns
+    :param path: the path of the checkpoint file
+    :return: the metadata of the checkpoint and its columns (memoryviews), by name
+    """
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    if len(buffer) < HEADER.size:
+        raise ValueError("{} is not a simulation checkpoint".format(path))
+    magic, version, meta_length = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError("{} is not a simulation checkpoint".format(path))
+    if version != VERSION:
+        raise ValueError("Unsupported checkpoint version {:d} in {}".format(version, path))
+    meta = json.loads(buffer[HEADER.size:HEADER.size + meta_length].decode("utf-8"))
+    if meta["byteorder"] != sys.byteorder:
+        raise ValueError("{} was saved on a {}-endian machine".format(path, meta["byteorder"]))
+
+    data_start = aligned(HEADER.size + meta_length)
+    view = memoryview(buffer)
+    columns = dict()
+    for name, (column_format, itemsize, offset, count) in meta["columns"].items():
+        if struct.calcsize(column_format) != itemsize:
+            raise ValueError("Column {} of {} has items of {:d} bytes, {:d} expected here".format(
+                name, path, itemsize, struct.calcsize(column_format)))
+        start = data_start + offset
+        columns[name] = view[start:start + itemsize * count].cast(column_format)
+    return meta, columns
+
+
+def load(path, seed=None, capture_events=None, profile=False, trip_statistics=False):
+    """
+    Restores a simulation from a checkpoint file, with the same engine it was saved from.
+    Without a seed, the random number streams are restored too and the simulation continues exactly as the saved
+    one would have; with a seed, the simulation continues with new streams, as a new branch from the saved state.
+    The id counters of Commuter and Bus are moved past the ids of the checkpoint, so new actors and buses never
+    reuse them
+    :param path: the path of the checkpoint file
+    :param seed: seed of new random number streams, None to restore the saved ones
+    :param capture_events: whether to record the events of each turn, None to do as the saved simulation
+    :param profile: True to record the time spent in each phase of the turns
+    :param trip_statistics: True to record the travel times of the commuters leaving the simulation from now on
+    :return: the simulation
+    """
+    meta, columns = read(path)
+    return restore(meta, columns, seed, capture_events, profile, trip_statistics)
+
+
+def restore(meta, columns, seed=None, capture_events=None, profile=False, trip_statistics=False):
+    """
+    Restores a simulation from a state captured by snapshot or read from a checkpoint file, see load.
+    The columns are not copied: the columnar engine uses them as they are
+    :param meta: the metadata of the checkpoint
+    :param columns: its columns of numbers, by name
+    :param seed: seed of new random number streams, None to restore the saved ones
+    :param capture_events: whether to record the events of each turn, None to do as the saved simulation
+    :param profile: True to record the time spent in each phase of the turns
+    :param trip_statistics: True to record the travel times of the commuters leaving the simulation from now on
+    :return: the simulation
+    """
+    module_name, class_name = meta["engine"].rsplit(".", 1)
+    engine = getattr(importlib.import_module(module_name), class_name)
+
+    parameters = dict(meta["parameters"])
+    parameters["initial_actors"] = 0
+    parameters["initial_buses"] = 0
+    simulation = engine(
+        rng=RS.RandomStreams(seed),
+        capture_events=meta["capture_events"] if capture_events is None else capture_events,
+        network=Locations.RouteNetwork.from_dict(meta["network"]),
+        profile=profile,
+        trip_statistics=trip_statistics,
+        **parameters
+    )
+    simulation.initial_actors = meta["parameters"]["initial_actors"]
+    simulation.initial_buses = meta["parameters"]["initial_buses"]
+    if seed is None:
+        simulation.rng.setstate(rng_state_from_json(meta["rng"]))
+    simulation.restore_checkpoint_state(meta["state"], columns)
+
+    C.Commuter.old_id = max(C.Commuter.old_id, meta["ids"]["commuter"])
+    B.Bus.old_id = max(B.Bus.old_id, meta["ids"]["bus"])
+    return simulation
@@ -0,0 +1,523 @@
+import numpy as np
+
+import EventLog as EL
+import Profiler as P
+import SimulationListener as SL
+from StatusView import StatusView
+import Commuter as C
+import TicketInspector as T
+import TransportManagement as TM
+
+# Integer codes of the actor marks, as indices in Commuter.MARKS
+MALE = C.Commuter.MARKS.index("M")
+FEMALE = C.Commuter.MARKS.index("F")
+INSPECTOR = C.Commuter.MARKS.index("T")
+
+NOWHERE = -1
+"""Position or bus code of an actor which is not waiting at a bus stop or not on a bus"""
+
+INITIAL_CAPACITY = 1024
+
+# Actor columns and their types
+ACTOR_COLUMNS = (
+    ("id", np.int64),
+    ("travel_time", np.float64),
+    ("has_ticket", np.bool_),
+    ("mark", np.int8),
+    ("hometown", np.int32),
+    ("position", np.int32),
+    ("bus", np.int64),
+    ("boarding", np.int64),
+    ("p_male_trickster_expulsion", np.float64),
+    ("p_female_trickster_expulsion", np.float64),
+)
+
+
+class ColumnarTransportManagement(TM.TransportManagement):
+    """
+    Alternative simulation engine with the same API as TransportManagement, which keeps actors and buses in
+    NumPy arrays (one array per attribute) instead of Commuter, TicketInspector and Bus objects.
+    Aging, patience checks, ticket filtering and per-stop counts are vectorized operations.
+
+    Bus stops are coded as their id in the route network, marks as their index in Commuter.MARKS, and buses keep
+    the slot of the network where they are.
+    An actor waiting at a bus stop has position set to the stop and bus set to NOWHERE, an actor on a bus has
+    bus set to the bus id and position set to NOWHERE, an actor removed from the simulation has both set to
+    NOWHERE until its row is compacted away.
+    Actors don't have names in this engine.
+    """
+
+    CHECKPOINT_FIELDS = TM.TransportManagement.CHECKPOINT_FIELDS + ("size", "next_actor_id", "boardings",
+                                                                   "dead_rows", "next_bus_id")
+    BUS_COLUMNS = ("bus_id", "bus_slot", "bus_at_stop", "bus_riders")
+
+    def __init__(
+            self,
+            max_t=TM.MAX_T,
+            delta_t=TM.DELTA_T,
+            p_inspector=TM.P_INSPECTOR,
+            p_bus_advancement=TM.P_BUS_ADVANCEMENT,
+            initial_actors=TM.INITIAL_ACTORS,
+            initial_buses=TM.INITIAL_BUSES,
+            spawn_delay=TM.SPAWN_DELAY,
+            commuters_rage_threshold=TM.COMMUTERS_RAGE_THRESHOLD,
+            spawn_new_bus_threshold=TM.SPAWN_NEW_BUS_THRESHOLD,
+            seed=None,
+            rng=None,
+            capture_events=True,
+            network=None,
+            profile=False,
+            trip_statistics=False
+    ):
+        """
+        Constructor and setup method, see TransportManagement
+        """
+        super(ColumnarTransportManagement, self).__init__(
+            max_t=max_t,
+            delta_t=delta_t,
+            p_inspector=p_inspector,
+            p_bus_advancement=p_bus_advancement,
+            initial_actors=0,
+            initial_buses=0,
+            spawn_delay=spawn_delay,
+            commuters_rage_threshold=commuters_rage_threshold,
+            spawn_new_bus_threshold=spawn_new_bus_threshold,
+            seed=seed,
+            rng=rng,
+            capture_events=capture_events,
+            network=network,
+            profile=profile,
+            trip_statistics=trip_statistics
+        )
+        self.initial_actors = initial_actors
+        self.initial_buses = initial_buses
+
+        # Actors and buses are not materialised as objects by this engine
+        self.actors = None
+        self.waiting = None
+        self.buses = None
+
+        # NumPy generators seeded by the random number streams of this simulation
+        self.spawning = self.rng.spawning.numpy_generator()
+        self.movement = self.rng.movement.numpy_generator()
+        self.inspection = self.rng.inspection.numpy_generator()
+        self.n_locations = len(self.network.stops)
+        self.sources = np.array([self.network.stop_ids[name] for name in self.network.sources], dtype=np.int32)
+        self.slot_stop = np.array(self.network.slot_stop, dtype=np.int32)
+        self.slot_next = np.array(self.network.slot_next, dtype=np.int64)
+        self.slot_is_destination = np.array(self.network.slot_is_destination, dtype=np.bool_)
+        destinations = sorted(set(self.slot_stop[self.slot_is_destination]))
+        self.destination_name = self.network.stops[destinations[0]] if len(destinations) == 1 \
+            else "their destinations"
+        self.patience = np.array([C.Commuter.PATIENCE, C.Commuter.PATIENCE, T.TicketInspector.MAX_WORKTIME])
+        """Travel time after which an actor wants to drop, indexed by mark"""
+
+        # Actor columns: rows [0, self.size) are in use, in order of creation (and thus of id)
+        self.size = 0
+        self.capacity = max(INITIAL_CAPACITY, self.initial_actors)
+        for name, dtype in ACTOR_COLUMNS:
+            setattr(self, name, np.zeros(self.capacity, dtype=dtype))
+        self.next_actor_id = 0
+        self.boardings = 0
+        """Number of times passengers have been collected, used to keep passengers in order of boarding"""
+        self.waiting_count = np.zeros(self.n_locations, dtype=np.int64)
+        """Number of actors waiting at each bus stop"""
+        self.dead_rows = 0
+
+        # Bus columns, in order of id
+        self.bus_id = np.zeros(0, dtype=np.int64)
+        self.bus_slot = np.zeros(0, dtype=np.int64)
+        self.bus_at_stop = np.zeros(0, dtype=np.bool_)
+        self.bus_riders = np.zeros(0, dtype=np.int64)
+        self.next_bus_id = 0
+
+        # Setup: spawn initial actors (Commuters and Inspectors)
+        self.spawn_actors(self.initial_actors)
+
+        # Setup: spawn initial buses
+        for slot in self.spawning.choice(len(self.slot_stop), self.initial_buses, replace=False):
+            self.spawn_bus(slot)
+
+    def ensure_capacity(self, extra):
+        """
+        Grows the actor columns so that they can hold extra more rows
+        :param extra: number of rows to make room for
+        """
+        needed = self.size + extra
+        if needed <= self.capacity:
+            return
+        self.capacity = max(needed, 2 * self.capacity)
+        for name, dtype in ACTOR_COLUMNS:
+            column = np.zeros(self.capacity, dtype=dtype)
+            column[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, column)
+
+    def compact(self):
+        """
+        Removes the rows of the actors which are not in the simulation anymore, keeping the others in order
+        """
+        keep = np.flatnonzero((self.position[:self.size] != NOWHERE) | (self.bus[:self.size] != NOWHERE))
+        for name, dtype in ACTOR_COLUMNS:
+            column = getattr(self, name)
+            column[:len(keep)] = column[keep]
+        self.size = len(keep)
+        self.dead_rows = 0
+
+    def spawn_actors(self, count):
+        """
+        Creates count new actors at once, each of them can be a Commuter or a Ticket Inspector
+        :param count: number of actors to create
+        :return: the rows of the new actors
+        """
+        self.ensure_capacity(count)
+        rows = np.arange(self.size, self.size + count)
+        is_inspector = self.spawning.random_sample(count) <= self.p_inspector
+        sex = self.spawning.randint(2, size=count)
+        hometown = self.sources[self.spawning.randint(len(self.sources), size=count)]
+
+        self.id[rows] = np.arange(self.next_actor_id, self.next_actor_id + count)
+        self.travel_time[rows] = 0
+        self.has_ticket[rows] = is_inspector | (self.spawning.random_sample(count) <= C.Commuter.P_HAS_TICKET)
+        self.mark[rows] = np.where(is_inspector, INSPECTOR, sex)
+        self.hometown[rows] = hometown
+        self.position[rows] = hometown
+        self.bus[rows] = NOWHERE
+        self.boarding[rows] = 0
+        self.p_male_trickster_expulsion[rows] = np.where(is_inspector, self.spawning.random_sample(count), 0)
+        self.p_female_trickster_expulsion[rows] = np.where(is_inspector, self.spawning.random_sample(count), 0)
+
+        self.size = self.size + count
+        self.next_actor_id = self.next_actor_id + count
+        self.waiting_count += np.bincount(hometown, minlength=self.n_locations)
+        self.commuters_count = self.commuters_count + int(count - np.count_nonzero(is_inspector))
+        self.last_spawn_time = self.global_time
+        return rows
+
+    def spawn_actor(self):
+        # type: () -> int
+        """
+        Create a new actor, which can be a Commuter or a Ticket Inspector
+        :return the row of the new actor
+        """
+        return self.spawn_actors(1)[0]
+
+    def spawn_bus(self, slot):
+        """
+        Create a new bus, spawning it at the specified slot of the network
+        :param slot: the slot where to spawn the new bus
+        """
+        self.bus_id = np.append(self.bus_id, self.next_bus_id)
+        self.bus_slot = np.append(self.bus_slot, slot)
+        self.bus_at_stop = np.append(self.bus_at_stop, True)
+        self.bus_riders = np.append(self.bus_riders, 0)
+        self.next_bus_id = self.next_bus_id + 1
+
+    def remove_actors(self, rows, reason):
+        """
+        Removes the actors in the given rows from the simulation
+        :param rows: the rows of the actors to remove
+        :param reason: why they are removed, one of the reasons in SimulationListener
+        """
+        if len(rows) == 0:
+            return
+        if self.trips.enabled:
+            commuters = rows[self.mark[rows] != INSPECTOR]
+            stops = self.network.stops
+            self.trips.record_values(reason, [stops[h] for h in self.hometown[commuters].tolist()],
+                                     self.travel_time[commuters].tolist())
+        on_bus = self.bus[rows]
+        on_bus = on_bus[on_bus != NOWHERE]
+        if len(on_bus) > 0:
+            buses, counts = np.unique(on_bus, return_counts=True)
+            self.bus_riders[np.searchsorted(self.bus_id, buses)] -= counts
+        waiting = self.position[rows]
+        waiting = waiting[waiting != NOWHERE]
+        if len(waiting) > 0:
+            self.waiting_count -= np.bincount(waiting, minlength=self.n_locations)
+
+        self.commuters_count = self.commuters_count - int(np.count_nonzero(self.mark[rows] != INSPECTOR))
+        self.profiler.count(P.REMOVALS, len(rows))
+        self.position[rows] = NOWHERE
+        self.bus[rows] = NOWHERE
+        self.dead_rows = self.dead_rows + len(rows)
+
+    def destroy_bus(self, index):
+        """
+        Destroys the bus at the specified index, removing it and all of its passengers from the simulation
+        :param index: the index of the bus to destroy in the bus columns
+        """
+        self.remove_actors(np.flatnonzero(self.bus[:self.size] == self.bus_id[index]), SL.RIOT)
+        self.bus_id = np.delete(self.bus_id, index)
+        self.bus_slot = np.delete(self.bus_slot, index)
+        self.bus_at_stop = np.delete(self.bus_at_stop, index)
+        self.bus_riders = np.delete(self.bus_riders, index)
+
+    def inspect(self, passengers):
+        """
+        Lets the inspectors among the passengers of a bus check the tricksters, in order of boarding.
+        Each inspector checks the tricksters not expelled yet and stops after the first expulsion
+        :param passengers: rows of the passengers of a bus, in order of boarding
+        :return: the rows of the expelled tricksters
+        """
+        inspectors = passengers[self.mark[passengers] == INSPECTOR]
+        tricksters = passengers[~self.has_ticket[passengers]]
+        if len(inspectors) == 0 or len(tricksters) == 0:
+            return tricksters[:0]
+
+        # Checks are independent, so the first male and the first female trickster an inspector would expel
+        # among the ones still on board are geometrically distributed: the inspector expels the earlier of the two
+        males = np.flatnonzero(self.mark[tricksters] == MALE).tolist()
+        females = np.flatnonzero(self.mark[tricksters] != MALE).tolist()
+        first_male = self.first_successes(self.p_male_trickster_expulsion[inspectors]).tolist()
+        first_female = self.first_successes(self.p_female_trickster_expulsion[inspectors]).tolist()
+
+        expelled = list()
+        for i in range(len(inspectors)):
+            male = males[first_male[i]] if first_male[i] < len(males) else len(tricksters)
+            female = females[first_female[i]] if first_female[i] < len(females) else len(tricksters)
+            if male < female:
+                expelled.append(males.pop(first_male[i]))
+            elif female < male:
+                expelled.append(females.pop(first_female[i]))
+        return tricksters[sorted(expelled)]
+
+    def first_successes(self, probabilities):
+        """
+        Draws the number of failed trials before the first success, for trials with the given probabilities
+        :param probabilities: the probability of success of each trial
+        :return: the number of failures before the first success, or the maximum int64 value if there is none
+        """
+        failures = np.full(len(probabilities), np.iinfo(np.int64).max, dtype=np.int64)
+        possible = probabilities > 0
+        failures[possible] = self.inspection.geometric(probabilities[possible]) - 1
+        return failures
+
+    def process_turn(self):
+        """
+        Analyzes the current situation and updates data structures.
+        Also records the events of the turn.
+        """
+
+        # Resetting events
+        events = self.events
+        events.clear()
+        time = self.global_time
+        profiler = self.profiler
+        profiler.start()
+
+        # Eventually spawning a new actor
+        if (self.global_time - self.last_spawn_time) >= self.spawn_delay:
+            row = self.spawn_actor()
+            events.record(EL.UNNAMED_SPAWNED, time, value=(C.Commuter.MARKS[self.mark[row]], int(self.id[row]),
+                                                          self.network.stops[self.hometown[row]]))
+        profiler.lap(P.SPAWN)
+
+        # Group passengers by bus (in order of boarding) and waiting actors by bus stop (in order of arrival)
+        size = self.size
+        aboard = np.flatnonzero(self.bus[:size] != NOWHERE)
+        aboard = aboard[np.lexsort((aboard, self.boarding[aboard], self.bus[aboard]))]
+        aboard_bus = self.bus[aboard]
+        waiting = np.flatnonzero(self.position[:size] != NOWHERE)
+        waiting = waiting[np.argsort(self.position[waiting], kind="stable")]
+        waiting_bounds = np.searchsorted(self.position[waiting], np.arange(self.n_locations + 1))
+        collected_stops = np.zeros(self.n_locations, dtype=np.bool_)
+        profiler.count(P.ACTORS_SCANNED, size)
+        profiler.lap(P.ARRIVALS)
+
+        delivered = expelled = collected = tired = 0
+        for index in np.flatnonzero(self.bus_at_stop):
+            bus_id = self.bus_id[index]
+            stop = self.slot_stop[self.bus_slot[index]]
+            passengers = aboard[np.searchsorted(aboard_bus, bus_id):np.searchsorted(aboard_bus, bus_id, "right")]
+
+            # Drop all commuters on a bus at the destination
+            if self.slot_is_destination[self.bus_slot[index]]:
+                to_drop = passengers[self.mark[passengers] != INSPECTOR]
+                self.remove_actors(to_drop, SL.DELIVERED)
+                delivered = delivered + len(to_drop)
+                self.delivered_travel_time = self.delivered_travel_time + self.travel_time[to_drop].sum()
+                profiler.count(P.PASSENGERS_MOVED, len(to_drop))
+                profiler.lap(P.FINAL_STOP)
+                continue
+
+            # Inspectors on board check the tricksters
+            to_expel = self.inspect(passengers)
+            if len(to_expel) > 0:
+                self.remove_actors(to_expel, SL.EXPELLED)
+                passengers = passengers[self.bus[passengers] != NOWHERE]
+                expelled = expelled + len(to_expel)
+            profiler.lap(P.INSPECTION)
+
+            # Collect new passengers from the bus stop
+            if not collected_stops[stop]:
+                collected_stops[stop] = True
+                to_collect = waiting[waiting_bounds[stop]:waiting_bounds[stop + 1]]
+                self.boardings = self.boardings + 1
+                self.position[to_collect] = NOWHERE
+                self.bus[to_collect] = bus_id
+                self.boarding[to_collect] = self.boardings
+                self.waiting_count[stop] = 0
+                self.bus_riders[index] += len(to_collect)
+                passengers = np.concatenate((passengers, to_collect))
+                collected = collected + len(to_collect)
+                profiler.count(P.PASSENGERS_MOVED, len(to_collect))
+            profiler.lap(P.COLLECTION)
+
+            # Tired passengers and inspectors who have finished their job should be dropped right away
+            to_drop = passengers[self.travel_time[passengers] >= self.patience[self.mark[passengers]]]
+            self.remove_actors(to_drop, SL.TIRED)
+            tired = tired + len(to_drop)
+            profiler.count(P.ACTORS_SCANNED, len(passengers))
+            profiler.count(P.PASSENGERS_MOVED, len(to_drop))
+            profiler.lap(P.TIRED)
+
+        self.delivered = self.delivered + delivered
+        self.expelled = self.expelled + expelled
+        self.tired = self.tired + tired
+        if delivered + expelled + collected + tired > 0:
+            events.record(EL.TURN_SUMMARY, time, value=(delivered, expelled, collected, tired,
+                                                        self.destination_name))
+
+        # Commuters' Rage Event: too many commuters on a bus
+        buses_to_destroy = np.flatnonzero(self.bus_riders > self.commuters_rage_threshold)
+        for index in buses_to_destroy:
+            events.record(EL.RIOT, time, int(self.bus_id[index]), value=int(self.bus_riders[index]))
+        for index in buses_to_destroy[::-1]:
+            self.destroy_bus(index)
+        self.riots = self.riots + len(buses_to_destroy)
+        profiler.lap(P.RIOTS)
+
+        # Spawn new bus: too many commuters at a bus stop
+        crowded = np.flatnonzero(self.waiting_count > self.spawn_new_bus_threshold)
+        if len(crowded) > 0:
+            bus_stop = self.network.stops[crowded[0]]
+            slot = self.network.line_start(bus_stop)
+            events.record(EL.BUS_SENT, time, value=(bus_stop, self.network.slot_location[slot]))
+            self.spawn_bus(slot)
+            self.buses_spawned = self.buses_spawned + 1
+        profiler.lap(P.BUS_SPAWN)
+
+    def step_forward(self):
+        """
+        Steps forward in the simulation: buses and global time will advance, actors will age by delta T.
+        If the simulation has to stop, the self.simulation_on is set to False
+        """
+        profiler = self.profiler
+        profiler.start()
+
+        # After dropping passengers and collecting new passengers, all buses must try to advance
+        self.bus_at_stop = self.movement.random_sample(len(self.bus_id)) <= self.p_bus_advancement
+        self.bus_slot[self.bus_at_stop] = self.slot_next[self.bus_slot[self.bus_at_stop]]
+        profiler.lap(P.MOVEMENT)
+
+        # Increase simulation time
+        self.global_time = self.global_time + self.delta_t
+        # Age actors
+        self.travel_time[:self.size] += self.delta_t
+        profiler.count(P.ACTORS_SCANNED, self.size)
+
+        # Get rid of the rows of removed actors once they are the majority
+        if 2 * self.dead_rows > self.size:
+            self.compact()
+        profiler.lap(P.AGING)
+
+        self.check_termination()
+        profiler.lap(P.TERMINATION)
+
+        for listener in self.listeners:
+            listener.turn_ended(self)
+        profiler.lap(P.LISTENERS)
+        profiler.turn_ended()
+
+    def metrics(self):
+        """
+        Aggregates the current state of the simulation, see TransportManagement.metrics
+        :return: the aggregates, by name
+        """
+        alive = np.flatnonzero((self.position[:self.size] != NOWHERE) | (self.bus[:self.size] != NOWHERE))
+        travel_time = self.travel_time[alive]
+        riding = alive[self.bus[alive] != NOWHERE]
+        return {
+            "waiting": self.waiting_count.tolist(),
+            "riders": self.bus_riders.tolist(),
+            "tricksters": int(np.count_nonzero(~self.has_ticket[riding])),
+            "actors": len(alive),
+            "mean_travel_time": float(travel_time.mean()) if len(alive) > 0 else None,
+            "max_travel_time": float(travel_time.max()) if len(alive) > 0 else None
+        }
+
+    def live_metrics(self):
+        """
+        Counts what is shown by the live metrics, see TransportManagement.live_metrics
+        :return: the counts, by name
+        """
+        riding = self.bus[:self.size] != NOWHERE
+        return {
+            "waiting": self.waiting_count.tolist(),
+            "riders": self.bus_riders.tolist(),
+            "tricksters": int(np.count_nonzero(riding & ~self.has_ticket[:self.size])),
+            "inspectors": self.size - self.dead_rows - self.commuters_count
+        }
+
+    def checkpoint_state(self):
+        """
+        Captures the state of the simulation between two turns, see TransportManagement.checkpoint_state.
+        The columns in use are saved as they are
+        :return: the scalar state (JSON serializable) and the columns (NumPy arrays), by name
+        """
+        state = dict((field, getattr(self, field)) for field in self.CHECKPOINT_FIELDS)
+        state["end_strings"] = list(self.end_strings)
+        columns = dict(("actor_" + name, getattr(self, name)[:self.size]) for name, dtype in ACTOR_COLUMNS)
+        for name in self.BUS_COLUMNS + ("waiting_count",):
+            columns[name] = getattr(self, name)
+        return state, columns
+
+    def restore_checkpoint_state(self, state, columns):
+        """
+        Replaces the state of the simulation with a state captured by checkpoint_state.
+        The columns are used as they are, without copying them, so they can be memory-mapped
+        :param state: the scalar state
+        :param columns: the columns (buffers), by name
+        """
+        for field in self.CHECKPOINT_FIELDS:
+            setattr(self, field, state[field])
+        self.end_strings = list(state["end_strings"])
+        for name, dtype in ACTOR_COLUMNS:
+            setattr(self, name, np.asarray(columns["actor_" + name]).view(dtype))
+        self.capacity = self.size
+        for name in self.BUS_COLUMNS + ("waiting_count",):
+            setattr(self, name, np.asarray(columns[name]))
+        self.events.clear()
+
+    def status_table(self, limit=None, offset=0):
+        """
+        Generates the tables displaying the number of actors waiting at each bus stop and information about buses
+        :param limit: maximum number of buses to display, None to display all of them
+        :param offset: number of buses to skip, in order of id
+        :return: the tables displaying information about bus stops and bus status
+        """
+        from prettytable import PrettyTable
+        stops_table = PrettyTable()
+        stops_table.field_names = ["Bus stop", "Waiting"]
+        for location, count in zip(self.network.stops, self.waiting_count):
+            stops_table.add_row([location, count])
+
+        # Count tricksters and inspectors on each bus
+        aboard = np.flatnonzero(self.bus[:self.size] != NOWHERE)
+        bus_index = np.searchsorted(self.bus_id, self.bus[aboard])
+        tricksters = np.bincount(bus_index, weights=~self.has_ticket[aboard], minlength=len(self.bus_id))
+        inspectors = np.bincount(bus_index, weights=self.mark[aboard] == INSPECTOR, minlength=len(self.bus_id))
+
+        buses_table = PrettyTable()
+        buses_table.field_names = ["Id", "Last recorded position", "Is at a bus stop",
+                                   "Passengers", "Tricksters", "Inspectors"]
+        shown = range(len(self.bus_id))[offset:None if limit is None else offset + limit]
+        for i in shown:
+            buses_table.add_row([self.bus_id[i], self.network.slot_location[self.bus_slot[i]], self.bus_at_stop[i],
+                                 self.bus_riders[i], int(tricksters[i]), int(inspectors[i])])
+
+        out = "\nSITUATION AT TIME {}".format(self.global_time) + "\nBus stops:\n" + str(
+            stops_table) + "\nBuses:\n" + str(buses_table) + \
+            StatusView.page_footer(len(shown), offset, len(self.bus_id), "buses")
+
+        return out
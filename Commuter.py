@@ -3,6 +3,10 @@ import Locations
 
 
 class Commuter(object):
+    __slots__ = ("id", "sex", "mark", "name", "hometown", "position", "has_ticket", "travel_time")
+    """Commuters have no per-instance __dict__: names, marks and locations are references to the shared strings
+    in MALE_NAMES, FEMALE_NAMES, MARKS and Locations.LOCATIONS"""
+
     old_id = 0
     MALE_NAMES = ("Derek", "Franz", "Pablo", "Andrea", "Jacob", "Ayeye Brazov", "Natale", "Carlo", "Marcello")
     FEMALE_NAMES = ("Tina", "Dana", "Consuelo", "Dominica", "Aurora", "Paola", "Deana", "Masha", "Sandra")
@@ -11,42 +15,75 @@ class Commuter(object):
     P_MALE = 0.5
     PATIENCE = 60
 
-    def __init__(self):
+    def __init__(self, rng=r, network=Locations.DEFAULT_NETWORK):
+        """
+        Creates a new Commuter with random attributes
+        :param rng: the random number generator to use
+        :param network: the network of bus stops where the commuter can start
+        """
         self.id = Commuter.old_id
         Commuter.old_id = Commuter.old_id + 1
 
-        self.sex = self.generate_sex()
+        self.sex = self.generate_sex(rng)
         self.mark = Commuter.MARKS[self.sex]
-        self.name = self.generate_name()
+        self.name = self.generate_name(rng)
 
-        self.hometown = Locations.get_random_source()
+        self.hometown = Locations.get_random_source(rng, network)
         self.position = self.hometown
-        self.has_ticket = self.generate_ticket()
+        self.has_ticket = self.generate_ticket(rng)
         self.travel_time = 0
 
-    def generate_name(self):
+    @classmethod
+    def restore(cls, actor_id, sex, name, hometown, position, has_ticket, travel_time):
+        """
+        Builds a Commuter with the given attributes and id, to restore a checkpoint or to spawn actors in bulk:
+        Commuter.old_id is not changed
+        :param actor_id: the id of the commuter
+        :param sex: the sex of the commuter
+        :param name: the name of the commuter
+        :param hometown: the bus stop where the commuter started
+        :param position: the bus stop where the commuter is waiting, or the name of the bus the commuter is on
+        :param has_ticket: whether the commuter has a valid ticket
+        :param travel_time: the travel time of the commuter
+        :return: the commuter
+        """
+        commuter = cls.__new__(cls)
+        commuter.id = actor_id
+        commuter.sex = sex
+        commuter.mark = Commuter.MARKS[sex]
+        commuter.name = name
+        commuter.hometown = hometown
+        commuter.position = position
+        commuter.has_ticket = has_ticket
+        commuter.travel_time = travel_time
+        return commuter
+
+    def generate_name(self, rng=r):
         """
         Generate a random name for a Commuter
+        :param rng: the random number generator to use
         :return: a randomly generated commuter name
         """
-        if self.sex is 0:
-            return Commuter.MALE_NAMES[r.randrange(len(Commuter.MALE_NAMES))]
+        if self.sex == 0:
+            return Commuter.MALE_NAMES[rng.randrange(len(Commuter.MALE_NAMES))]
         else:
-            return Commuter.FEMALE_NAMES[r.randrange(len(Commuter.FEMALE_NAMES))]
+            return Commuter.FEMALE_NAMES[rng.randrange(len(Commuter.FEMALE_NAMES))]
 
-    def generate_sex(self):
+    def generate_sex(self, rng=r):
         """
         Generate a random sex for a Commuter
+        :param rng: the random number generator to use
         :return: a randomly generated Commuter sex
         """
-        return r.randrange(2)
+        return rng.randrange(2)
 
-    def generate_ticket(self):
+    def generate_ticket(self, rng=r):
         """
         Generate a random ticket for a Commuter (valid or not valid)
+        :param rng: the random number generator to use
         :return: a randomly generated ticket for a Commuter
         """
-        return r.random() <= Commuter.P_HAS_TICKET
+        return rng.random() <= Commuter.P_HAS_TICKET
 
     def age(self, time):
         """
@@ -68,9 +105,9 @@ class Commuter(object):
         Generates the correct possessive adjective for this Commuter
         :return: the possessive adjective string
         """
-        if self.mark is "M":
+        if self.mark == "M":
             return "his"
-        if self.mark is "F":
+        if self.mark == "F":
             return "her"
         else:
             return "their"
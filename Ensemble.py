@@ -0,0 +1,227 @@
+import math
+import multiprocessing
+import os
+import random as R
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import TransportManagement as TM
+import TripStatistics as TS
+
+STATISTICS = ("delivered", "expelled", "tired", "riots", "buses_spawned", "mean_travel_time", "turns")
+"""Per-replica statistics merged by an ensemble"""
+
+ENGINES = ("objects", "columnar", "events")
+
+_template = None
+"""Template cloned by the replicas run in this worker process, see run_ensemble"""
+
+
+def replica_seed(base_seed, replica):
+    # type: (int, int) -> int
+    """
+    Derives the seed of a replica from the seed of its ensemble, so that every replica gets the same seed no matter
+    which process runs it
+    :param base_seed: the seed of the ensemble
+    :param replica: the index of the replica in the ensemble
+    :return: the seed of the replica
+    """
+    return R.Random("{:d}/{:d}".format(base_seed, replica)).getrandbits(32)
+
+
+def make_simulation(seed, parameters, engine="objects"):
+    """
+    Creates a simulation seeded with the given seed
+    :param seed: the seed of the simulation
+    :param parameters: keyword arguments for the simulation constructor
+    :param engine: "objects" for TransportManagement, "columnar" for ColumnarTransportManagement,
+    "events" for EventDrivenTransportManagement
+    :return: the new simulation
+    """
+    if engine == "columnar":
+        import ColumnarEngine
+        return ColumnarEngine.ColumnarTransportManagement(seed=seed, **parameters)
+    elif engine == "events":
+        import EventEngine
+        return EventEngine.EventDrivenTransportManagement(seed=seed, **parameters)
+    elif engine == "objects":
+        return TM.TransportManagement(seed=seed, **parameters)
+    else:
+        raise ValueError("Unknown engine {!r}, expected one of {}".format(engine, ENGINES))
+
+
+def run_replica(seed, parameters, engine="objects", max_turns=None):
+    # type: (int, dict, str, int) -> dict
+    """
+    Runs a whole simulation headlessly and summarizes its outcome
+    :param seed: the seed of the simulation
+    :param parameters: keyword arguments for the simulation constructor
+    :param engine: "objects", "columnar" or "events", see make_simulation
+    :param max_turns: maximum number of turns to run, None to run until the simulation ends
+    :return: the summary of the simulation, with the number of turns that have been run, and its trip statistics
+    (see TripStatistics.TripStatistics.to_dict) if they are turned on in the parameters
+    """
+    return summarize(make_simulation(seed, parameters, engine), seed, max_turns)
+
+
+def run_template_replica(template, seed, max_turns=None, trip_statistics=False):
+    # type: (Template.SimulationTemplate, int, int, bool) -> dict
+    """
+    Runs a clone of a template headlessly and summarizes its outcome, see run_replica
+    :param template: the template
+    :param seed: the seed of the random number streams of the clone
+    :param max_turns: maximum number of turns to run, None to run until the simulation ends
+    :param trip_statistics: True to record the travel times of the commuters leaving the clone
+    :return: the summary of the simulation
+    """
+    return summarize(template.clone(seed, capture_events=False, trip_statistics=trip_statistics), seed, max_turns)
+
+
+def summarize(simulation, seed, max_turns=None):
+    # type: (TM.TransportManagement, int, int) -> dict
+    """
+    Runs a simulation headlessly and summarizes its outcome
+    :param simulation: the simulation
+    :param seed: the seed of the simulation, recorded in the summary
+    :param max_turns: maximum number of turns to run, None to run until the simulation ends
+    :return: the summary of the simulation, see run_replica
+    """
+    turns = simulation.run(max_turns)
+    summary = simulation.summary()
+    summary["turns"] = turns
+    summary["seed"] = seed
+    if simulation.trips.enabled:
+        summary["trip_statistics"] = simulation.trips.to_dict()
+    return summary
+
+
+def _run_replica_arguments(arguments):
+    return run_replica(*arguments)
+
+
+def _install_template(template):
+    global _template
+    _template = template
+
+
+def _run_template_replica_arguments(arguments):
+    return run_template_replica(_template, *arguments)
+
+
+class EnsembleResult(object):
+    def __init__(self, summaries, confidence=0.95):
+        """
+        Merged results of the replicas of an ensemble
+        :param summaries: the summaries of the replicas, in order of replica index
+        :param confidence: confidence level of the intervals
+        """
+        self.summaries = summaries
+        self.confidence = confidence
+
+    def __len__(self):
+        return len(self.summaries)
+
+    def values(self, statistic):
+        """
+        Collects the values of a statistic over all replicas, skipping the replicas where it is not defined
+        :param statistic: the name of the statistic
+        :return: the list of values of the statistic
+        """
+        return [s[statistic] for s in self.summaries if s[statistic] is not None]
+
+    def mean(self, statistic):
+        # type: (str) -> float
+        """
+        Computes the mean of a statistic over all replicas
+        :param statistic: the name of the statistic
+        :return: the mean of the statistic, NaN if it is not defined in any replica
+        """
+        values = self.values(statistic)
+        return float(sum(values)) / len(values) if values else float("nan")
+
+    def confidence_interval(self, statistic):
+        # type: (str) -> tuple
+        """
+        Computes the normal confidence interval for the mean of a statistic over all replicas
+        :param statistic: the name of the statistic
+        :return: the lower and upper bound of the interval
+        """
+        values = self.values(statistic)
+        mean = self.mean(statistic)
+        if len(values) < 2:
+            return mean, mean
+        variance = sum((v - mean) ** 2 for v in values) / (len(values) - 1)
+        half_width = NormalDist().inv_cdf(0.5 + self.confidence / 2) * math.sqrt(variance / len(values))
+        return mean - half_width, mean + half_width
+
+    def trip_statistics(self):
+        # type: () -> TS.TripStatistics
+        """
+        Merges the trip statistics of all replicas, recorded if the ensemble was run with trip_statistics=True
+        :return: the statistics of the trips of all replicas, None if they were not recorded
+        """
+        merged = None
+        for summary in self.summaries:
+            if "trip_statistics" in summary:
+                trips = TS.TripStatistics.from_dict(summary["trip_statistics"])
+                if merged is None:
+                    merged = trips
+                else:
+                    merged.merge(trips)
+        return merged
+
+    def report(self):
+        # type: () -> dict
+        """
+        Merges the statistics of all replicas
+        :return: a dictionary with the mean and confidence interval of each statistic
+        """
+        return dict((statistic, {"mean": self.mean(statistic), "interval": self.confidence_interval(statistic)})
+                    for statistic in STATISTICS)
+
+    def __str__(self):
+        lines = ["{:d} replicas, {:.0%} confidence intervals:".format(len(self), self.confidence)]
+        for statistic in STATISTICS:
+            low, high = self.confidence_interval(statistic)
+            lines.append("{:>16}: {:10.3f}  [{:.3f}, {:.3f}]".format(statistic, self.mean(statistic), low, high))
+        return "\n".join(lines)
+
+
+def run_ensemble(replicas, base_seed=0, workers=None, engine="objects", max_turns=None, confidence=0.95,
+                 template=None, **parameters):
+    # type: (...) -> EnsembleResult
+    """
+    Runs independent replicas of the same simulation on a pool of processes and merges their outcomes.
+    With a template, the replicas are clones of it, reseeded with their own seed: they all start from the state
+    of the template, initial population included, instead of being set up from scratch. The template is handed
+    to each worker process once, when it starts (copy on write, where processes are forked)
+    :param replicas: number of replicas to run
+    :param base_seed: seed of the ensemble, from which the seed of each replica is derived
+    :param workers: number of worker processes, None for one per CPU
+    :param engine: "objects", "columnar" or "events", see make_simulation
+    :param max_turns: maximum number of turns of each replica, None to run them until they end
+    :param confidence: confidence level of the intervals
+    :param template: the template to clone (Template.SimulationTemplate), None to create every replica from the
+    parameters
+    :param parameters: keyword arguments for the simulation constructor; with a template, only trip_statistics
+    :return: the merged results
+    """
+    seeds = [replica_seed(base_seed, i) for i in range(replicas)]
+    chunk_size = max(1, replicas // (4 * (workers or os.cpu_count() or 1)))
+    if template is None:
+        arguments = [(seed, parameters, engine, max_turns) for seed in seeds]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            summaries = list(executor.map(_run_replica_arguments, arguments, chunksize=chunk_size))
+        return EnsembleResult(summaries, confidence)
+
+    unknown = set(parameters) - {"trip_statistics"}
+    if unknown:
+        raise ValueError("Replicas of a template have its parameters, {} can't be changed".format(
+            ", ".join(sorted(unknown))))
+    trip_statistics = parameters.get("trip_statistics", False)
+    arguments = [(seed, max_turns, trip_statistics) for seed in seeds]
+    context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_install_template,
+                             initargs=(template,)) as executor:
+        summaries = list(executor.map(_run_template_replica_arguments, arguments, chunksize=chunk_size))
+    return EnsembleResult(summaries, confidence)
@@ -0,0 +1,302 @@
+import array
+import heapq
+import math
+
+import Commuter as C
+import Profiler as P
+import TicketInspector as T
+import TransportManagement as TM
+
+
+class EventDrivenTransportManagement(TM.TransportManagement):
+    """
+    Alternative simulation engine with the same API as TransportManagement, which jumps from event to event instead
+    of ticking every delta_t.
+    Time still moves on the grid of the ticks of TransportManagement, but a tick is only processed if something can
+    happen in it: a bus arrives at a bus stop, an actor spawns, a bus stop is crowded or the simulation ends.
+    - Bus arrivals are kept in a priority queue: after leaving a bus stop, the number of ticks a bus takes to reach
+      the next one is drawn at once from the geometric distribution of its advancement probability.
+    - Actors are not aged every tick: their travel time is computed from their spawn time when they leave the
+      simulation, or when the status table is generated.
+    - Every bus keeps a priority queue of the times when its passengers get tired (Commuter.PATIENCE) or its
+      inspectors finish their job (TicketInspector.MAX_WORKTIME), so that only the expired ones are checked.
+    Outcomes are statistically the same as the ones of TransportManagement, but random draws are not, so the same
+    seed gives different simulations.
+    Turns count simulation ticks, including the skipped ones.
+    """
+
+    CHECKPOINT_FIELDS = TM.TransportManagement.CHECKPOINT_FIELDS + ("tick", "next_spawn_tick")
+
+    def __init__(
+            self,
+            max_t=TM.MAX_T,
+            delta_t=TM.DELTA_T,
+            p_inspector=TM.P_INSPECTOR,
+            p_bus_advancement=TM.P_BUS_ADVANCEMENT,
+            initial_actors=TM.INITIAL_ACTORS,
+            initial_buses=TM.INITIAL_BUSES,
+            spawn_delay=TM.SPAWN_DELAY,
+            commuters_rage_threshold=TM.COMMUTERS_RAGE_THRESHOLD,
+            spawn_new_bus_threshold=TM.SPAWN_NEW_BUS_THRESHOLD,
+            seed=None,
+            rng=None,
+            capture_events=True,
+            network=None,
+            profile=False,
+            trip_statistics=False
+    ):
+        """
+        Constructor and setup method, see TransportManagement
+        """
+        # Event queues, needed by the setup of TransportManagement
+        self.tick = 0
+        """Number of ticks of delta_t since the beginning of the simulation"""
+        self.arrivals = list()
+        """Priority queue of the next arrival of each bus at a bus stop, as (tick, bus id, bus, advance) entries"""
+        self.departing = list()
+        """Buses which left a bus stop (or were spawned) in the current turn, waiting for their next arrival"""
+        self.expiries = dict()
+        """Priority queue of each bus, by bus id, of the times when its passengers want to drop, as (time,
+        passenger id, passenger) entries. Entries of passengers which already left the bus are skipped"""
+        self.spawn_times = dict()
+        """Time when each actor in the simulation was spawned, by actor id"""
+        self.horizon_tick = None
+        """Tick where a run has to stop, None if there is no limit"""
+
+        super(EventDrivenTransportManagement, self).__init__(
+            max_t=max_t,
+            delta_t=delta_t,
+            p_inspector=p_inspector,
+            p_bus_advancement=p_bus_advancement,
+            initial_actors=initial_actors,
+            initial_buses=initial_buses,
+            spawn_delay=spawn_delay,
+            commuters_rage_threshold=commuters_rage_threshold,
+            spawn_new_bus_threshold=spawn_new_bus_threshold,
+            seed=seed,
+            rng=rng,
+            capture_events=capture_events,
+            network=network,
+            profile=profile,
+            trip_statistics=trip_statistics
+        )
+
+        self.spawn_ticks = max(1, int(math.ceil(float(spawn_delay) / delta_t)))
+        """Number of ticks between actor spawn events"""
+        self.next_spawn_tick = self.spawn_ticks
+        self.timeout_tick = int(math.floor(float(max_t) / delta_t)) + 1
+        """First tick after max_t"""
+
+        # Initial buses are at a bus stop in the first turn
+        for bus in self.departing:
+            heapq.heappush(self.arrivals, (0, bus.id, bus, False))
+        self.departing = list()
+
+    def spawn_actor(self):
+        new_actor = super(EventDrivenTransportManagement, self).spawn_actor()
+        self.spawn_times[new_actor.id] = self.global_time
+        return new_actor
+
+    def spawn_actors(self, count):
+        new_actors = super(EventDrivenTransportManagement, self).spawn_actors(count)
+        for new_actor in new_actors:
+            self.spawn_times[new_actor.id] = self.global_time
+        return new_actors
+
+    def spawn_bus(self, location, slot=None):
+        super(EventDrivenTransportManagement, self).spawn_bus(location, slot)
+        new_bus = self.buses[-1]
+        self.expiries[new_bus.id] = list()
+        self.departing.append(new_bus)
+
+    def expiry_time(self, actor):
+        """
+        Computes the time when an actor wants to drop from a bus
+        :param actor: the actor
+        :return: the time when the actor wants to drop
+        """
+        if actor.mark == "T":
+            if actor.time_no_violation >= T.TicketInspector.MAX_IDLE_TIME:
+                return self.spawn_times[actor.id]
+            return self.spawn_times[actor.id] + T.TicketInspector.MAX_WORKTIME
+        return self.spawn_times[actor.id] + C.Commuter.PATIENCE
+
+    def sync_travel_times(self, actors):
+        """
+        Updates the travel time of some actors to the current time
+        :param actors: the actors to update
+        """
+        for actor in actors:
+            actor.travel_time = self.global_time - self.spawn_times[actor.id]
+
+    def drop(self, bus, passengers_to_drop, reason=TM.SL.TIRED):
+        self.sync_travel_times(passengers_to_drop)
+        for passenger in passengers_to_drop:
+            del self.spawn_times[passenger.id]
+        super(EventDrivenTransportManagement, self).drop(bus, passengers_to_drop, reason)
+
+    def collect(self, bus):
+        to_collect = super(EventDrivenTransportManagement, self).collect(bus)
+        expiries = self.expiries[bus.id]
+        for passenger in to_collect:
+            heapq.heappush(expiries, (self.expiry_time(passenger), passenger.id, passenger))
+        return to_collect
+
+    def destroy_bus(self, bus):
+        self.sync_travel_times(bus)
+        for passenger in bus:
+            del self.spawn_times[passenger.id]
+        del self.expiries[bus.id]
+        super(EventDrivenTransportManagement, self).destroy_bus(bus)
+
+    def buses_at_stop(self):
+        """
+        Takes the buses arriving in the current tick from the queue of arrivals
+        :return: the list of buses at a bus stop, in order of creation
+        """
+        arrived = list()
+        while self.arrivals and self.arrivals[0][0] <= self.tick:
+            tick, bus_id, bus, advance = heapq.heappop(self.arrivals)
+            if bus_id not in self.expiries:
+                continue  # Destroyed in a riot
+            if advance:
+                bus.advance()
+            else:
+                bus.is_at_bus_stop = True
+            arrived.append(bus)
+        self.departing.extend(arrived)
+        return arrived
+
+    def tired_passengers(self, bus):
+        """
+        Takes the passengers who want to drop from the queue of expiries of a bus
+        :param bus: the bus
+        :return: the list of passengers who want to drop from the bus
+        """
+        tired = list()
+        expiries = self.expiries[bus.id]
+        scanned = 0
+        while expiries and expiries[0][0] <= self.global_time:
+            passenger = heapq.heappop(expiries)[2]
+            scanned = scanned + 1
+            if passenger in bus:
+                tired.append(passenger)
+        self.profiler.count(P.ACTORS_SCANNED, scanned)
+        return tired
+
+    def schedule_arrival(self, bus):
+        """
+        Draws the tick of the next arrival of a bus at a bus stop and puts it in the queue of arrivals.
+        The bus advances with probability p_bus_advancement at every tick, so the number of ticks it takes is
+        geometrically distributed
+        :param bus: the bus
+        """
+        bus.is_at_bus_stop = False
+        p = self.p_bus_advancement
+        if p <= 0:
+            return  # Never moves again
+        ticks = 1
+        if p < 1:
+            ticks = ticks + int(math.log(1.0 - self.rng.movement.random()) / math.log(1.0 - p))
+        heapq.heappush(self.arrivals, (self.tick + ticks, bus.id, bus, True))
+
+    def next_tick(self):
+        # type: () -> int
+        """
+        Finds the next tick where something can happen
+        :return: the next tick to process
+        """
+        if self.crowded_stops or self.commuters_count == 0:
+            return self.tick + 1
+        candidates = [self.next_spawn_tick, self.timeout_tick]
+        while self.arrivals and self.arrivals[0][1] not in self.expiries:
+            heapq.heappop(self.arrivals)
+        if self.arrivals:
+            candidates.append(self.arrivals[0][0])
+        if self.horizon_tick is not None:
+            candidates.append(self.horizon_tick)
+        return max(self.tick + 1, min(candidates))
+
+    def step_forward(self):
+        """
+        Steps forward in the simulation to the next tick where something can happen: buses which left a bus stop
+        get their next arrival, global time jumps to the next tick.
+        If the simulation has to stop, the self.simulation_on is set to False
+        """
+        profiler = self.profiler
+        profiler.start()
+
+        for bus in self.departing:
+            if bus.id in self.expiries:
+                self.schedule_arrival(bus)
+        self.departing = list()
+        if self.last_spawn_time == self.global_time:
+            self.next_spawn_tick = self.tick + self.spawn_ticks
+
+        self.tick = self.next_tick()
+        self.global_time = self.tick * self.delta_t
+        profiler.lap(P.MOVEMENT)
+
+        self.check_termination()
+        profiler.lap(P.TERMINATION)
+
+        for listener in self.listeners:
+            listener.turn_ended(self)
+        profiler.lap(P.LISTENERS)
+        profiler.turn_ended()
+
+    def travel_time_stats(self):
+        if not self.spawn_times:
+            return None, None
+        oldest = next(iter(self.actors))
+        mean_spawn_time = float(sum(self.spawn_times.values())) / len(self.spawn_times)
+        return self.global_time - mean_spawn_time, self.global_time - self.spawn_times[oldest]
+
+    def status_table(self, limit=None, offset=0):
+        self.sync_travel_times(self.actors.values())
+        return super(EventDrivenTransportManagement, self).status_table(limit, offset)
+
+    def checkpoint_state(self):
+        """
+        Captures the state of the simulation between two turns, see TransportManagement.checkpoint_state.
+        The spawn time of the actors and the next arrival of the buses are saved too, while the queues of expiries
+        are rebuilt from the passengers
+        :return: the scalar state (JSON serializable) and the columns of numbers (arrays), by name
+        """
+        state, columns = super(EventDrivenTransportManagement, self).checkpoint_state()
+        arrivals = dict((entry[1], entry) for entry in self.arrivals if entry[1] in self.expiries)
+        no_arrival = (TM.NOWHERE, None, None, False)
+        columns["actor_spawn_time"] = TM.number_column([self.spawn_times[a_id] for a_id in self.actors])
+        columns["bus_arrival_tick"] = array.array("q", [arrivals.get(b.id, no_arrival)[0] for b in self.buses])
+        columns["bus_arrival_advance"] = array.array("b", [arrivals.get(b.id, no_arrival)[3] for b in self.buses])
+        return state, columns
+
+    def restore_checkpoint_state(self, state, columns):
+        super(EventDrivenTransportManagement, self).restore_checkpoint_state(state, columns)
+        self.spawn_times = dict(zip(columns["actor_id"].tolist(), columns["actor_spawn_time"].tolist()))
+        self.departing = list()
+        self.arrivals = list()
+        self.expiries = dict()
+        for bus, tick, advance in zip(self.buses, columns["bus_arrival_tick"].tolist(),
+                                      columns["bus_arrival_advance"].tolist()):
+            if tick != TM.NOWHERE:
+                self.arrivals.append((tick, bus.id, bus, bool(advance)))
+            self.expiries[bus.id] = [(self.expiry_time(p), p.id, p) for p in bus]
+            heapq.heapify(self.expiries[bus.id])
+        heapq.heapify(self.arrivals)
+
+    def run(self, max_turns=None):
+        # type: (int) -> int
+        """
+        Runs the simulation headlessly, see TransportManagement.run.
+        Skipped ticks count as turns
+        :param max_turns: maximum number of ticks to run, None to run until the simulation ends
+        :return: the number of ticks that have been run
+        """
+        start = self.tick
+        self.horizon_tick = None if max_turns is None else start + max_turns
+        while self.simulation_on and (self.horizon_tick is None or self.tick < self.horizon_tick):
+            self.process_turn()
+            self.step_forward()
+        self.horizon_tick = None
+        return self.tick - start
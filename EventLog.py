@@ -0,0 +1,164 @@
+from collections import namedtuple
+
+# Event kinds
+SPAWNED = 0
+"""An actor walked up to a bus stop: actors = (actor,)"""
+ARRIVED = 1
+"""A bus made it to a bus stop: value = the bus stop"""
+FINAL_STOP = 2
+"""A bus reached the final stop: value = number of passengers on board"""
+DELIVERED = 3
+"""Commuters were dropped at the final stop: actors = the dropped commuters"""
+EXPELLED = 4
+"""An inspector expelled a trickster: actors = (inspector, trickster)"""
+GRACED = 5
+"""An inspector didn't expel a trickster: actors = (inspector, trickster)"""
+INSPECTION_SPARED = 6
+"""Some tricksters were checked, none was expelled"""
+INSPECTION_MIXED = 7
+"""Some tricksters were checked, some were expelled and some were not"""
+COLLECTED = 8
+"""Passengers were collected from a bus stop: value = number of collected passengers"""
+TIRED = 9
+"""Tired passengers left a bus: actors = the passengers who left"""
+RIOT = 10
+"""The passengers of an overcrowded bus destroyed it: value = number of passengers"""
+BUS_SENT = 11
+"""A new bus was sent because of a crowded bus stop: value = (crowded bus stop, bus stop of the new bus)"""
+UNNAMED_SPAWNED = 12
+"""An actor without a name walked up to a bus stop: value = (mark, actor id, bus stop)"""
+TURN_SUMMARY = 13
+"""Aggregated outcome of a turn: value = (delivered, expelled, collected, tired, final stop)"""
+
+Event = namedtuple("Event", ("kind", "time", "bus", "actors", "value"))
+"""A compact record of something that happened in the simulation, rendered into narrative text only on demand"""
+
+
+def render_spawned(event):
+    actor = event.actors[0]
+    if actor.mark == "T":
+        template = "It was {time} o'clock when Ticket inspector {name} ({id}) marched up to the stop of {place} " \
+                   "and started to wait for {poss} ride."
+    else:
+        template = "It was {time} o'clock when {name} ({id}) walked up to the stop of {place} " \
+                   "and started to wait for {poss} ride."
+    return template.format(time=event.time, name=actor.name, id=actor.id, place=actor.hometown,
+                           poss=actor.possessive_adjective())
+
+
+def render_final_stop(event):
+    if event.value > 0:
+        return "The final stop looked like a mirage. Everyone felt relieved for a moment."
+    else:
+        return "The final stop looked like a mirage. What a shame no passenger was there to see it."
+
+
+def render_collected(event):
+    if event.value > 1:
+        return "{:d} lost souls were collected from the bus stop.".format(event.value)
+    else:
+        return "One lost soul was collected from the bus stop."
+
+
+def render_unnamed_spawned(event):
+    mark, actor_id, place = event.value
+    kind = "Ticket inspector" if mark == "T" else "Commuter"
+    return "It was {time} o'clock when {kind} {id} walked up to the stop of {place}.".format(
+        time=event.time, kind=kind, id=actor_id, place=place)
+
+
+RENDERERS = {
+    SPAWNED: render_spawned,
+    ARRIVED: lambda e: "\nAfter what felt like an eternity, bus {} made it to {}.".format(e.bus, e.value),
+    FINAL_STOP: render_final_stop,
+    DELIVERED: lambda e: "But happiness is vain for those who are now gloomily proceeding to walk to their "
+                         "workplace:\n{} ".format(str([(p.name, p.id) for p in e.actors])),
+    EXPELLED: lambda e: "After a short quarrel, inspector"
+                        + " {} managed to fine and jettison trickster {} ({:d}) from bus {:d}."
+                        .format(e.actors[0].name, e.actors[1].name, e.actors[1].id, e.bus)
+                        + "\nGood riddance!"
+                        + "\n(Also, the inspector seems to be satisfied and unwilling to check other "
+                          "passengers for now.)",
+    GRACED: lambda e: "{} ({:d}) on bus {:d} had no ticket, but inspector {} ({:d}) pretended not to notice."
+                      .format(e.actors[1].name, e.actors[1].id, e.bus, e.actors[0].name, e.actors[0].id),
+    INSPECTION_SPARED: lambda e: "Sometimes fortune favours the brave, in this crazy world of ours.",
+    INSPECTION_MIXED: lambda e: "Some days you win, some days you lose."
+                                + "\nBut when all is said and done, having no ticket is just a calculated risk.",
+    COLLECTED: render_collected,
+    TIRED: lambda e: "{:d} passengers couldn't make it anymore, so they willingly left the bus. "
+                     "Let's wish them a good walk: {} ".format(len(e.actors), str([p.id for p in e.actors])),
+    RIOT: lambda e: "\nBus {} was a little too overcrowded.".format(e.bus)
+                    + "\nThe {} passengers decided to go berserk and eventually destroy the bus.".format(e.value)
+                    + "\nLook at them, they've made a bonfire out of gasoline and bus chairs!"
+                      "\nAren't they lively? Don't you wish you were having fun with them?",
+    BUS_SENT: lambda e: "\nThe main office of the Public Transportation System noticed from its security cameras\n"
+                        "that the bus stop in {} was too crowded, so they decided to send a new bus from {} "
+                        "before anyone ".format(*e.value)
+                        + "got angry.\nAs if they weren't already...",
+    UNNAMED_SPAWNED: render_unnamed_spawned,
+    TURN_SUMMARY: lambda e: "{:d} commuters reached {}, {:d} tricksters were expelled, {:d} lost souls were "
+                            "collected and {:d} passengers left the bus.".format(e.value[0], e.value[4],
+                                                                                e.value[1], e.value[2], e.value[3]),
+}
+
+
+def render(event):
+    # type: (Event) -> str
+    """
+    Renders an event into narrative text
+    :param event: the event to render
+    :return: the narrative text of the event
+    """
+    return RENDERERS[event.kind](event)
+
+
+class EventLog(object):
+    enabled = True
+
+    def __init__(self):
+        """
+        Log of the events of a turn. Events are stored as compact records referencing the actors involved, and are
+        rendered into narrative text only when asked to
+        """
+        self.events = list()
+
+    def record(self, kind, time, bus=None, actors=(), value=None):
+        """
+        Records an event
+        :param kind: the kind of event, one of the event kinds of this module
+        :param time: the simulation time of the event
+        :param bus: the id of the bus involved, if any
+        :param actors: the actors involved, if any (not copied, so it must not be changed afterwards)
+        :param value: additional data, depending on the kind of event
+        """
+        self.events.append(Event(kind, time, bus, actors, value))
+
+    def clear(self):
+        """
+        Forgets all the recorded events
+        """
+        self.events = list()
+
+    def render(self):
+        # type: () -> list
+        """
+        Renders all the recorded events into narrative text
+        :return: the list of event strings, in order of recording
+        """
+        return [render(event) for event in self.events]
+
+    def __len__(self):
+        return len(self.events)
+
+    def __iter__(self):
+        return iter(self.events)
+
+
+class NullEventLog(EventLog):
+    enabled = False
+
+    def record(self, kind, time, bus=None, actors=(), value=None):
+        """
+        Ignores the event: event capture is turned off
+        """
+        pass
@@ -0,0 +1,317 @@
+"""
+History of the turns of a simulation, to go back to any recent turn and inspect it without running the simulation
+again.
+
+Every turn is stored as a delta against the state at the end of the previous turn: the actors spawned, boarded and
+dropped (with the reason, so expulsions are kept apart), the buses sent and destroyed, in the order they happened,
+then the buses which moved, the new time and the outcome counters. Every keyframe_interval turns the whole state is
+stored as a keyframe; keyframes and the deltas which follow them are kept in a ring buffer of max_keyframes
+segments, so memory use is bounded and the oldest turns are forgotten first.
+"""
+
+from collections import deque
+
+import SimulationListener as SL
+from StatusView import StatusView, ACTOR_FIELDS, BUS_FIELDS
+
+# Operations of a delta
+SPAWN = 0
+"""(SPAWN, actor record): an actor started to wait at a bus stop"""
+BOARD = 1
+"""(BOARD, bus id, actor ids): actors were collected by a bus"""
+DROP = 2
+"""(DROP, bus id, actor ids, reason): passengers were removed from the simulation, see SimulationListener"""
+BUS_SPAWN = 3
+"""(BUS_SPAWN, bus id, slot, bus stop): a new bus was added at a bus stop"""
+BUS_DESTROY = 4
+"""(BUS_DESTROY, bus id): a bus was removed"""
+
+COUNTERS = ("delivered", "expelled", "tired", "riots", "buses_spawned")
+
+KEYFRAME_INTERVAL = 50
+MAX_KEYFRAMES = 20
+
+# Fields of the actor records, in the order of StatusView.ACTOR_FIELDS
+ID, NAME, HOMETOWN, POSITION, TRAVEL_TIME, TICKET, MARK = range(7)
+# Fields of the bus records
+SLOT, LOCATION, AT_STOP, PASSENGERS = range(4)
+
+
+def actor_record(actor):
+    # type: (Commuter.Commuter) -> list
+    """
+    Records the attributes of an actor which are shown in the status tables
+    :param actor: the actor
+    :return: its Id, Name, Hometown, Position, Travel time, Ticket and Mark
+    """
+    return [actor.id, actor.name, actor.hometown, actor.position, actor.travel_time, actor.has_ticket, actor.mark]
+
+
+class Delta(object):
+    __slots__ = ("time", "operations", "moves", "counters", "events")
+
+    def __init__(self, time, operations, moves, counters, events):
+        """
+        Changes made to the state of a simulation by a turn
+        :param time: the simulation time at the end of the turn
+        :param operations: the actors and buses which came and went, as operations of this module, in order
+        :param moves: the buses whose slot or stop status changed, as (bus id, slot, bus stop, is at bus stop) tuples
+        :param counters: the outcome counters at the end of the turn, in the order of COUNTERS
+        :param events: the narrative text of the events of the turn, None if they were not recorded
+        """
+        self.time = time
+        self.operations = operations
+        self.moves = moves
+        self.counters = counters
+        self.events = events
+
+
+class HistoryState(object):
+    def __init__(self, turn, time, actors, buses, counters, events=None):
+        """
+        State of a simulation at the end of a recorded turn, as shown in the status tables
+        :param turn: the turn, counted from the start of the recording
+        :param time: the simulation time
+        :param actors: the record of each actor, by id, see actor_record
+        :param buses: the [slot, bus stop, is at bus stop, passenger ids] record of each bus, by id
+        :param counters: the outcome counters, by name
+        :param events: the narrative text of the events of the turn, None if they were not recorded
+        """
+        self.turn = turn
+        self.time = time
+        self.actors = actors
+        self.buses = buses
+        self.counters = counters
+        self.events = events
+
+    def copy(self):
+        # type: () -> HistoryState
+        return HistoryState(self.turn, self.time, dict((i, list(a)) for i, a in self.actors.items()),
+                            dict((i, [b[SLOT], b[LOCATION], b[AT_STOP], list(b[PASSENGERS])])
+                                 for i, b in self.buses.items()),
+                            dict(self.counters), self.events)
+
+    def apply(self, delta):
+        """
+        Moves this state forward by one turn
+        :type delta: Delta
+        :param delta: the delta of the next turn
+        """
+        actors = self.actors
+        buses = self.buses
+        for operation in delta.operations:
+            kind = operation[0]
+            if kind == SPAWN:
+                actors[operation[1][ID]] = list(operation[1])
+            elif kind == BOARD:
+                bus = buses[operation[1]]
+                name = "Bus %d" % operation[1]
+                for actor_id in operation[2]:
+                    actors[actor_id][POSITION] = name
+                bus[PASSENGERS].extend(operation[2])
+            elif kind == DROP:
+                dropped = set(operation[2])
+                bus = buses[operation[1]]
+                bus[PASSENGERS] = [p for p in bus[PASSENGERS] if p not in dropped]
+                for actor_id in operation[2]:
+                    del actors[actor_id]
+            elif kind == BUS_SPAWN:
+                buses[operation[1]] = [operation[2], operation[3], True, list()]
+            elif kind == BUS_DESTROY:
+                del buses[operation[1]]
+
+        for bus_id, slot, location, at_stop in delta.moves:
+            bus = buses[bus_id]
+            bus[SLOT] = slot
+            bus[LOCATION] = location
+            bus[AT_STOP] = at_stop
+
+        # Actors age together
+        elapsed = delta.time - self.time
+        for actor in actors.values():
+            actor[TRAVEL_TIME] = actor[TRAVEL_TIME] + elapsed
+        self.time = delta.time
+        self.turn = self.turn + 1
+        self.counters = dict(zip(COUNTERS, delta.counters))
+        self.events = delta.events
+
+    def status_table(self, limit=None, offset=0):
+        # type: (int, int) -> str
+        """
+        Generates the tables displaying information about actor and bus status, as TransportManagement.status_table
+        :param limit: maximum number of actors and buses to display, None to display all of them
+        :param offset: number of actors to skip, in order of id
+        :return: the tables displaying information about actor and bus status
+        """
+        from prettytable import PrettyTable
+        actor_ids = sorted(self.actors)
+        shown = StatusView.page(actor_ids, limit, offset)
+        actors_table = PrettyTable()
+        actors_table.field_names = ACTOR_FIELDS
+        for actor_id in shown:
+            actors_table.add_row(self.actors[actor_id])
+
+        bus_ids = sorted(self.buses)
+        buses_shown = StatusView.page(bus_ids, limit, 0)
+        buses_table = PrettyTable()
+        buses_table.field_names = BUS_FIELDS
+        for bus_id in buses_shown:
+            slot, location, at_stop, passengers = self.buses[bus_id]
+            records = [self.actors[p] for p in passengers]
+            buses_table.add_row([bus_id, location, at_stop, len(passengers), sum(1 for a in records if not a[TICKET]),
+                                 sum(1 for a in records if a[MARK] == "T")])
+
+        return "\nSITUATION AT TIME {}".format(self.time) + "\nActors:\n" + str(actors_table) + \
+               StatusView.page_footer(len(shown), offset, len(actor_ids), "actors") + \
+               "\nBuses:\n" + str(buses_table) + StatusView.page_footer(len(buses_shown), 0, len(bus_ids), "buses")
+
+
+class HistoryRecorder(SL.SimulationListener):
+    def __init__(self, simulation, keyframe_interval=KEYFRAME_INTERVAL, max_keyframes=MAX_KEYFRAMES,
+                 record_events=False):
+        """
+        Records the turns of a simulation as deltas, with periodic keyframes, see the module documentation.
+        Turn 0 is the state of the simulation when the recorder is created; the recorder registers itself as a
+        listener of the simulation. Engines which don't keep actors and buses as objects can't be recorded
+        :type simulation: TransportManagement.TransportManagement
+        :param simulation: the simulation to record
+        :param keyframe_interval: number of turns between two keyframes
+        :param max_keyframes: number of keyframes kept, with the deltas which follow them
+        :param record_events: True to keep the narrative text of the events of every turn too
+        """
+        if getattr(simulation, "actors", None) is None:
+            raise ValueError("{} doesn't keep actors as objects, its turns can't be recorded".format(
+                type(simulation).__name__))
+        self.keyframe_interval = keyframe_interval
+        self.record_events = record_events
+        self.segments = deque(maxlen=max_keyframes)
+        """Ring buffer of keyframes, each one with the list of the deltas of the turns which follow it"""
+        self.turn = 0
+        """Last recorded turn"""
+        self.operations = list()
+        """Operations of the turn in progress"""
+        self.bus_positions = dict()
+        """Last recorded (slot, is at bus stop) of each bus"""
+        self.add_keyframe(simulation)
+        simulation.add_listener(self)
+
+    def add_keyframe(self, simulation, events=None):
+        """
+        Stores the whole state of the simulation as the keyframe of the current turn
+        :param simulation: the simulation
+        :param events: the narrative text of the events of the turn, None if they are not recorded
+        """
+        if hasattr(simulation, "sync_travel_times"):
+            simulation.sync_travel_times(simulation.actors.values())
+        buses = dict()
+        for bus in simulation.buses:
+            buses[bus.id] = [bus.slot, bus.last_position, bus.is_at_bus_stop, list(bus.passengers)]
+            self.bus_positions[bus.id] = (bus.slot, bus.is_at_bus_stop)
+        keyframe = HistoryState(self.turn, simulation.global_time,
+                                dict((a.id, actor_record(a)) for a in simulation.actors.values()), buses,
+                                dict((counter, getattr(simulation, counter)) for counter in COUNTERS), events)
+        self.segments.append((keyframe, list()))
+
+    @property
+    def first_turn(self):
+        # type: () -> int
+        """
+        The oldest turn still recorded
+        """
+        return self.segments[0][0].turn
+
+    @property
+    def last_turn(self):
+        # type: () -> int
+        """
+        The most recent recorded turn
+        """
+        return self.turn
+
+    def actor_spawned(self, simulation, actor):
+        self.operations.append((SPAWN, actor_record(actor)))
+
+    def actors_boarded(self, simulation, bus, actors):
+        self.operations.append((BOARD, bus.id, [a.id for a in actors]))
+
+    def actors_dropped(self, simulation, bus, actors, reason):
+        self.operations.append((DROP, bus.id, [a.id for a in actors], reason))
+
+    def bus_spawned(self, simulation, bus):
+        self.operations.append((BUS_SPAWN, bus.id, bus.slot, bus.last_position))
+        self.bus_positions[bus.id] = (bus.slot, True)
+
+    def bus_destroyed(self, simulation, bus):
+        self.operations.append((BUS_DESTROY, bus.id))
+        del self.bus_positions[bus.id]
+
+    def turn_ended(self, simulation):
+        moves = list()
+        bus_positions = self.bus_positions
+        for bus in simulation.buses:
+            position = (bus.slot, bus.is_at_bus_stop)
+            if bus_positions[bus.id] != position:
+                bus_positions[bus.id] = position
+                moves.append((bus.id, bus.slot, bus.last_position, bus.is_at_bus_stop))
+        delta = Delta(simulation.global_time, self.operations, moves,
+                      tuple(getattr(simulation, counter) for counter in COUNTERS),
+                      simulation.event_strings if self.record_events else None)
+        self.operations = list()
+        self.segments[-1][1].append(delta)
+        self.turn = self.turn + 1
+        if self.turn % self.keyframe_interval == 0:
+            self.add_keyframe(simulation, delta.events)
+
+    def delta(self, turn):
+        # type: (int) -> Delta
+        """
+        Gets the changes made by a recorded turn
+        :param turn: the turn
+        :return: the delta of the turn, None for the first recorded turn (the changes leading to it are forgotten)
+        """
+        if turn == self.first_turn:
+            return None
+        keyframe, deltas = self.segment(turn - 1)
+        return deltas[turn - 1 - keyframe.turn]
+
+    def segment(self, turn):
+        # type: (int) -> tuple
+        """
+        Finds the keyframe a recorded turn is reached from
+        :param turn: the turn
+        :return: the keyframe and the list of the deltas which follow it
+        """
+        if not self.first_turn <= turn <= self.last_turn:
+            raise ValueError("Turn {:d} is not recorded: turns {:d} to {:d} are".format(
+                turn, self.first_turn, self.last_turn))
+        index = (turn - self.first_turn) // self.keyframe_interval
+        return self.segments[index]
+
+    def seek(self, turn):
+        # type: (int) -> HistoryState
+        """
+        Rebuilds the state of the simulation at the end of a recorded turn, from the closest keyframe before it
+        :param turn: the turn, between first_turn and last_turn
+        :return: the state at the end of the turn
+        """
+        keyframe, deltas = self.segment(turn)
+        state = keyframe.copy()
+        for delta in deltas[:turn - keyframe.turn]:
+            state.apply(delta)
+        return state
+
+    def replay(self, start=None, stop=None):
+        """
+        Replays recorded turns one by one, moving a single state forward with the deltas.
+        The same HistoryState object is yielded at every turn: copy it to keep it
+        :param start: the first turn, None for first_turn
+        :param stop: the last turn, None for last_turn
+        :return: a generator of the states at the end of each turn
+        """
+        start = self.first_turn if start is None else start
+        stop = self.last_turn if stop is None else stop
+        state = self.seek(start)
+        yield state
+        while state.turn < stop:
+            state.apply(self.delta(state.turn + 1))
+            yield state
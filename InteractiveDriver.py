@@ -0,0 +1,117 @@
+import asyncio
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+PROMPT = "\nHit Return to continue, anything else to quit: "
+GOODBYE = "Even if you decided to close this Matrix, there's no guarantee you aren't trapped in a higher level " \
+          "simulation.\nTake care..."
+
+Frame = namedtuple("Frame", ("text", "simulation_on"))
+"""A turn ready to be shown: its rendered text, and whether the simulation goes on after it"""
+
+
+class InteractiveDriver(object):
+    def __init__(self, simulation, table_rows=None, input_function=input, output_function=print):
+        """
+        Interactive front end which computes and renders the next turn in the background while the operator reads
+        the current one, so that the next turn is shown as soon as Return is hit.
+        The turn is computed on the simulation itself, by a single worker thread, and never more than one turn
+        ahead of the one on screen: if the operator quits, that turn has been applied to the simulation (and seen
+        by its listeners, like a MetricsSink) without being shown.
+        If computing a turn fails, the error is raised by run once the worker thread has stopped
+        :type simulation: TransportManagement.TransportManagement
+        :param simulation: the simulation to run
+        :param table_rows: maximum number of actors and buses to display in the status tables, None for all of them
+        :param input_function: function reading the answer of the operator to a prompt
+        :param output_function: function showing a text to the operator
+        """
+        if not simulation.STATUS_TABLES:
+            raise ValueError("{} doesn't display status tables, it can't be run interactively".format(
+                type(simulation).__name__))
+        self.simulation = simulation
+        self.table_rows = table_rows
+        self.input_function = input_function
+        self.output_function = output_function
+        self.turns_shown = 0
+
+    def compute_turn(self):
+        # type: () -> Frame
+        """
+        Computes and renders the next turn of the simulation, as the sequential interactive loop does
+        :return: the frame of the turn
+        """
+        simulation = self.simulation
+        simulation.process_turn()
+        lines = [simulation.status_report(self.table_rows)]
+        simulation.step_forward()
+        lines.extend(simulation.end_strings)
+        return Frame("\n".join(lines), simulation.simulation_on)
+
+    async def produce(self, frames, executor):
+        """
+        Computes the turns of the simulation in the worker thread and queues their frames, until it ends.
+        If computing a turn fails, the error is queued instead of a frame, and no other turn is computed
+        :param frames: the queue of frames, with room for a single frame
+        :param executor: the executor of the worker thread
+        """
+        loop = asyncio.get_event_loop()
+        simulation_on = self.simulation.simulation_on
+        while simulation_on:
+            try:
+                frame = await loop.run_in_executor(executor, self.compute_turn)
+            except Exception as error:
+                await frames.put(error)
+                return
+            await frames.put(frame)
+            simulation_on = frame.simulation_on
+
+    async def main(self):
+        """
+        Shows the turns of the simulation one at a time, waiting for the operator in between
+        """
+        loop = asyncio.get_event_loop()
+        self.output_function("Welcome to the Commuter simulation. Here's the current situation: " +
+                             self.simulation.status_table(self.table_rows))
+
+        frames = asyncio.Queue(maxsize=1)
+        executor = ThreadPoolExecutor(max_workers=1)
+        producer = asyncio.ensure_future(self.produce(frames, executor))
+        try:
+            not_stopped = self.simulation.simulation_on
+            while not_stopped:
+                frame = await frames.get()
+                if isinstance(frame, Exception):
+                    raise frame
+                self.output_function(frame.text)
+                self.turns_shown = self.turns_shown + 1
+
+                # Get user input, while the next turns are being computed
+                try:
+                    user_choice = await loop.run_in_executor(None, self.input_function, PROMPT)
+                except EOFError:
+                    user_choice = "quit"
+                if user_choice:
+                    not_stopped = False
+                    self.output_function(GOODBYE)
+                else:
+                    # See if the simulation has ended
+                    not_stopped = frame.simulation_on
+        finally:
+            # A turn being computed is left to finish, so that the simulation is never left halfway through a turn
+            producer.cancel()
+            try:
+                await producer
+            except asyncio.CancelledError:
+                pass
+            executor.shutdown(wait=True)
+
+        self.output_function("End of Commuter simulation.")
+
+    def run(self):
+        # type: () -> int
+        """
+        Runs the interactive front end until the simulation ends or the operator quits
+        :return: the number of turns shown
+        """
+        asyncio.run(self.main())
+        return self.turns_shown
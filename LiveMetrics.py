@@ -0,0 +1,278 @@
+"""
+Live metrics of a running simulation, published in a block of shared memory so that other processes can watch it.
+
+The simulation process is the only writer: at the end of every turn it copies a handful of counters into the block,
+without any I/O, system call or lock. Readers attach to the block by its name and never write into it. Writes are
+made consistent with a sequence lock: the writer makes the sequence number odd before updating the values and even
+again after, and a reader retries until it has copied the values between two reads of the same even sequence number.
+
+The block is an array of 64 bits integers (the time and the wall clock time of the last update are doubles):
+a header of HEADER_SIZE fields, the number of actors waiting at each bus stop, the number of passengers of each bus,
+up to the capacity chosen by the writer, and the names of the bus stops, as a JSON list encoded in UTF-8.
+"""
+
+import array
+import json
+import mmap
+import os
+import struct
+import time
+from multiprocessing import shared_memory
+
+try:
+    import _posixshmem
+except ImportError:
+    _posixshmem = None
+
+from SimulationListener import SimulationListener
+
+MAGIC = 0x434f4d4d55544552
+"""First field of the block, to recognize it"""
+LAYOUT_VERSION = 1
+"""Version of the layout of the block, changed when fields are added or moved"""
+
+# Header fields, by index
+MAGIC_FIELD = 0
+VERSION = 1
+SEQUENCE = 2
+"""Sequence number, odd while the writer is updating the values"""
+STOPS = 3
+"""Number of bus stops"""
+BUS_CAPACITY = 4
+"""Number of buses whose passengers can be published"""
+NAMES_LENGTH = 5
+"""Length in bytes of the names of the bus stops"""
+WRITER_PID = 6
+TURN = 7
+TIME = 8
+"""Simulation time, as a double"""
+UPDATED = 9
+"""Wall clock time of the last update (seconds since the epoch), as a double"""
+RUNNING = 10
+"""1 while the simulation is running, 0 once it has ended"""
+BUSES = 11
+"""Number of buses, which can be more than the number of buses published"""
+PASSENGERS = 12
+"""Total number of passengers, of all buses"""
+COMMUTERS = 13
+TRICKSTERS = 14
+INSPECTORS = 15
+DELIVERED = 16
+EXPELLED = 17
+TIRED = 18
+RIOTS = 19
+BUSES_SPAWNED = 20
+HEADER_SIZE = 21
+
+VALUES = ("turn", "time", "updated", "running", "buses", "passengers", "commuters", "tricksters", "inspectors",
+          "delivered", "expelled", "tired", "riots", "buses_spawned")
+"""Names of the values of the header, in order of field from TURN"""
+
+MAX_BUSES = 1024
+"""Default number of buses whose passengers are published"""
+
+FIELD_SIZE = 8
+
+
+def default_name():
+    # type: () -> str
+    """
+    Names the block of the simulation run by this process
+    :return: the name
+    """
+    return "commuters-{:d}".format(os.getpid())
+
+
+class LiveMetricsPublisher(SimulationListener):
+    def __init__(self, simulation, name=None, max_buses=MAX_BUSES):
+        """
+        Publishes live metrics of a simulation in a new block of shared memory, updated at the end of every turn:
+        time, actors waiting at each bus stop, passengers of each bus, commuters, tricksters on the buses, ticket
+        inspectors and the outcome counters, riots and buses sent included.
+        The publisher registers itself as a listener of the simulation. The block is kept after the end of the
+        simulation, so that readers can see its final state, until the publisher is closed
+        :type simulation: TransportManagement.TransportManagement
+        :param simulation: the simulation to publish
+        :param name: the name of the block, None for default_name()
+        :param max_buses: number of buses whose passengers are published, the others are only counted
+        """
+        self.name = name if name is not None else default_name()
+        self.max_buses = max_buses
+        names = json.dumps(list(simulation.network.stops)).encode("utf-8")
+        self.stops = len(simulation.network.stops)
+        self.names_offset = (HEADER_SIZE + self.stops + max_buses) * FIELD_SIZE
+        self.memory = shared_memory.SharedMemory(self.name, create=True, size=self.names_offset + len(names))
+        fields_buffer = self.memory.buf[:self.names_offset]
+        self.fields = fields_buffer.cast("q")
+        self.doubles = fields_buffer.cast("d")
+        fields_buffer.release()
+        self.memory.buf[self.names_offset:self.names_offset + len(names)] = names
+
+        self.fields[MAGIC_FIELD] = MAGIC
+        self.fields[VERSION] = LAYOUT_VERSION
+        self.fields[SEQUENCE] = 0
+        self.fields[STOPS] = self.stops
+        self.fields[BUS_CAPACITY] = max_buses
+        self.fields[NAMES_LENGTH] = len(names)
+        self.fields[WRITER_PID] = os.getpid()
+        self.turn = 0
+        self.closed = False
+        self.publish(simulation)
+        simulation.add_listener(self)
+
+    def publish(self, simulation):
+        """
+        Copies the current metrics of the simulation into the block
+        :type simulation: TransportManagement.TransportManagement
+        :param simulation: the simulation
+        """
+        live_metrics = simulation.live_metrics()
+        riders = live_metrics["riders"]
+        published_riders = riders[:self.max_buses]
+        counts = array.array("q", live_metrics["waiting"])
+        counts.extend(published_riders)
+        fields = self.fields
+        sequence = fields[SEQUENCE]
+
+        fields[SEQUENCE] = sequence + 1
+        fields[TURN] = self.turn
+        self.doubles[TIME] = float(simulation.global_time)
+        self.doubles[UPDATED] = time.time()
+        fields[RUNNING] = 1 if simulation.simulation_on else 0
+        fields[BUSES] = len(riders)
+        fields[PASSENGERS] = sum(riders)
+        fields[COMMUTERS] = simulation.commuters_count
+        fields[TRICKSTERS] = live_metrics["tricksters"]
+        fields[INSPECTORS] = live_metrics["inspectors"]
+        fields[DELIVERED] = simulation.delivered
+        fields[EXPELLED] = simulation.expelled
+        fields[TIRED] = simulation.tired
+        fields[RIOTS] = simulation.riots
+        fields[BUSES_SPAWNED] = simulation.buses_spawned
+        fields[HEADER_SIZE:HEADER_SIZE + len(counts)] = counts
+        fields[SEQUENCE] = sequence + 2
+
+    def turn_ended(self, simulation):
+        if self.closed:
+            return
+        self.turn = self.turn + 1
+        self.publish(simulation)
+
+    def close(self):
+        """
+        Removes the block. Readers attached to it keep their view of it, but no new reader can attach
+        """
+        if self.closed:
+            return
+        self.fields.release()
+        self.doubles.release()
+        self.memory.close()
+        self.memory.unlink()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class LiveMetricsReader(object):
+    def __init__(self, name):
+        """
+        Attaches to the block of live metrics of a simulation, see LiveMetricsPublisher.
+        The block is mapped read-only (on Windows, the reader only keeps a read-only view of it), and it isn't
+        removed when the reader is closed
+        :param name: the name of the block
+        """
+        self.name = name
+        if _posixshmem is not None:
+            # Mapped read-only, without the resource tracker of SharedMemory, which would remove the block when
+            # this process ends
+            descriptor = _posixshmem.shm_open("/" + name, os.O_RDONLY, mode=0)
+            try:
+                self.memory = mmap.mmap(descriptor, os.fstat(descriptor).st_size, prot=mmap.PROT_READ)
+            finally:
+                os.close(descriptor)
+            self.buffer = memoryview(self.memory)
+        else:
+            self.memory = shared_memory.SharedMemory(name)
+            self.buffer = self.memory.buf.toreadonly()
+        magic, version = struct.unpack_from("qq", self.buffer)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("{} is not a block of live metrics".format(name))
+        if version != LAYOUT_VERSION:
+            self.close()
+            raise ValueError("Unsupported layout version {:d} of the live metrics, expected {:d}".format(
+                version, LAYOUT_VERSION))
+        self.stops, self.max_buses, names_length, self.writer_pid = struct.unpack_from(
+            "qqqq", self.buffer, STOPS * FIELD_SIZE)
+        names_offset = (HEADER_SIZE + self.stops + self.max_buses) * FIELD_SIZE
+        self.stop_names = json.loads(bytes(self.buffer[names_offset:names_offset + names_length]).decode("utf-8"))
+        fields_buffer = self.buffer[:names_offset]
+        self.fields = fields_buffer.cast("q")
+        self.doubles = fields_buffer.cast("d")
+        fields_buffer.release()
+
+    def read(self, timeout=1.0):
+        # type: (float) -> dict
+        """
+        Copies a consistent snapshot of the metrics, retrying while the writer is updating them
+        :param timeout: maximum time to wait for a consistent snapshot, in seconds
+        :return: the values of the header by name (see VALUES), the number of actors waiting at each bus stop by
+        name under "waiting", and the passengers of the published buses under "riders"
+        """
+        deadline = time.time() + timeout
+        fields = self.fields
+        while True:
+            sequence = fields[SEQUENCE]
+            if sequence % 2 == 0:
+                header = fields[TURN:HEADER_SIZE].tolist()
+                time_value, updated = self.doubles[TIME], self.doubles[UPDATED]
+                counts = fields[HEADER_SIZE:HEADER_SIZE + self.stops + self.max_buses].tolist()
+                if fields[SEQUENCE] == sequence:
+                    break
+            if time.time() > deadline:
+                raise RuntimeError("The live metrics of {} are not consistent after {} seconds".format(
+                    self.name, timeout))
+            time.sleep(0)
+
+        snapshot = dict(zip(VALUES, header))
+        snapshot["time"] = time_value
+        snapshot["updated"] = updated
+        snapshot["running"] = bool(snapshot["running"])
+        snapshot["waiting"] = dict(zip(self.stop_names, counts[:self.stops]))
+        snapshot["riders"] = counts[self.stops:self.stops + min(snapshot["buses"], self.max_buses)]
+        return snapshot
+
+    def writer_alive(self):
+        # type: () -> bool
+        """
+        Checks if the process publishing the metrics is still running
+        :return: False if the process has ended, even without marking the simulation as ended
+        """
+        try:
+            os.kill(self.writer_pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def close(self):
+        """
+        Detaches from the block, without removing it
+        """
+        for view in ("fields", "doubles"):
+            if getattr(self, view, None) is not None:
+                getattr(self, view).release()
+                setattr(self, view, None)
+        self.buffer.release()
+        self.memory.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -1,15 +1,162 @@
+import json
 import random as r
 
 
 LOCATIONS = ("Brescia", "Sarezzo", "Concesio", "Bergamo", "Flero", "Desenzano")
 
 
-def get_random_source():
+class RouteNetwork(object):
+    def __init__(self, stops, lines):
+        """
+        A network of bus lines. Bus stops have integer ids, their index in stops.
+        Each line is unrolled into a cycle of slots, one for each stop the line visits in a round: a bus on a line
+        is at a slot, and the successor, bus stop and destination flag of every slot are precomputed, so that
+        advancing a bus or checking if it's at its destination are list lookups.
+        Loop lines go back to their first stop after the last one, the others go back and forth along their stops.
+        :param stops: the names of the bus stops
+        :param lines: the lines, as (name, list of stop ids, list of destination stop ids, loop) tuples
+        :raise ValueError: if a line has no stops, if a bus stop isn't served by any line or if every bus stop is a
+        destination
+        """
+        self.stops = tuple(stops)
+        self.stop_ids = dict((name, stop_id) for stop_id, name in enumerate(self.stops))
+
+        self.lines = list()
+        """The lines, as given"""
+        self.line_names = list()
+        self.line_first_slot = list()
+        """First slot of each line, where new buses of the line start"""
+        self.slot_line = list()
+        self.slot_stop = list()
+        """Bus stop id of each slot"""
+        self.slot_location = list()
+        """Bus stop name of each slot"""
+        self.slot_next = list()
+        """Next slot of each slot"""
+        self.slot_is_destination = list()
+        """Whether the bus stop of each slot is a destination of its line"""
+        self.stop_slots = [list() for _ in self.stops]
+        """Slots of each bus stop, in order of line"""
+
+        destinations = set()
+        for line, (name, line_stops, line_destinations, loop) in enumerate(lines):
+            if len(line_stops) == 0:
+                raise ValueError("Line {} has no stops".format(name))
+            round_trip = list(line_stops) if loop or len(line_stops) < 3 else \
+                list(line_stops) + list(reversed(line_stops[1:-1]))
+            first_slot = len(self.slot_stop)
+            self.lines.append((name, list(line_stops), list(line_destinations), loop))
+            self.line_names.append(name)
+            self.line_first_slot.append(first_slot)
+            for i, stop in enumerate(round_trip):
+                slot = first_slot + i
+                self.slot_line.append(line)
+                self.slot_stop.append(stop)
+                self.slot_location.append(self.stops[stop])
+                self.slot_next.append(first_slot + (i + 1) % len(round_trip))
+                self.slot_is_destination.append(stop in line_destinations)
+                self.stop_slots[stop].append(slot)
+            destinations.update(line_destinations)
+
+        unserved = [name for stop, name in enumerate(self.stops) if len(self.stop_slots[stop]) == 0]
+        if len(unserved) > 0:
+            raise ValueError("No line serves the bus stops {}".format(", ".join(unserved)))
+
+        self.sources = tuple(name for stop, name in enumerate(self.stops) if stop not in destinations)
+        """Bus stops where actors can start their trip: the ones which are not the destination of any line"""
+        if len(self.sources) == 0:
+            raise ValueError("Every bus stop is a destination, actors have nowhere to start from")
+
+    @classmethod
+    def from_dict(cls, description):
+        """
+        Creates a network from its description:
+        {"stops": [names...], "lines": [{"name": ..., "stops": [names...], "destinations": [names...], "loop": true}]}
+        The list of stops is optional and defaults to the stops of the lines, in order of appearance;
+        lines are loops unless "loop" is false
+        :param description: the description of the network
+        :return: the network
+        """
+        stops = list(description.get("stops", ()))
+        known = set(stops)
+        for line in description["lines"]:
+            for stop in line["stops"]:
+                if stop not in known:
+                    known.add(stop)
+                    stops.append(stop)
+        stop_ids = dict((name, stop_id) for stop_id, name in enumerate(stops))
+
+        lines = list()
+        for i, line in enumerate(description["lines"]):
+            lines.append((line.get("name", str(i)), [stop_ids[s] for s in line["stops"]],
+                          [stop_ids[s] for s in line.get("destinations", ())], line.get("loop", True)))
+        return cls(stops, lines)
+
+    def to_dict(self):
+        # type: () -> dict
+        """
+        Describes this network in the format of from_dict
+        :return: the description of the network
+        """
+        return {
+            "stops": list(self.stops),
+            "lines": [{"name": name, "stops": [self.stops[s] for s in line_stops],
+                       "destinations": [self.stops[s] for s in line_destinations], "loop": loop}
+                      for name, line_stops, line_destinations, loop in self.lines]
+        }
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a network from a JSON file, see from_dict for its format
+        :param path: the path of the file
+        :return: the network
+        """
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def first_slot(self, location):
+        # type: (str) -> int
+        """
+        Returns the first slot of a bus stop
+        :param location: the name of the bus stop
+        :return: the first slot of the bus stop
+        """
+        return self.stop_slots[self.stop_ids[location]][0]
+
+    def line_start(self, location):
+        # type: (str) -> int
+        """
+        Returns the first slot of the first line serving a bus stop, where a new bus for that stop should start
+        :param location: the name of the bus stop
+        :return: the first slot of the line
+        """
+        return self.line_first_slot[self.slot_line[self.first_slot(location)]]
+
+    def random_source(self, rng=r):
+        """
+        Generate a random source location from the available ones
+        :param rng: the random number generator to use
+        :return: A randomly chosen location (not a destination)
+        """
+        return self.sources[rng.randrange(len(self.sources))]
+
+
+DEFAULT_NETWORK = RouteNetwork(LOCATIONS, [("Line 1", range(len(LOCATIONS)), [0], True)])
+"""A single loop line through all LOCATIONS, with the first one as destination"""
+
+NEXT_LOCATION = dict((DEFAULT_NETWORK.slot_location[slot], DEFAULT_NETWORK.slot_location[next_slot])
+                     for slot, next_slot in enumerate(DEFAULT_NETWORK.slot_next))
+
+
+def get_random_source(rng=r, network=DEFAULT_NETWORK):
     """
     Generate a random source location from the available ones
+    :param rng: the random number generator to use
+    :param network: the network of the locations
     :return: A randomly chosen location (not the destination)
     """
-    return LOCATIONS[r.randrange(1, len(LOCATIONS))]
+    return network.random_source(rng)
 
 
 def get_next(location):
@@ -20,11 +167,4 @@ def get_next(location):
     :param location: the location before the one to return
     :return: the next location
     """
-
-    try:
-        index = (LOCATIONS.index(location) + 1) % len(LOCATIONS)
-        next_location = LOCATIONS[index]
-    except ValueError:
-        next_location = LOCATIONS[0]
-
-    return next_location
+    return NEXT_LOCATION.get(location, LOCATIONS[0])
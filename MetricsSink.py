@@ -0,0 +1,134 @@
+import csv
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from SimulationListener import SimulationListener
+
+COUNTERS = ("delivered", "expelled", "tired", "riots", "buses_spawned")
+"""Outcome counters of the simulation, written as their change in each turn"""
+
+BATCH_SIZE = 4096
+"""Default number of rows kept in memory before writing them to the file"""
+
+
+class MetricsSink(SimulationListener):
+    def __init__(self, simulation, path, file_format=None, batch_size=BATCH_SIZE):
+        """
+        Writes a row of aggregates of the simulation at the end of every turn into a file, in batches of rows, so
+        that memory use doesn't grow with the number of turns.
+        Each row has the turn and time, the number of actors waiting at each bus stop (one column per stop), the
+        number of buses and of passengers on each of them, the number of tricksters on the buses, the number of
+        delivered, expelled and tired actors, riots and buses sent during the turn, and the mean and maximum travel
+        time of the actors in the simulation.
+        Rows are written as Parquet row groups if pyarrow is available, or as CSV, where the passengers of the buses
+        are separated by spaces.
+        The sink registers itself as a listener of the simulation, and closes the file when the simulation ends.
+        :type simulation: TransportManagement.TransportManagement
+        :param simulation: the simulation to measure
+        :param path: the path of the file
+        :param file_format: "parquet" or "csv", None to choose from the extension of the path
+        :param batch_size: number of rows to buffer before writing them
+        """
+        if file_format is None:
+            file_format = "parquet" if path.endswith(".parquet") else "csv"
+        if file_format == "parquet" and pa is None:
+            raise ImportError("Writing metrics as Parquet requires pyarrow: pip install pyarrow")
+        if file_format not in ("parquet", "csv"):
+            raise ValueError("Unknown metrics format {!r}, expected parquet or csv".format(file_format))
+
+        self.path = path
+        self.file_format = file_format
+        self.batch_size = batch_size
+        self.fields = ["turn", "time"] + ["waiting " + stop for stop in simulation.network.stops] + \
+            ["buses", "riders", "tricksters"] + list(COUNTERS) + ["mean_travel_time", "max_travel_time"]
+        self.columns = dict((field, list()) for field in self.fields)
+        """Buffered rows, as one list per field"""
+        self.schema = self.parquet_schema() if file_format == "parquet" else None
+        """Types of the Parquet columns, fixed so that every batch has the same ones, whatever its values"""
+        self.rows = 0
+        """Number of rows written or buffered so far"""
+        self.last_counts = dict((counter, getattr(simulation, counter)) for counter in COUNTERS)
+        self.file = None
+        self.writer = None
+        self.closed = False
+        simulation.add_listener(self)
+
+    def parquet_schema(self):
+        """
+        Types the Parquet columns: times are doubles (travel times are null while there are no actors), the
+        passengers of the buses are lists of integers and all the other columns are integers
+        :return: the pyarrow schema
+        """
+        doubles = ("time", "mean_travel_time", "max_travel_time")
+        return pa.schema([(field, pa.float64() if field in doubles else
+                           pa.list_(pa.int64()) if field == "riders" else pa.int64())
+                          for field in self.fields])
+
+    def turn_ended(self, simulation):
+        if self.closed:
+            return
+        metrics = simulation.metrics()
+        columns = self.columns
+        columns["turn"].append(self.rows)
+        columns["time"].append(simulation.global_time)
+        for stop, waiting in zip(simulation.network.stops, metrics["waiting"]):
+            columns["waiting " + stop].append(waiting)
+        columns["buses"].append(len(metrics["riders"]))
+        columns["riders"].append(metrics["riders"])
+        columns["tricksters"].append(metrics["tricksters"])
+        for counter in COUNTERS:
+            count = getattr(simulation, counter)
+            columns[counter].append(count - self.last_counts[counter])
+            self.last_counts[counter] = count
+        columns["mean_travel_time"].append(metrics["mean_travel_time"])
+        columns["max_travel_time"].append(metrics["max_travel_time"])
+        self.rows = self.rows + 1
+
+        if len(columns["turn"]) >= self.batch_size:
+            self.flush()
+        if not simulation.simulation_on:
+            self.close()
+
+    def flush(self):
+        """
+        Writes the buffered rows to the file, opening it the first time
+        """
+        if not self.columns["turn"]:
+            return
+        if self.file_format == "parquet":
+            table = pa.table([self.columns[field] for field in self.fields], schema=self.schema)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.path, self.schema)
+            self.writer.write_table(table)
+        else:
+            if self.writer is None:
+                self.file = open(self.path, "w", newline="")
+                self.writer = csv.writer(self.file)
+                self.writer.writerow(self.fields)
+            self.columns["riders"] = [" ".join(str(r) for r in riders) for riders in self.columns["riders"]]
+            self.writer.writerows(zip(*[self.columns[field] for field in self.fields]))
+        self.columns = dict((field, list()) for field in self.fields)
+
+    def close(self):
+        """
+        Writes the buffered rows and closes the file. Later turns are not recorded
+        """
+        if self.closed:
+            return
+        self.flush()
+        if self.file_format == "parquet":
+            if self.writer is not None:
+                self.writer.close()
+        elif self.file is not None:
+            self.file.close()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
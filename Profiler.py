@@ -0,0 +1,187 @@
+import time
+
+# Phases of a turn
+SPAWN = "spawn"
+"""Spawning a new actor"""
+ARRIVALS = "arrivals"
+"""Finding the buses at a bus stop, and grouping passengers by bus in the columnar engine"""
+FINAL_STOP = "final stop"
+"""Dropping the commuters of the buses at the destination"""
+INSPECTION = "inspection"
+"""Inspectors checking the tricksters"""
+COLLECTION = "collection"
+"""Collecting the actors waiting at the bus stops"""
+TIRED = "tired"
+"""Dropping tired passengers and inspectors who have finished their job"""
+RIOTS = "riots"
+"""Destroying overcrowded buses"""
+BUS_SPAWN = "bus spawn"
+"""Sending new buses to crowded bus stops"""
+MOVEMENT = "movement"
+"""Advancing the buses"""
+AGING = "aging"
+"""Aging the actors"""
+TERMINATION = "termination"
+"""Checking if the simulation has ended"""
+LISTENERS = "listeners"
+"""Notifying the end of the turn to the listeners"""
+
+PHASES = (SPAWN, ARRIVALS, FINAL_STOP, INSPECTION, COLLECTION, TIRED, RIOTS, BUS_SPAWN, MOVEMENT, AGING,
+          TERMINATION, LISTENERS)
+
+# Work counters
+ACTORS_SCANNED = "actors scanned"
+"""Actors or passengers checked one by one"""
+PASSENGERS_MOVED = "passengers moved"
+"""Passengers collected from a bus stop or dropped from a bus"""
+REMOVALS = "list removals"
+"""Actors and buses removed from the indexes of the simulation"""
+EVENTS_RENDERED = "event strings built"
+"""Events rendered into narrative text"""
+
+COUNTERS = (ACTORS_SCANNED, PASSENGERS_MOVED, REMOVALS, EVENTS_RENDERED)
+
+
+class Profiler(object):
+    enabled = True
+
+    def __init__(self, clock=time.perf_counter):
+        """
+        Records the wall time spent in each phase of the turns of a simulation, and counts of the work done.
+        Phases are timed as laps: lap(phase) charges the time elapsed since the previous lap (or since start) to
+        the given phase, so a turn costs a single clock reading per phase
+        :param clock: the clock to read, in seconds
+        """
+        self.clock = clock
+        self.times = dict((phase, 0.0) for phase in PHASES)
+        """Total time spent in each phase, in seconds"""
+        self.laps = dict((phase, 0) for phase in PHASES)
+        """Number of laps charged to each phase"""
+        self.counts = dict((counter, 0) for counter in COUNTERS)
+        """Total of each work counter"""
+        self.turns = 0
+        """Number of turns stepped forward"""
+        self.last = clock()
+
+    def start(self):
+        """
+        Starts timing a new sequence of laps
+        """
+        self.last = self.clock()
+
+    def lap(self, phase):
+        """
+        Charges the time elapsed since the previous lap to a phase
+        :param phase: the phase, one of the phases of this module
+        """
+        now = self.clock()
+        self.times[phase] = self.times[phase] + (now - self.last)
+        self.laps[phase] = self.laps[phase] + 1
+        self.last = now
+
+    def count(self, counter, amount=1):
+        """
+        Adds some work to a counter
+        :param counter: the counter, one of the counters of this module
+        :param amount: the amount of work
+        """
+        self.counts[counter] = self.counts[counter] + amount
+
+    def turn_ended(self):
+        """
+        Counts a turn
+        """
+        self.turns = self.turns + 1
+
+    def reset(self):
+        """
+        Forgets all the recorded times and counts
+        """
+        self.__init__(self.clock)
+
+    def as_dict(self):
+        # type: () -> dict
+        """
+        Returns the recorded times and counts
+        :return: the time and number of laps of each phase, the counters and the number of turns
+        """
+        return {
+            "turns": self.turns,
+            "phases": dict((phase, {"time": self.times[phase], "laps": self.laps[phase]}) for phase in PHASES),
+            "counters": dict(self.counts)
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Creates a profiler with the times and counts returned by as_dict, to merge them into another profiler
+        :param data: the times and counts
+        :return: the profiler
+        """
+        profiler = cls()
+        profiler.turns = data["turns"]
+        for phase in PHASES:
+            profiler.times[phase] = data["phases"][phase]["time"]
+            profiler.laps[phase] = data["phases"][phase]["laps"]
+        profiler.counts.update(data["counters"])
+        return profiler
+
+    def merge(self, other):
+        """
+        Adds the times and counts of another profiler of the same turns, like the one of a worker running part of
+        the simulation: times and counts are summed, the number of turns is the largest of the two
+        :type other: Profiler
+        :param other: the other profiler
+        """
+        for phase in PHASES:
+            self.times[phase] = self.times[phase] + other.times[phase]
+            self.laps[phase] = self.laps[phase] + other.laps[phase]
+        for counter in COUNTERS:
+            self.counts[counter] = self.counts[counter] + other.counts[counter]
+        self.turns = max(self.turns, other.turns)
+
+    def report(self):
+        # type: () -> str
+        """
+        Generates the tables of the time spent in each phase and of the work counters, in total and per turn
+        :return: the report
+        """
+        from prettytable import PrettyTable
+        turns = max(self.turns, 1)
+        total = sum(self.times.values())
+
+        phases = PrettyTable()
+        phases.field_names = ["Phase", "Laps", "Total (s)", "Per turn (ms)", "Share"]
+        for phase in PHASES:
+            phases.add_row([phase, self.laps[phase], "{:.6f}".format(self.times[phase]),
+                            "{:.4f}".format(1000 * self.times[phase] / turns),
+                            "{:.1%}".format(self.times[phase] / total if total > 0 else 0)])
+
+        counters = PrettyTable()
+        counters.field_names = ["Counter", "Total", "Per turn"]
+        for counter in COUNTERS:
+            counters.add_row([counter, self.counts[counter], "{:.1f}".format(float(self.counts[counter]) / turns)])
+
+        return "PROFILE OF {:d} TURNS ({:.6f} s)\n".format(self.turns, total) + str(phases) + "\n" + str(counters)
+
+
+class NullProfiler(Profiler):
+    enabled = False
+
+    def __init__(self):
+        """
+        Profiler which records nothing: profiling is turned off
+        """
+        super(NullProfiler, self).__init__(clock=lambda: 0.0)
+
+    def start(self):
+        pass
+
+    def lap(self, phase):
+        pass
+
+    def count(self, counter, amount=1):
+        pass
+
+    def turn_ended(self):
+        pass
@@ -0,0 +1,168 @@
+import random
+
+_numpy = None
+"""NumPy, imported the first time it is needed (so that it isn't loaded by processes which never draw in batches),
+False if it isn't installed"""
+
+NUMPY_STATE = "MT19937"
+"""First item of the state of a NumPy RandomState, to tell it from the state of a random.Random"""
+
+BUFFER_SIZE = 1024
+"""Number of random numbers drawn at once by a buffered stream"""
+
+
+def numpy_module():
+    """
+    Imports NumPy, the first time it is needed
+    :return: the numpy module, None if it isn't installed
+    """
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+
+class RandomStream(random.Random):
+    """
+    A random number generator with a buffered batch mode: batch() serves several uniform draws at once from a buffer
+    refilled in large blocks.
+    Batched draws come from a child generator (NumPy's when it is available, else a random.Random), seeded by
+    this stream with a single draw the first time it is needed. After that, batches and the draws of random(),
+    randrange() and the other random.Random methods never shift each other: mixing them gives the same numbers as
+    making the same draws in any other order.
+    """
+
+    def __init__(self, seed=None):
+        super(RandomStream, self).__init__(seed)
+        self.buffer = list()
+        self.buffer_position = 0
+        self.generator = None
+
+    def getstate(self):
+        """
+        Returns the internal state of this stream, including the random numbers left in the buffer and the state of
+        its child generator, so that it can be restored with setstate
+        :return: the state of the stream
+        """
+        if self.generator is None:
+            generator_state = None
+        elif isinstance(self.generator, random.Random):
+            generator_state = self.generator.getstate()
+        else:
+            generator_state = self.generator.get_state()
+        return super(RandomStream, self).getstate(), self.buffer[self.buffer_position:], generator_state
+
+    def setstate(self, state):
+        """
+        Restores the internal state of this stream. An existing NumPy generator is restored in place, so that
+        references to it stay valid
+        :param state: a state returned by getstate
+        """
+        internal_state, buffer, generator_state = state
+        if generator_state is None:
+            self.generator = None
+        elif generator_state[0] != NUMPY_STATE:
+            # State of a random.Random child generator: (version, internal state, gauss)
+            self.generator = random.Random()
+            self.generator.setstate((generator_state[0], tuple(generator_state[1]), generator_state[2]))
+        else:
+            if not isinstance(self.generator, numpy_module().random.RandomState):
+                self.generator = numpy_module().random.RandomState()
+            self.generator.set_state(generator_state)
+        super(RandomStream, self).setstate(internal_state)
+        self.buffer = list(buffer)
+        self.buffer_position = 0
+
+    def numpy_generator(self):
+        """
+        Gets the NumPy generator seeded by this stream, creating it the first time
+        :return: the NumPy RandomState of this stream
+        """
+        if self.generator is None:
+            self.generator = numpy_module().random.RandomState(self.getrandbits(32))
+        return self.generator
+
+    def batch_generator(self):
+        """
+        Gets the child generator of the batches, creating it the first time
+        :return: the NumPy generator of this stream when NumPy is available, else a random.Random seeded by it
+        """
+        if self.generator is None and numpy_module() is None:
+            self.generator = random.Random(self.getrandbits(32))
+        return self.generator if self.generator is not None else self.numpy_generator()
+
+    def draw(self, count):
+        # type: (int) -> list
+        """
+        Draws new random numbers for batches, bypassing the buffer
+        :param count: number of random numbers to draw
+        :return: the list of random numbers
+        """
+        generator = self.batch_generator()
+        if isinstance(generator, random.Random):
+            return [generator.random() for _ in range(count)]
+        return generator.random_sample(count).tolist()
+
+    def refill(self, count):
+        """
+        Refills the buffer with at least count new random numbers, keeping the ones not used yet
+        :param count: minimum number of random numbers to add to the buffer
+        """
+        self.buffer = self.buffer[self.buffer_position:] + self.draw(max(count, BUFFER_SIZE))
+        self.buffer_position = 0
+
+    def batch(self, count):
+        # type: (int) -> list
+        """
+        Draws count random floats in [0, 1) at once.
+        Batches needing at least BUFFER_SIZE new numbers are returned without going through the buffer, so that
+        the buffer never holds more than BUFFER_SIZE numbers after a large batch (like the spawn of a big population)
+        :param count: number of random numbers to draw
+        :return: the list of random numbers
+        """
+        available = len(self.buffer) - self.buffer_position
+        if available < count:
+            if count - available >= BUFFER_SIZE:
+                draws = self.buffer[self.buffer_position:] + self.draw(count - available)
+                self.buffer = list()
+                self.buffer_position = 0
+                return draws
+            self.refill(count)
+        start = self.buffer_position
+        self.buffer_position = start + count
+        return self.buffer[start:self.buffer_position]
+
+
+class RandomStreams(object):
+    STREAMS = ("spawning", "movement", "inspection")
+
+    def __init__(self, seed=None):
+        """
+        Independent random number streams of a simulation: one to spawn actors and buses, one to move buses
+        and one for inspections. All streams are derived from the same seed.
+        :param seed: seed of the streams, None to seed them from the operating system
+        """
+        root = random.Random(seed)
+        self.spawning = RandomStream(root.getrandbits(64))
+        self.movement = RandomStream(root.getrandbits(64))
+        self.inspection = RandomStream(root.getrandbits(64))
+
+    def getstate(self):
+        # type: () -> dict
+        """
+        Returns the state of all the streams
+        :return: the state of each stream, by stream name
+        """
+        return dict((name, getattr(self, name).getstate()) for name in RandomStreams.STREAMS)
+
+    def setstate(self, state):
+        """
+        Restores the state of all the streams
+        :param state: a state returned by getstate
+        """
+        for name in RandomStreams.STREAMS:
+            getattr(self, name).setstate(state[name])
@@ -0,0 +1,596 @@
+import multiprocessing
+import random
+
+import Bus as B
+import Commuter as C
+import Profiler as P
+import TicketInspector as T
+import TransportManagement as TM
+import TripStatistics as TS
+
+# Commands sent by the coordinator to the workers
+POPULATE = "populate"
+PROCESS = "process"
+STEP = "step"
+METRICS = "metrics"
+TRIPS = "trips"
+PROFILE = "profile"
+CLOSE = "close"
+
+COUNTERS = ("delivered", "delivered_travel_time", "expelled", "tired", "riots", "buses_spawned", "commuters_count")
+"""Counters of the shards, summed by the coordinator at the end of every turn"""
+
+
+def partition(network, shards):
+    # type: (Locations.RouteNetwork, int) -> list
+    """
+    Splits the bus stops of a network into contiguous blocks of stop ids, one per shard, so that buses running along
+    their lines cross few shard boundaries
+    :param network: the network
+    :param shards: number of shards, at most the number of bus stops
+    :return: the shard of each bus stop, indexed by stop id
+    """
+    return [stop * shards // len(network.stops) for stop in range(len(network.stops))]
+
+
+def shard_seed(seed, shard):
+    # type: (int, int) -> int
+    """
+    Derives the seed of the random number streams of a shard from the seed of the simulation
+    :param seed: the seed of the simulation, None to seed the shard from the operating system
+    :param shard: the index of the shard
+    :return: the seed of the shard
+    """
+    if seed is None:
+        return None
+    return random.Random("{:d}/shard {:d}".format(seed, shard)).getrandbits(64)
+
+
+def pack(passengers):
+    # type: (list) -> tuple
+    """
+    Packs actors into columns of plain values, which are much faster to send to another process than the
+    Commuter and TicketInspector objects themselves
+    :param passengers: the actors
+    :return: the columns of the attributes of the actors, then the columns of the attributes of the inspectors
+    among them
+    """
+    inspectors = [p for p in passengers if p.mark == "T"]
+    return ([p.id for p in passengers], [p.sex for p in passengers], [p.name for p in passengers],
+            [p.hometown for p in passengers], [p.has_ticket for p in passengers],
+            [p.travel_time for p in passengers], [p.mark == "T" for p in passengers],
+            [i.p_female_trickster_expulsion for i in inspectors], [i.p_male_trickster_expulsion for i in inspectors],
+            [i.time_no_violation for i in inspectors])
+
+
+def unpack(columns, position=None):
+    # type: (tuple, str) -> list
+    """
+    Rebuilds actors packed by pack
+    :param columns: the packed actors
+    :param position: the position of the actors, None for their hometown
+    :return: the actors
+    """
+    ids, sexes, names, hometowns, tickets, travel_times, is_inspector, p_female, p_male, idle = columns
+    inspectors = iter(zip(p_female, p_male, idle))
+    passengers = list()
+    for actor_id, sex, name, hometown, has_ticket, travel_time, inspector in zip(
+            ids, sexes, names, hometowns, tickets, travel_times, is_inspector):
+        if inspector:
+            passengers.append(T.TicketInspector.restore(actor_id, sex, name, hometown, position or hometown,
+                                                        has_ticket, travel_time, *next(inspectors)))
+        else:
+            passengers.append(C.Commuter.restore(actor_id, sex, name, hometown, position or hometown, has_ticket,
+                                                 travel_time))
+    return passengers
+
+
+class Shard(TM.TransportManagement):
+    def __init__(self, index, stop_shard, **parameters):
+        """
+        Part of a sharded simulation, run by a worker process: the bus stops of the shard, the actors waiting there
+        and the buses whose last bus stop is one of them, with their passengers.
+        The shard runs the turns of TransportManagement on its own, except for what the coordinator decides for
+        the whole simulation: which actors spawn, where new buses are sent and when the simulation ends
+        :param index: the index of the shard
+        :param stop_shard: the shard of each bus stop, indexed by stop id
+        :param parameters: keyword arguments for TransportManagement, without the initial actors and buses
+        """
+        self.index = index
+        self.stop_shard = stop_shard
+        self.incoming_actors = list()
+        """Actors spawned by the coordinator at the bus stops of this shard, added at the beginning of the turn"""
+        super(Shard, self).__init__(initial_actors=0, initial_buses=0, **parameters)
+
+    def spawn_due_actors(self):
+        new_actors = self.add_actors(self.incoming_actors)
+        self.incoming_actors = list()
+        return new_actors
+
+    def crowded_stop(self):
+        # New buses are sent by the coordinator, see first_crowded_stop
+        return None
+
+    def check_termination(self):
+        # The end of the simulation is decided by the coordinator
+        pass
+
+    def travel_time_stats(self):
+        # Buses coming from other shards bring older actors: actors are not in order of creation
+        if not self.actors:
+            return None, None
+        travel_times = [a.travel_time for a in self.actors.values()]
+        return float(sum(travel_times)) / len(travel_times), max(travel_times)
+
+    def populate(self, actors, buses):
+        """
+        Adds the initial actors and buses of the shard
+        :param actors: the actors waiting at bus stops of this shard, packed by pack
+        :param buses: the buses, as (bus id, slot) tuples
+        """
+        self.add_actors(unpack(actors))
+        for bus_id, slot in buses:
+            self.buses.append(B.Bus.restore(bus_id, slot, True, self.p_bus_advancement, self.rng.movement,
+                                            self.network))
+
+    def adopt(self, buses):
+        """
+        Takes over buses coming from other shards, with their passengers
+        :param buses: the buses, as returned by emigrate
+        """
+        for bus_id, slot, is_at_bus_stop, packed in buses:
+            bus = B.Bus.restore(bus_id, slot, is_at_bus_stop, self.p_bus_advancement, self.rng.movement,
+                                self.network)
+            passengers = unpack(packed, bus.name)
+            for passenger in passengers:
+                self.actors[passenger.id] = passenger
+                if passenger.mark != "T":
+                    self.commuters_count = self.commuters_count + 1
+            bus.collect_all_passengers(passengers)
+            self.buses.append(bus)
+
+    def emigrate(self):
+        # type: () -> list
+        """
+        Hands over the buses whose last bus stop belongs to another shard, with their passengers
+        :return: the buses, as (shard, bus id, slot, is at bus stop, packed passengers) tuples, see pack
+        """
+        staying = list()
+        leaving = list()
+        for bus in self.buses:
+            shard = self.stop_shard[self.network.slot_stop[bus.slot]]
+            if shard == self.index:
+                staying.append(bus)
+                continue
+            passengers = list(bus.passengers.values())
+            for passenger in passengers:
+                del self.actors[passenger.id]
+                if passenger.mark != "T":
+                    self.commuters_count = self.commuters_count - 1
+            leaving.append((shard, bus.id, bus.slot, bus.is_at_bus_stop, pack(passengers)))
+        self.buses = staying
+        return leaving
+
+    def first_crowded_stop(self):
+        """
+        Finds the crowded bus stop of this shard where a new bus would be sent
+        :return: the id of the crowded bus stop with the lowest id, None if no bus stop is crowded
+        """
+        bus_stop = super(Shard, self).crowded_stop()
+        return self.network.stop_ids[bus_stop] if bus_stop is not None else None
+
+    def begin_turn(self, buses, actors):
+        """
+        Processes a turn, up to the riots
+        :param buses: the buses coming from other shards, see adopt
+        :param actors: the actors spawned in this turn at bus stops of this shard
+        :return: the id of the crowded bus stop where a new bus would be sent, see first_crowded_stop
+        """
+        self.adopt(buses)
+        self.incoming_actors = actors
+        self.process_turn()
+        return self.first_crowded_stop()
+
+    def end_turn(self, bus_stop, bus_id):
+        """
+        Sends a new bus if the coordinator says so, then steps forward
+        :param bus_stop: the id of the bus stop where to send a new bus, None if there's none
+        :param bus_id: the id of the new bus
+        :return: the buses leaving this shard, see emigrate, the counters of this shard and its live metrics, with
+        the id of each bus
+        """
+        if bus_stop is not None:
+            B.Bus.old_id = bus_id
+            self.send_bus(self.network.stops[bus_stop])
+        self.step_forward()
+        leaving = self.emigrate()
+        live_metrics = self.live_metrics()
+        live_metrics["bus_ids"] = [b.id for b in self.buses]
+        return leaving, dict((counter, getattr(self, counter)) for counter in COUNTERS), live_metrics
+
+    def shard_metrics(self):
+        # type: () -> dict
+        """
+        Aggregates the current state of the shard, see ShardedTransportManagement.metrics
+        :return: the metrics of the shard, with the id of each bus and the total travel time of the actors
+        """
+        metrics = self.metrics()
+        metrics["bus_ids"] = [b.id for b in self.buses]
+        metrics["total_travel_time"] = sum(a.travel_time for a in self.actors.values())
+        return metrics
+
+
+def serve(connection, index, stop_shard, parameters):
+    """
+    Runs a shard in a worker process, answering the commands of the coordinator until told to close
+    :param connection: the end of the pipe to the coordinator
+    :param index: the index of the shard
+    :param stop_shard: the shard of each bus stop, indexed by stop id
+    :param parameters: keyword arguments for Shard
+    """
+    shard = Shard(index, stop_shard, **parameters)
+    while True:
+        command, arguments = connection.recv()
+        if command == POPULATE:
+            connection.send(shard.populate(*arguments))
+        elif command == PROCESS:
+            connection.send(shard.begin_turn(*arguments))
+        elif command == STEP:
+            connection.send(shard.end_turn(*arguments))
+        elif command == METRICS:
+            connection.send(shard.shard_metrics())
+        elif command == TRIPS:
+            connection.send(shard.trips.to_dict())
+        elif command == PROFILE:
+            connection.send(shard.profiler.as_dict())
+        elif command == CLOSE:
+            break
+    connection.close()
+
+
+class ShardedTransportManagement(TM.TransportManagement):
+    """
+    Alternative simulation engine with the same headless API as TransportManagement, which splits the bus stops of
+    the network (and the actors waiting there) across worker processes, see partition.
+    Each worker runs the turns of its own Shard: the buses whose last bus stop belongs to it, with their passengers.
+    When a bus advances to a bus stop of another shard, the bus and its passengers are handed over to that shard,
+    in a single message per worker at the turn boundary.
+    This object is the coordinator: it spawns all actors (so that ids are unique) and sends them to the shard of
+    their bus stop, and it combines the shards with a reduction in each turn:
+    - after processing the turn, the shards report their first crowded bus stop, and the coordinator sends a new
+      bus to the one with the lowest id, as TransportManagement does;
+    - after stepping forward, the shards report their counters, which are summed to decide if the simulation ends.
+    Riots only depend on the passengers of a bus, so they are decided by the shards on their own.
+    Each shard has its own random number streams, derived from the seed: outcomes are statistically the same as
+    the ones of TransportManagement, but the same seed gives a different simulation for every number of shards.
+    Events are not captured, and there are no status tables nor checkpoints: the engine is meant for headless runs.
+    Call close() to stop the workers early; they are stopped when the simulation ends.
+    Each shard records the trip statistics of the commuters leaving it: self.trips fetches and merges them while
+    the workers are running, and keeps the merged statistics once they are stopped. Profiles work the same way,
+    see self.profiler.
+    """
+    STATUS_TABLES = False
+    CHECKPOINTS = False
+
+    def __init__(
+            self,
+            max_t=TM.MAX_T,
+            delta_t=TM.DELTA_T,
+            p_inspector=TM.P_INSPECTOR,
+            p_bus_advancement=TM.P_BUS_ADVANCEMENT,
+            initial_actors=TM.INITIAL_ACTORS,
+            initial_buses=TM.INITIAL_BUSES,
+            spawn_delay=TM.SPAWN_DELAY,
+            commuters_rage_threshold=TM.COMMUTERS_RAGE_THRESHOLD,
+            spawn_new_bus_threshold=TM.SPAWN_NEW_BUS_THRESHOLD,
+            seed=None,
+            rng=None,
+            capture_events=False,
+            network=None,
+            profile=False,
+            trip_statistics=False,
+            shards=2
+    ):
+        """
+        Constructor and setup method, see TransportManagement
+        :param capture_events: must be False, events are not captured
+        :param shards: number of worker processes, at most the number of bus stops
+        """
+        if capture_events:
+            raise ValueError("A sharded simulation doesn't capture events, it is meant for headless runs")
+        super(ShardedTransportManagement, self).__init__(
+            max_t=max_t,
+            delta_t=delta_t,
+            p_inspector=p_inspector,
+            p_bus_advancement=p_bus_advancement,
+            initial_actors=0,
+            initial_buses=0,
+            spawn_delay=spawn_delay,
+            commuters_rage_threshold=commuters_rage_threshold,
+            spawn_new_bus_threshold=spawn_new_bus_threshold,
+            seed=seed,
+            rng=rng,
+            capture_events=capture_events,
+            network=network,
+            profile=profile,
+            trip_statistics=trip_statistics
+        )
+        self.initial_actors = initial_actors
+        self.initial_buses = initial_buses
+
+        # Actors and buses live in the shards
+        self.actors = None
+        self.waiting = None
+        self.buses = None
+
+        self.shards = max(1, min(shards, len(self.network.stops)))
+        self.stop_shard = partition(self.network, self.shards)
+        self.in_transit = [list() for _ in range(self.shards)]
+        """Buses handed over to each shard at the next turn boundary"""
+        self.bus_stop_to_serve = None
+        """Id of the crowded bus stop where a new bus is sent in the current turn"""
+        self.last_live_metrics = None
+        """Live metrics of the shards combined at the end of the last turn, see live_metrics"""
+        self.final_metrics = None
+        """Metrics of the simulation when the workers were stopped, see metrics"""
+
+        shard_parameters = self.parameters()
+        del shard_parameters["initial_actors"]
+        del shard_parameters["initial_buses"]
+        self.connections = list()
+        self.workers = list()
+        for index in range(self.shards):
+            connection, worker_connection = multiprocessing.Pipe()
+            parameters = dict(shard_parameters, seed=shard_seed(seed, index), capture_events=False,
+                              network=self.network, profile=profile, trip_statistics=trip_statistics)
+            worker = multiprocessing.Process(target=serve, args=(worker_connection, index, self.stop_shard,
+                                                                 parameters))
+            worker.daemon = True
+            worker.start()
+            worker_connection.close()
+            self.connections.append(connection)
+            self.workers.append(worker)
+
+        # Setup: spawn initial actors and buses, and hand them to their shards
+        actors = [list() for _ in range(self.shards)]
+        for actor in self.create_actors(self.initial_actors):
+            actors[self.shard_of(actor.position)].append(actor)
+            if actor.mark != "T":
+                self.commuters_count = self.commuters_count + 1
+        buses = [list() for _ in range(self.shards)]
+        for slot in self.rng.spawning.sample(range(len(self.network.slot_stop)), self.initial_buses):
+            buses[self.stop_shard[self.network.slot_stop[slot]]].append((self.new_bus_id(), slot))
+        self.broadcast(POPULATE, [(pack(actors[i]), buses[i]) for i in range(self.shards)])
+
+    def shard_of(self, location):
+        # type: (str) -> int
+        """
+        Finds the shard of a bus stop
+        :param location: the name of the bus stop
+        :return: the index of the shard
+        """
+        return self.stop_shard[self.network.stop_ids[location]]
+
+    @staticmethod
+    def new_bus_id():
+        # type: () -> int
+        """
+        Allocates the id of a new bus, so that buses spawned by different shards never share an id
+        :return: the id
+        """
+        bus_id = B.Bus.old_id
+        B.Bus.old_id = bus_id + 1
+        return bus_id
+
+    def broadcast(self, command, arguments):
+        # type: (str, list) -> list
+        """
+        Sends a command to all the workers, so that they run it in parallel, and waits for their answers
+        :param command: the command
+        :param arguments: the arguments of the command for each shard, in order of shard
+        :return: the answers of the shards, in order of shard
+        """
+        for connection, shard_arguments in zip(self.connections, arguments):
+            connection.send((command, shard_arguments))
+        return [connection.recv() for connection in self.connections]
+
+    def process_turn(self):
+        """
+        Spawns the actors due in this turn and lets every shard process the turn, see Shard.begin_turn
+        """
+        self.events.clear()
+        actors = [list() for _ in range(self.shards)]
+        for new_actor in self.spawn_due_actors():
+            actors[self.shard_of(new_actor.position)].append(new_actor)
+        in_transit = self.in_transit
+        self.in_transit = [list() for _ in range(self.shards)]
+
+        crowded = [bus_stop for bus_stop in self.broadcast(PROCESS, list(zip(in_transit, actors)))
+                   if bus_stop is not None]
+        self.bus_stop_to_serve = min(crowded) if crowded else None
+
+    def spawn_actor(self):
+        # The actor is sent to its shard by process_turn
+        new_actor = self.create_actor()
+        if new_actor.mark != "T":
+            self.commuters_count = self.commuters_count + 1
+        self.last_spawn_time = self.global_time
+        return new_actor
+
+    def step_forward(self):
+        """
+        Lets every shard send the new bus (if its bus stop is the one to serve) and step forward, then hands over
+        the buses changing shard and sums the counters of the shards
+        """
+        bus_stop = self.bus_stop_to_serve
+        arguments = list()
+        for index in range(self.shards):
+            if bus_stop is not None and self.stop_shard[bus_stop] == index:
+                arguments.append((bus_stop, self.new_bus_id()))
+            else:
+                arguments.append((None, None))
+
+        totals = dict((counter, 0) for counter in COUNTERS)
+        shard_live_metrics = list()
+        for leaving, counters, live_metrics in self.broadcast(STEP, arguments):
+            for shard, bus_id, slot, is_at_bus_stop, packed in leaving:
+                self.in_transit[shard].append((bus_id, slot, is_at_bus_stop, packed))
+                totals["commuters_count"] = totals["commuters_count"] + len(packed[0]) - len(packed[7])
+            for counter in COUNTERS:
+                totals[counter] = totals[counter] + counters[counter]
+            shard_live_metrics.append(live_metrics)
+        for counter in COUNTERS:
+            setattr(self, counter, totals[counter])
+        self.last_live_metrics = self.combine_live_metrics(shard_live_metrics)
+
+        self.global_time = self.global_time + self.delta_t
+        self.check_termination()
+        for listener in self.listeners:
+            listener.turn_ended(self)
+        self.merged_profiler.turn_ended()
+        if not self.simulation_on:
+            self.close()
+
+    def metrics(self):
+        # type: () -> dict
+        """
+        Aggregates the current state of the shards, see TransportManagement.metrics.
+        Buses in transit between two shards are counted in the shard they are going to. Once the workers are
+        stopped, the metrics are the ones they had when stopped
+        :return: the metrics of the whole simulation
+        """
+        if not self.connections:
+            return self.final_metrics
+        shard_metrics = self.broadcast(METRICS, [()] * self.shards)
+        for shard, buses in enumerate(self.in_transit):
+            for bus_id, slot, is_at_bus_stop, packed in buses:
+                ids, tickets, travel_times = packed[0], packed[4], packed[5]
+                metrics = shard_metrics[shard]
+                metrics["bus_ids"].append(bus_id)
+                metrics["riders"].append(len(ids))
+                metrics["tricksters"] = metrics["tricksters"] + tickets.count(False)
+                metrics["actors"] = metrics["actors"] + len(ids)
+                metrics["total_travel_time"] = metrics["total_travel_time"] + sum(travel_times)
+                if ids:
+                    oldest = max(travel_times)
+                    metrics["max_travel_time"] = oldest if metrics["max_travel_time"] is None \
+                        else max(metrics["max_travel_time"], oldest)
+
+        actors = sum(m["actors"] for m in shard_metrics)
+        max_travel_times = [m["max_travel_time"] for m in shard_metrics if m["max_travel_time"] is not None]
+        riders = sorted((bus_id, riders) for m in shard_metrics for bus_id, riders in zip(m["bus_ids"], m["riders"]))
+        return {
+            "waiting": [sum(waiting) for waiting in zip(*[m["waiting"] for m in shard_metrics])],
+            "riders": [count for bus_id, count in riders],
+            "tricksters": sum(m["tricksters"] for m in shard_metrics),
+            "actors": actors,
+            "mean_travel_time": float(sum(m["total_travel_time"] for m in shard_metrics)) / actors if actors else None,
+            "max_travel_time": max(max_travel_times) if max_travel_times else None
+        }
+
+    def combine_live_metrics(self, shard_live_metrics):
+        # type: (list) -> dict
+        """
+        Combines the live metrics reported by the shards at the end of a turn, adding the buses in transit
+        :param shard_live_metrics: the live metrics of each shard, with the id of each bus
+        :return: the live metrics of the whole simulation, see live_metrics
+        """
+        riders = list()
+        tricksters = 0
+        inspectors = 0
+        for live_metrics in shard_live_metrics:
+            riders.extend(zip(live_metrics["bus_ids"], live_metrics["riders"]))
+            tricksters = tricksters + live_metrics["tricksters"]
+            inspectors = inspectors + live_metrics["inspectors"]
+        for buses in self.in_transit:
+            for bus_id, slot, is_at_bus_stop, packed in buses:
+                riders.append((bus_id, len(packed[0])))
+                tricksters = tricksters + packed[4].count(False)
+                inspectors = inspectors + len(packed[7])
+        return {
+            "waiting": [sum(waiting) for waiting in zip(*[m["waiting"] for m in shard_live_metrics])],
+            "riders": [count for bus_id, count in sorted(riders)],
+            "tricksters": tricksters,
+            "inspectors": inspectors
+        }
+
+    def live_metrics(self):
+        # type: () -> dict
+        """
+        Counts what is shown by the live metrics, see TransportManagement.live_metrics.
+        The shards report them at the end of every turn, with their counters, so this doesn't contact the workers,
+        except before the first turn
+        :return: the counts, by name
+        """
+        if self.last_live_metrics is None:
+            metrics = self.metrics()
+            return {
+                "waiting": metrics["waiting"],
+                "riders": metrics["riders"],
+                "tricksters": metrics["tricksters"],
+                "inspectors": metrics["actors"] - self.commuters_count
+            }
+        return self.last_live_metrics
+
+    @property
+    def trips(self):
+        # type: () -> TS.TripStatistics
+        """
+        The trip statistics of the whole simulation. While the workers are running, the statistics of the shards
+        are fetched and merged into new statistics at every access, so keep the result rather than reading it
+        repeatedly
+        """
+        if not self.connections or not self.merged_trips.enabled:
+            return self.merged_trips
+        trips = TS.TripStatistics.from_dict(self.merged_trips.to_dict())
+        for shard_trips in self.broadcast(TRIPS, [()] * self.shards):
+            trips.merge(TS.TripStatistics.from_dict(shard_trips))
+        return trips
+
+    @trips.setter
+    def trips(self, trips):
+        self.merged_trips = trips
+        """Trip statistics recorded by the coordinator, and the ones of the shards once the workers are stopped"""
+
+    @property
+    def profiler(self):
+        # type: () -> P.Profiler
+        """
+        The profile of the whole simulation: the times and counts of the shards, summed, as they run in parallel.
+        While the workers are running, the profiles of the shards are fetched and merged into a new profiler at
+        every access
+        """
+        if not self.connections or not self.merged_profiler.enabled:
+            return self.merged_profiler
+        profiler = P.Profiler.from_dict(self.merged_profiler.as_dict())
+        for shard_profile in self.broadcast(PROFILE, [()] * self.shards):
+            profiler.merge(P.Profiler.from_dict(shard_profile))
+        return profiler
+
+    @profiler.setter
+    def profiler(self, profiler):
+        self.merged_profiler = profiler
+        """Profiler of the coordinator, with the profiles of the shards once the workers are stopped"""
+
+    def close(self):
+        """
+        Stops the worker processes, if they are still running, after keeping their final metrics and merging their
+        trip statistics into self.trips and their profiles into self.profiler
+        """
+        if self.connections:
+            self.final_metrics = self.metrics()
+            self.merged_trips = self.trips
+            self.merged_profiler = self.profiler
+        for connection in self.connections:
+            connection.send((CLOSE, None))
+            connection.close()
+        for worker in self.workers:
+            worker.join()
+        self.connections = list()
+        self.workers = list()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,67 @@
+# Reasons why actors are dropped from the simulation
+DELIVERED = "delivered"
+"""Commuters dropped at the final stop"""
+EXPELLED = "expelled"
+"""Tricksters expelled by an inspector"""
+TIRED = "tired"
+"""Passengers who willingly left a bus"""
+RIOT = "riot"
+"""Passengers of a bus destroyed in a riot"""
+
+
+class SimulationListener(object):
+    """
+    Receives notifications about the changes in a TransportManagement simulation.
+    All methods do nothing: subclasses override the ones they are interested in.
+    Listeners are registered with TransportManagement.add_listener
+    """
+
+    def actor_spawned(self, simulation, actor):
+        """
+        A new actor started to wait at a bus stop
+        :param simulation: the simulation
+        :param actor: the new actor
+        """
+        pass
+
+    def actors_boarded(self, simulation, bus, actors):
+        """
+        Actors waiting at a bus stop were collected by a bus
+        :param simulation: the simulation
+        :param bus: the bus
+        :param actors: the list of collected actors
+        """
+        pass
+
+    def actors_dropped(self, simulation, bus, actors, reason):
+        """
+        Passengers of a bus were removed from the simulation
+        :param simulation: the simulation
+        :param bus: the bus the passengers were on
+        :param actors: the list of removed passengers
+        :param reason: why they were removed, one of the reasons of this module
+        """
+        pass
+
+    def bus_spawned(self, simulation, bus):
+        """
+        A new bus was added to the simulation
+        :param simulation: the simulation
+        :param bus: the new bus
+        """
+        pass
+
+    def bus_destroyed(self, simulation, bus):
+        """
+        A bus was removed from the simulation, after its passengers
+        :param simulation: the simulation
+        :param bus: the removed bus
+        """
+        pass
+
+    def turn_ended(self, simulation):
+        """
+        A turn has been processed and the simulation stepped forward
+        :param simulation: the simulation
+        """
+        pass
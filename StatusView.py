@@ -0,0 +1,168 @@
+import bisect
+
+from SimulationListener import SimulationListener
+
+ACTOR_FIELDS = ["Id", "Name", "Hometown", "Position", "Travel time", "Ticket", "Mark"]
+BUS_FIELDS = ["Id", "Last recorded position", "Is at a bus stop", "Passengers", "Tricksters", "Inspectors"]
+
+
+class StatusView(SimulationListener):
+    def __init__(self, simulation):
+        """
+        Cached view of the status of a simulation, kept up to date as the simulation changes.
+        Actor rows are built once when an actor is spawned and only their position is updated afterwards; actors and
+        buses are kept sorted by id as they come, so the tables never need to be sorted again. The ids of the ones
+        leaving are only marked as removed, and the lists of ids are compacted in a single pass when the tables are
+        rendered (or when the removed ids are as many as the ones left), so that a mass drop costs linear time.
+        The view registers itself as a listener of the simulation.
+        :type simulation: TransportManagement.TransportManagement
+        :param simulation: the simulation to display
+        """
+        self.actor_ids = list()
+        """Ids of the actors in the simulation, sorted"""
+        self.actor_rows = dict()
+        """Cached row of each actor, by id: the actor and its Id, Name, Hometown, Position, Ticket and Mark cells"""
+        self.removed_actor_ids = set()
+        """Ids of actor_ids which are no longer in the simulation"""
+        self.bus_ids = list()
+        """Ids of the buses in the simulation, sorted"""
+        self.buses = dict()
+        self.removed_bus_ids = set()
+        """Ids of bus_ids which are no longer in the simulation"""
+
+        for actor in simulation.actors.values():
+            self.actor_spawned(simulation, actor)
+        for bus in simulation.buses:
+            self.bus_spawned(simulation, bus)
+        simulation.add_listener(self)
+
+    @staticmethod
+    def insert_sorted(ids, new_id):
+        """
+        Inserts an id in a sorted list of ids, in constant time if it is the greatest one
+        :param ids: the sorted list of ids
+        :param new_id: the id to insert
+        """
+        if not ids or new_id > ids[-1]:
+            ids.append(new_id)
+        else:
+            bisect.insort(ids, new_id)
+
+    @staticmethod
+    def remove_sorted(ids, removed_ids, old_id):
+        """
+        Marks an id of a sorted list of ids as removed, compacting the list if half of its ids are removed
+        :param ids: the sorted list of ids
+        :param removed_ids: the set of the removed ids of the list
+        :param old_id: the id to remove
+        """
+        removed_ids.add(old_id)
+        if 2 * len(removed_ids) >= len(ids):
+            StatusView.compact(ids, removed_ids)
+
+    @staticmethod
+    def compact(ids, removed_ids):
+        """
+        Removes the ids marked as removed from a sorted list of ids, in a single pass
+        :param ids: the sorted list of ids
+        :param removed_ids: the set of the removed ids of the list, emptied
+        """
+        if removed_ids:
+            ids[:] = [i for i in ids if i not in removed_ids]
+            removed_ids.clear()
+
+    def actor_spawned(self, simulation, actor):
+        self.insert_sorted(self.actor_ids, actor.id)
+        self.actor_rows[actor.id] = [actor, actor.id, actor.name, actor.hometown, actor.position, actor.has_ticket,
+                                     actor.mark]
+
+    def actors_boarded(self, simulation, bus, actors):
+        for actor in actors:
+            self.actor_rows[actor.id][4] = actor.position
+
+    def actors_dropped(self, simulation, bus, actors, reason):
+        for actor in actors:
+            self.remove_sorted(self.actor_ids, self.removed_actor_ids, actor.id)
+            del self.actor_rows[actor.id]
+
+    def bus_spawned(self, simulation, bus):
+        self.insert_sorted(self.bus_ids, bus.id)
+        self.buses[bus.id] = bus
+
+    def bus_destroyed(self, simulation, bus):
+        self.remove_sorted(self.bus_ids, self.removed_bus_ids, bus.id)
+        del self.buses[bus.id]
+
+    @staticmethod
+    def page(ids, limit, offset):
+        """
+        Selects a page of a list of ids
+        :param ids: the list of ids
+        :param limit: maximum number of ids in the page, None for no limit
+        :param offset: number of ids to skip
+        :return: the ids in the page
+        """
+        if limit is None:
+            return ids[offset:]
+        return ids[offset:offset + limit]
+
+    @staticmethod
+    def page_footer(shown, offset, total, what):
+        """
+        Describes which rows of a table are shown, if the table is not complete
+        :return: the description of the rows shown, or an empty string if all rows are shown
+        """
+        if shown == total:
+            return ""
+        if shown == 0:
+            return "\n(no {} shown out of {:d})".format(what, total)
+        return "\n({} {:d}-{:d} of {:d})".format(what, offset + 1, offset + shown, total)
+
+    def actors_table(self, limit=None, offset=0):
+        # type: (int, int) -> str
+        """
+        Generates the table displaying information about actor status
+        :param limit: maximum number of actors to display, None to display all of them
+        :param offset: number of actors to skip, in order of id
+        :return: the table displaying information about actor status
+        """
+        from prettytable import PrettyTable
+        table = PrettyTable()
+        table.field_names = ACTOR_FIELDS
+        self.compact(self.actor_ids, self.removed_actor_ids)
+        ids = self.page(self.actor_ids, limit, offset)
+        for actor_id in ids:
+            actor, cell_id, name, hometown, position, ticket, mark = self.actor_rows[actor_id]
+            table.add_row([cell_id, name, hometown, position, actor.travel_time, ticket, mark])
+        return str(table) + self.page_footer(len(ids), offset, len(self.actor_ids), "actors")
+
+    def buses_table(self, limit=None, offset=0):
+        # type: (int, int) -> str
+        """
+        Generates the table displaying information about bus status
+        :param limit: maximum number of buses to display, None to display all of them
+        :param offset: number of buses to skip, in order of id
+        :return: the table displaying information about bus status
+        """
+        from prettytable import PrettyTable
+        table = PrettyTable()
+        table.field_names = BUS_FIELDS
+        self.compact(self.bus_ids, self.removed_bus_ids)
+        ids = self.page(self.bus_ids, limit, offset)
+        for bus_id in ids:
+            b = self.buses[bus_id]
+            table.add_row([b.id, b.last_position, b.is_at_bus_stop,
+                           len(b.passengers), len(b.tricksters), len(b.inspectors)])
+        return str(table) + self.page_footer(len(ids), offset, len(self.bus_ids), "buses")
+
+    def render(self, time, limit=None, offset=0):
+        # type: (int, int, int) -> str
+        """
+        Generates the tables displaying information about actor and bus status
+        :param time: the current simulation time
+        :param limit: maximum number of actors and buses to display, None to display all of them
+        :param offset: number of actors to skip, in order of id
+        :return: the tables displaying information about actor and bus status
+        """
+        return "\nSITUATION AT TIME {}".format(time) + "\nActors:\n" + self.actors_table(limit, offset) + \
+               "\nBuses:\n" + self.buses_table(limit)
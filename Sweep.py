@@ -0,0 +1,270 @@
+"""
+Parameter sweeps: runs ensembles of simulations over a grid or a random sample of parameter sets, in parallel.
+
+The outcome of every replica is cached on disk, as a small JSON file named after a hash of the exact parameter set,
+seed, engine, turn limit and code version, so a sweep which partially overlaps a previous one only runs the new
+replicas. The code version is a hash of the sources of the simulation modules: changing any of them invalidates the
+whole cache.
+"""
+
+import glob
+import hashlib
+import itertools
+import json
+import os
+import random as R
+from concurrent.futures import ProcessPoolExecutor
+
+import Ensemble
+import TransportManagement as TM
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIRECTORY = os.path.join(ROOT, ".sweep_cache")
+
+DEFAULT_PARAMETERS = {
+    "max_t": TM.MAX_T,
+    "delta_t": TM.DELTA_T,
+    "p_inspector": TM.P_INSPECTOR,
+    "p_bus_advancement": TM.P_BUS_ADVANCEMENT,
+    "initial_actors": TM.INITIAL_ACTORS,
+    "initial_buses": TM.INITIAL_BUSES,
+    "spawn_delay": TM.SPAWN_DELAY,
+    "commuters_rage_threshold": TM.COMMUTERS_RAGE_THRESHOLD,
+    "spawn_new_bus_threshold": TM.SPAWN_NEW_BUS_THRESHOLD
+}
+"""Parameters which can be swept, with their default values"""
+
+_code_version = None
+
+
+def code_version():
+    # type: () -> str
+    """
+    Computes the version of the simulation code, as a hash of the sources of its modules
+    :return: the hexadecimal digest of the sources
+    """
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256()
+        for path in sorted(glob.glob(os.path.join(ROOT, "*.py"))):
+            digest.update(os.path.basename(path).encode("utf-8"))
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        _code_version = digest.hexdigest()
+    return _code_version
+
+
+def complete(parameters):
+    # type: (dict) -> dict
+    """
+    Fills in the default values of the parameters which are not given
+    :param parameters: some of the parameters of DEFAULT_PARAMETERS
+    :return: all the parameters
+    """
+    unknown = set(parameters) - set(DEFAULT_PARAMETERS)
+    if unknown:
+        raise ValueError("Unknown parameters {}, expected some of {}".format(
+            ", ".join(sorted(unknown)), ", ".join(sorted(DEFAULT_PARAMETERS))))
+    completed = dict(DEFAULT_PARAMETERS)
+    completed.update(parameters)
+    return completed
+
+
+def grid(**values):
+    # type: (...) -> list
+    """
+    Builds all the combinations of the given values of some parameters
+    :param values: the list of values of each parameter to sweep, by name
+    :return: the list of parameter sets, with the default values of the other parameters
+    """
+    names = sorted(values)
+    return [complete(dict(zip(names, combination))) for combination in itertools.product(*(values[n] for n in names))]
+
+
+def random_points(count, seed=0, **ranges):
+    # type: (...) -> list
+    """
+    Draws parameter sets at random.
+    A range can be a list of values, drawn uniformly, or a (low, high) tuple: integers are drawn uniformly between
+    low and high included if both are integers, floats uniformly between them otherwise
+    :param count: number of parameter sets to draw
+    :param seed: seed of the draws, so that the same parameter sets are drawn again (and found in the cache)
+    :param ranges: the range of each parameter to sweep, by name
+    :return: the list of parameter sets, with the default values of the other parameters
+    """
+    generator = R.Random(seed)
+    names = sorted(ranges)
+    points = list()
+    for _ in range(count):
+        point = dict()
+        for name in names:
+            bounds = ranges[name]
+            if isinstance(bounds, tuple):
+                low, high = bounds
+                if isinstance(low, int) and isinstance(high, int):
+                    point[name] = generator.randint(low, high)
+                else:
+                    point[name] = generator.uniform(low, high)
+            else:
+                point[name] = generator.choice(bounds)
+        points.append(complete(point))
+    return points
+
+
+def cache_key(parameters, seed, engine="objects", max_turns=None):
+    # type: (dict, int, str, int) -> str
+    """
+    Computes the key of the outcome of a replica in the cache
+    :param parameters: all the parameters of the simulation
+    :param seed: the seed of the replica
+    :param engine: the engine of the simulation
+    :param max_turns: maximum number of turns of the replica
+    :return: the hexadecimal key
+    """
+    identity = json.dumps({"parameters": parameters, "seed": seed, "engine": engine, "max_turns": max_turns,
+                           "code": code_version()}, sort_keys=True)
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+
+class ResultCache(object):
+    def __init__(self, directory=CACHE_DIRECTORY):
+        """
+        Cache of the outcomes of replicas, one JSON file per replica
+        :param directory: the directory of the cache, created if it doesn't exist
+        """
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path(self, key):
+        # type: (str) -> str
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key):
+        # type: (str) -> dict
+        """
+        Looks up the outcome of a replica
+        :param key: the key of the replica, see cache_key
+        :return: the summary of the replica, None if it isn't cached
+        """
+        try:
+            with open(self.path(key)) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def put(self, key, summary):
+        """
+        Stores the outcome of a replica.
+        The file is written next to its final path and then moved in place, so that concurrent sweeps and interrupted
+        writes never leave a broken entry behind
+        :param key: the key of the replica, see cache_key
+        :param summary: the summary of the replica
+        """
+        temporary_path = "{}.{:d}.tmp".format(self.path(key), os.getpid())
+        with open(temporary_path, "w") as f:
+            json.dump(summary, f)
+        os.replace(temporary_path, self.path(key))
+
+    def clear(self):
+        """
+        Removes all the cached outcomes
+        """
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            os.remove(path)
+
+
+class SweepResult(object):
+    def __init__(self, points, results, computed, cached):
+        """
+        Outcome of a sweep
+        :param points: the parameter sets of the sweep
+        :param results: the merged results of the replicas of each parameter set (EnsembleResult), in the same order
+        :param computed: number of replicas which have been run
+        :param cached: number of replicas found in the cache
+        """
+        self.points = points
+        self.results = results
+        self.computed = computed
+        self.cached = cached
+
+    def __len__(self):
+        return len(self.points)
+
+    def __iter__(self):
+        return iter(zip(self.points, self.results))
+
+    def best(self, statistic, minimize=False):
+        # type: (str, bool) -> tuple
+        """
+        Finds the parameter set with the best mean of a statistic
+        :param statistic: the name of the statistic, one of Ensemble.STATISTICS
+        :param minimize: True if lower is better
+        :return: the parameter set and its merged results
+        """
+        candidates = [(p, r) for p, r in self if r.values(statistic)]
+        if not candidates:
+            raise ValueError("{} is not defined for any parameter set".format(statistic))
+        sign = 1 if minimize else -1
+        return min(candidates, key=lambda candidate: sign * candidate[1].mean(statistic))
+
+    def __str__(self):
+        lines = ["{:d} parameter sets, {:d} replicas run, {:d} from the cache".format(
+            len(self), self.computed, self.cached)]
+        for parameters, result in self:
+            changed = ", ".join("{}={}".format(name, parameters[name]) for name in sorted(parameters)
+                                if parameters[name] != DEFAULT_PARAMETERS[name])
+            lines.append("{}: ".format(changed or "defaults") +
+                         ", ".join("{} {:.3f}".format(s, result.mean(s)) for s in Ensemble.STATISTICS))
+        return "\n".join(lines)
+
+
+def run_sweep(points, replicas=1, base_seed=0, workers=None, engine="objects", max_turns=None, confidence=0.95,
+              cache=None):
+    # type: (...) -> SweepResult
+    """
+    Runs replicas of the simulation for every parameter set of a sweep on a pool of processes, skipping the ones
+    whose outcome is in the cache.
+    Replica i of every parameter set gets the same seed, derived from base_seed as in Ensemble.run_ensemble, so
+    parameter sets are compared on common random numbers
+    :param points: the parameter sets, see grid and random_points
+    :param replicas: number of replicas of each parameter set
+    :param base_seed: seed of the sweep, from which the seed of each replica is derived
+    :param workers: number of worker processes, None for one per CPU
+    :param engine: "objects", "columnar" or "events", see Ensemble.make_simulation
+    :param max_turns: maximum number of turns of each replica, None to run them until they end
+    :param confidence: confidence level of the intervals
+    :param cache: the cache of outcomes, None for a ResultCache in CACHE_DIRECTORY
+    :return: the outcome of the sweep
+    """
+    cache = ResultCache() if cache is None else cache
+    points = [complete(point) for point in points]
+    seeds = [Ensemble.replica_seed(base_seed, i) for i in range(replicas)]
+
+    summaries = dict()
+    missing = list()
+    for point in points:
+        for seed in seeds:
+            key = cache_key(point, seed, engine, max_turns)
+            if key in summaries:
+                continue
+            summary = cache.get(key)
+            if summary is None:
+                summaries[key] = None
+                missing.append((key, (seed, point, engine, max_turns)))
+            else:
+                summaries[key] = summary
+
+    if missing:
+        chunk_size = max(1, len(missing) // (4 * (workers or os.cpu_count() or 1)))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            outcomes = executor.map(Ensemble._run_replica_arguments, [arguments for _, arguments in missing],
+                                    chunksize=chunk_size)
+            # Outcomes are cached as they come, so an interrupted sweep keeps what it has computed
+            for (key, _), summary in zip(missing, outcomes):
+                cache.put(key, summary)
+                summaries[key] = summary
+
+    results = [Ensemble.EnsembleResult([summaries[cache_key(point, seed, engine, max_turns)] for seed in seeds],
+                                       confidence) for point in points]
+    return SweepResult(points, results, len(missing), len(summaries) - len(missing))
@@ -0,0 +1,63 @@
+"""
+Warm templates of simulations, for workloads made of many short simulations starting from the same state.
+
+A template captures the state of a simulation once, in memory and in the format of the checkpoints: scalars and
+columns of numbers, without any actor object. Cloning it restores a new simulation from this state, without drawing
+the initial population again, and reseeds its random number streams, so that every clone is a different branch from
+the same starting point. The columns are kept as bytes, and every clone gets its own copy of them.
+
+Cloning saves the warm-up turns and the drawing of the initial population, whatever the engine, but only the
+columnar engine restores its state faster than it sets up a new simulation: the object and event-driven engines
+rebuild every actor and bus from the columns, which costs about as much as creating them.
+
+A template is small and picklable. Built before a pool of worker processes is forked, it is shared by all of them
+copy on write, see Ensemble.run_ensemble.
+"""
+
+import TransportManagement as TM
+import Checkpoint
+
+
+class SimulationTemplate(object):
+    def __init__(self, simulation):
+        """
+        Captures the state of a simulation between two turns as a template.
+        The simulation itself is not kept, and can go on without changing the template
+        :type simulation: TransportManagement.TransportManagement
+        :param simulation: the simulation
+        """
+        self.meta, columns = Checkpoint.snapshot(simulation)
+        self.columns = dict((name, (memoryview(column).format, memoryview(column).tobytes()))
+                            for name, column in columns.items())
+        """Format and contents of each column, by name"""
+
+    @classmethod
+    def build(cls, engine=TM.TransportManagement, warmup_turns=0, **parameters):
+        # type: (...) -> SimulationTemplate
+        """
+        Creates a simulation and captures it as a template
+        :param engine: the class of the simulation, TransportManagement or one of the alternative engines which
+        support checkpoints
+        :param warmup_turns: number of turns to run before capturing the state, so that clones start from a
+        simulation which is already running
+        :param parameters: keyword arguments for the constructor of the simulation
+        :return: the template
+        """
+        simulation = engine(capture_events=parameters.pop("capture_events", False), **parameters)
+        if warmup_turns > 0:
+            simulation.run(max_turns=warmup_turns)
+        return cls(simulation)
+
+    def clone(self, seed=None, capture_events=None, profile=False, trip_statistics=False):
+        """
+        Creates a new simulation from the state of the template
+        :param seed: seed of the random number streams of the clone, None to continue with the streams of the
+        template, as the captured simulation would have
+        :param capture_events: whether to record the events of each turn, None to do as the captured simulation
+        :param profile: True to record the time spent in each phase of the turns
+        :param trip_statistics: True to record the travel times of the commuters leaving the clone
+        :return: the new simulation
+        """
+        columns = dict((name, memoryview(bytearray(contents)).cast(column_format))
+                       for name, (column_format, contents) in self.columns.items())
+        return Checkpoint.restore(self.meta, columns, seed, capture_events, profile, trip_statistics)
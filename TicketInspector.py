@@ -1,30 +1,57 @@
 from Commuter import Commuter
 import random as r
+import Locations
 
 
 class TicketInspector(Commuter):
+    __slots__ = ("p_female_trickster_expulsion", "p_male_trickster_expulsion", "time_no_violation")
+
     EVIL_NAMES = ("Gargamel", "Mangiafuoco", "Vlad", "Leech", "Frieza", "Koopa", "Goomba", "De Sade",
                   "Darth Maul", "Blank Banshee")
     MAX_WORKTIME = 60
     MAX_IDLE_TIME = 30
 
-    def __init__(self):
-        super(TicketInspector, self).__init__()
+    def __init__(self, rng=r, network=Locations.DEFAULT_NETWORK):
+        """
+        Creates a new TicketInspector with random attributes
+        :param rng: the random number generator to use
+        :param network: the network of bus stops where the inspector can start
+        """
+        super(TicketInspector, self).__init__(rng, network)
         self.has_ticket = True
-        self.name = self.generate_name()
-        self.mark = "T"
+        self.name = self.generate_name(rng)
+        self.mark = Commuter.MARKS[2]
 
-        self.p_female_trickster_expulsion = r.random()
-        self.p_male_trickster_expulsion = r.random()
+        self.p_female_trickster_expulsion = rng.random()
+        self.p_male_trickster_expulsion = rng.random()
 
         self.time_no_violation = 0
 
-    def generate_name(self):
+    @classmethod
+    def restore(cls, actor_id, sex, name, hometown, position, has_ticket, travel_time,
+                p_female_trickster_expulsion=0.0, p_male_trickster_expulsion=0.0, time_no_violation=0):
+        """
+        Builds a TicketInspector with the given attributes and id, see Commuter.restore
+        :param p_female_trickster_expulsion: probability of expelling a female trickster
+        :param p_male_trickster_expulsion: probability of expelling a male trickster
+        :param time_no_violation: time spent without finding tricksters
+        :return: the ticket inspector
+        """
+        inspector = super(TicketInspector, cls).restore(actor_id, sex, name, hometown, position, has_ticket,
+                                                        travel_time)
+        inspector.mark = Commuter.MARKS[2]
+        inspector.p_female_trickster_expulsion = p_female_trickster_expulsion
+        inspector.p_male_trickster_expulsion = p_male_trickster_expulsion
+        inspector.time_no_violation = time_no_violation
+        return inspector
+
+    def generate_name(self, rng=r):
         """
         Generate a new name for this ticket inspector
+        :param rng: the random number generator to use
         :return: a new name for this ticket inspector
         """
-        return TicketInspector.EVIL_NAMES[r.randrange(len(TicketInspector.EVIL_NAMES))]
+        return TicketInspector.EVIL_NAMES[rng.randrange(len(TicketInspector.EVIL_NAMES))]
 
     def possessive_adjective(self):
         """
@@ -42,15 +69,16 @@ class TicketInspector(Commuter):
         return self.travel_time >= TicketInspector.MAX_WORKTIME \
                or self.time_no_violation >= TicketInspector.MAX_IDLE_TIME
 
-    def expel_passenger(self, passenger):
+    def expel_passenger(self, passenger, rng=r):
         """
         Evaluates a passenger to decide whether it should be expelled from the bus
         :param passenger: the passenger to evaluate
+        :param rng: the random number generator to use
         :return: True if the passenger doesn't have a valid ticket and is expelled
         """
         if not passenger.has_ticket:
             if passenger.mark == "M":
-                return r.random() < self.p_male_trickster_expulsion
+                return rng.random() < self.p_male_trickster_expulsion
             if passenger.mark == "F":
-                return r.random() < self.p_female_trickster_expulsion
+                return rng.random() < self.p_female_trickster_expulsion
         return False
@@ -1,9 +1,19 @@
-from prettytable import PrettyTable
-import random as R
+import array
+import bisect
+import gc
+import math
+import sys
+
 import Locations
 import Commuter as C
 import TicketInspector as T
 import Bus as B
+import RandomStreams as RS
+import EventLog as EL
+import Profiler as P
+import SimulationListener as SL
+import TripStatistics as TS
+from StatusView import StatusView
 
 # Default values
 P_INSPECTOR = 0.1
@@ -17,7 +27,51 @@ COMMUTERS_RAGE_THRESHOLD = 10
 SPAWN_NEW_BUS_THRESHOLD = 5
 
 
+SPAWN_DRAWS = 7
+"""Random numbers drawn for each actor by spawn_actors: kind, sex, name, hometown, ticket and the two expulsion
+probabilities of inspectors"""
+SPAWN_BATCH = 2 ** 16
+"""Maximum number of actors whose random numbers are drawn at once by spawn_actors"""
+
+NOWHERE = -1
+"""Bus stop code, in checkpoints, of an actor which is not waiting at a bus stop"""
+
+
+def number_column(values):
+    # type: (list) -> array.array
+    """
+    Packs numbers in an array, of integers if all of them are integers and of floats otherwise
+    :param values: the numbers
+    :return: the array of the numbers
+    """
+    return array.array("q" if all(isinstance(v, int) for v in values) else "d", values)
+
+
+def failures_before_success(probability, uniform):
+    # type: (float, float) -> int
+    """
+    Draws the number of failed trials before the first success, for independent trials with the same probability of
+    success, by inverting the geometric distribution
+    :param probability: the probability of success of each trial
+    :param uniform: a random number uniformly distributed in [0, 1)
+    :return: the number of failures before the first success, sys.maxsize if success is impossible
+    """
+    if probability <= 0:
+        return sys.maxsize
+    if probability >= 1:
+        return 0
+    return int(math.log1p(-uniform) / math.log1p(-probability))
+
+
 class TransportManagement(object):
+    CHECKPOINT_FIELDS = ("global_time", "last_spawn_time", "simulation_on", "commuters_count", "delivered",
+                         "delivered_travel_time", "expelled", "tired", "riots", "buses_spawned")
+    """Scalar attributes saved in checkpoints"""
+    STATUS_TABLES = True
+    """Whether the engine can display the status of its actors and buses, see status_table"""
+    CHECKPOINTS = True
+    """Whether the state of the engine can be captured in checkpoints and templates, see checkpoint_state"""
+
     def __init__(
             self,
             max_t=MAX_T,
@@ -28,7 +82,13 @@ class TransportManagement(object):
             initial_buses=INITIAL_BUSES,
             spawn_delay=SPAWN_DELAY,
             commuters_rage_threshold=COMMUTERS_RAGE_THRESHOLD,
-            spawn_new_bus_threshold=SPAWN_NEW_BUS_THRESHOLD
+            spawn_new_bus_threshold=SPAWN_NEW_BUS_THRESHOLD,
+            seed=None,
+            rng=None,
+            capture_events=True,
+            network=None,
+            profile=False,
+            trip_statistics=False
     ):
         """
         Constructor and setup method
@@ -41,6 +101,14 @@ class TransportManagement(object):
         :param spawn_delay: delay in time units between actor spawn events
         :param commuters_rage_threshold: number of commuters on a bus to start a riot
         :param spawn_new_bus_threshold: number of commuters at a bus stop to spawn a new bus
+        :param seed: seed of the random number streams of this simulation, None to seed them from the operating system
+        :param rng: the random number streams of this simulation (RandomStreams.RandomStreams), to use instead of
+        creating new ones from the seed
+        :param capture_events: False to turn off the recording of the events of each turn
+        :param network: the network of bus lines (Locations.RouteNetwork), None for Locations.DEFAULT_NETWORK
+        :param profile: True to record the time spent in each phase of the turns, see self.profiler
+        :param trip_statistics: True to record the distribution of the travel times of the commuters leaving the
+        simulation, see self.trips
         """
         # Simulation constants
         self.max_t = max_t
@@ -53,72 +121,243 @@ class TransportManagement(object):
         self.commuters_rage_threshold = commuters_rage_threshold
         self.spawn_new_bus_threshold = spawn_new_bus_threshold
 
+        self.network = network if network is not None else Locations.DEFAULT_NETWORK
+
+        # Random number streams, owned by this simulation
+        self.rng = rng if rng is not None else RS.RandomStreams(seed)
+
         # Private variables
         self.global_time = 0
         self.last_spawn_time = 0
-        self.actors = list()
+        self.actors = B.IdDict()
+        """Actors in the simulation, indexed by their id, in order of creation"""
+        self.waiting = dict((location, list()) for location in self.network.stops)
+        """Index of the actors waiting at each bus stop, in order of arrival"""
+        self.crowded_stops = set()
+        """Bus stops with more than spawn_new_bus_threshold actors waiting"""
+        self.commuters_count = 0
+        """Number of actors in the simulation which are not ticket inspectors"""
         self.buses = list()
-        self.event_strings = list()
+        self.events = EL.EventLog() if capture_events else EL.NullEventLog()
+        """Structured log of the events of the current turn"""
+        self.profiler = P.Profiler() if profile else P.NullProfiler()
+        """Time spent in each phase of the turns and work done, see Profiler"""
+        self.trips = TS.TripStatistics(bin_width=delta_t) if trip_statistics else TS.NullTripStatistics()
+        """Distribution of the travel times of the commuters who left the simulation, see TripStatistics"""
+        self.end_strings = list()
+        self.listeners = list()
+        """Listeners notified of the changes in the simulation"""
+        self.status_view = None
+        """Cached status view, created the first time the status table is generated"""
+
+        # Outcome counters
+        self.delivered = 0
+        """Number of commuters who reached the final stop"""
+        self.delivered_travel_time = 0
+        """Total travel time of the commuters who reached the final stop"""
+        self.expelled = 0
+        """Number of tricksters expelled by inspectors"""
+        self.tired = 0
+        """Number of passengers who left a bus because they were tired"""
+        self.riots = 0
+        """Number of buses destroyed by their passengers"""
+        self.buses_spawned = 0
+        """Number of buses sent because of crowded bus stops"""
 
         # Setup: spawn initial actors (Commuters and Inspectors)
-        for i in range(self.initial_actors):
-            self.spawn_actor()
+        if self.initial_actors > 0:
+            self.spawn_actors(self.initial_actors)
 
         # Setup: spawn initial buses
-        bus_starting_points = R.sample(Locations.LOCATIONS, self.initial_buses)
-        for place in bus_starting_points:
-            self.spawn_bus(place)
+        bus_starting_slots = self.rng.spawning.sample(range(len(self.network.slot_stop)), self.initial_buses)
+        for slot in bus_starting_slots:
+            self.spawn_bus(self.network.slot_location[slot], slot)
 
         # Setup: turn on simulation
         self.simulation_on = True
 
-    # Method to create a new actor
-    def spawn_actor(self):
-        # type: () -> str
+    @property
+    def event_strings(self):
+        # type: () -> list
         """
-        Create a new actor, which can be a Commuter or a Ticket Inspector
-        :return the event string
+        Narrative text of the events of the current turn, rendered from the event log
+        :return: the list of event strings
         """
+        self.profiler.count(P.EVENTS_RENDERED, len(self.events))
+        return self.events.render()
 
-        event_string = "It was {time} o'clock when ".format(time=self.global_time)
-
-        if R.random() > self.p_inspector:
-            new_actor = C.Commuter()
-            event_string = event_string \
-                           + "{name} ({id}) walked up to the stop of {place} and started to wait for {poss} ride." \
-                               .format(name=new_actor.name, id=new_actor.id, place=new_actor.hometown,
-                                       poss=new_actor.possessive_adjective())
+    def create_actor(self):
+        # type: () -> C.Commuter
+        """
+        Draws a new actor, which can be a Commuter or a Ticket Inspector, without adding it to the simulation
+        :return: the new actor
+        """
+        if self.rng.spawning.random() > self.p_inspector:
+            return C.Commuter(self.rng.spawning, self.network)
         else:
-            new_actor = T.TicketInspector()
-            event_string = event_string \
-                           + "Ticket inspector {name} ({id}) marched up to the stop of {place} and started to wait for {poss} ride." \
-                               .format(name=new_actor.name, id=new_actor.id, place=new_actor.hometown,
-                                       poss=new_actor.possessive_adjective())
+            return T.TicketInspector(self.rng.spawning, self.network)
 
-        self.actors.append(new_actor)
+    # Method to create a new actor
+    def spawn_actor(self):
+        # type: () -> C.Commuter
+        """
+        Create a new actor, which can be a Commuter or a Ticket Inspector
+        :return the new actor
+        """
+        new_actor = self.create_actor()
+
+        self.actors[new_actor.id] = new_actor
+        waiting = self.waiting[new_actor.position]
+        waiting.append(new_actor)
+        if len(waiting) > self.spawn_new_bus_threshold:
+            self.crowded_stops.add(new_actor.position)
+        if new_actor.mark != "T":
+            self.commuters_count = self.commuters_count + 1
         self.last_spawn_time = self.global_time
-        return event_string
+        for listener in self.listeners:
+            listener.actor_spawned(self, new_actor)
+        return new_actor
 
-    def spawn_bus(self, location):
+    def spawn_actors(self, count):
+        # type: (int) -> list
+        """
+        Creates count new actors at once, each of them can be a Commuter or a Ticket Inspector, see create_actors
+        :param count: number of actors to create
+        :return: the list of the new actors
+        """
+        return self.add_actors(self.create_actors(count))
+
+    def create_actors(self, count):
+        # type: (int) -> list
+        """
+        Draws count new actors at once, without adding them to the simulation.
+        Their random attributes are drawn in batches from the spawning stream, SPAWN_DRAWS numbers per actor, and
+        actors are built directly from them, so the draws are not the same as those of count calls to spawn_actor
+        :param count: number of actors to create
+        :return: the list of the new actors
+        """
+        sources = self.network.sources
+        n_sources = len(sources)
+        names = (C.Commuter.MALE_NAMES, C.Commuter.FEMALE_NAMES)
+        n_names = (len(C.Commuter.MALE_NAMES), len(C.Commuter.FEMALE_NAMES))
+        evil_names = T.TicketInspector.EVIL_NAMES
+        n_evil_names = len(evil_names)
+        new_actors = list()
+
+        # Actors hold no reference cycles: pausing the garbage collector spares the full scans of the growing
+        # population that allocating millions of them would trigger
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            for chunk_start in range(0, count, SPAWN_BATCH):
+                chunk = min(SPAWN_BATCH, count - chunk_start)
+                draws = self.rng.spawning.batch(SPAWN_DRAWS * chunk)
+                actor_id = C.Commuter.old_id
+                C.Commuter.old_id = actor_id + chunk
+                for i in range(0, SPAWN_DRAWS * chunk, SPAWN_DRAWS):
+                    kind, sex, name, hometown, ticket, p_female, p_male = draws[i:i + SPAWN_DRAWS]
+                    sex = int(sex * 2)
+                    hometown = sources[int(hometown * n_sources)]
+                    if kind > self.p_inspector:
+                        new_actor = C.Commuter.restore(actor_id, sex, names[sex][int(name * n_names[sex])], hometown,
+                                                       hometown, ticket <= C.Commuter.P_HAS_TICKET, 0)
+                    else:
+                        new_actor = T.TicketInspector.restore(actor_id, sex, evil_names[int(name * n_evil_names)],
+                                                              hometown, hometown, True, 0, p_female, p_male)
+                    new_actors.append(new_actor)
+                    actor_id = actor_id + 1
+        finally:
+            if collecting:
+                gc.enable()
+        return new_actors
+
+    def add_actors(self, new_actors):
+        # type: (list) -> list
+        """
+        Adds new actors to the simulation, waiting at the bus stop where they are
+        :param new_actors: the new actors
+        :return: the new actors
+        """
+        actors = self.actors
+        waiting = self.waiting
+        commuters = 0
+        for new_actor in new_actors:
+            actors[new_actor.id] = new_actor
+            waiting[new_actor.position].append(new_actor)
+            if new_actor.mark != "T":
+                commuters = commuters + 1
+        for location, actors_waiting in waiting.items():
+            if len(actors_waiting) > self.spawn_new_bus_threshold:
+                self.crowded_stops.add(location)
+        self.commuters_count = self.commuters_count + commuters
+        if new_actors:
+            self.last_spawn_time = self.global_time
+        for listener in self.listeners:
+            for new_actor in new_actors:
+                listener.actor_spawned(self, new_actor)
+        return new_actors
+
+    def spawn_bus(self, location, slot=None):
         """
         Create a new bus, spawning it at the specified location
         :param location: the location where to spawn the new bus
+        :param slot: the slot of the network where to spawn the new bus, None for the first slot of the location
+        """
+        new_bus = B.Bus(location, self.p_bus_advancement, self.rng.movement, self.network, slot)
+        self.buses.append(new_bus)
+        for listener in self.listeners:
+            listener.bus_spawned(self, new_bus)
+
+    def add_listener(self, listener):
+        """
+        Registers a listener to be notified of the changes in the simulation
+        :type listener: SL.SimulationListener
+        :param listener: the listener to register
+        """
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """
+        Stops notifying a listener of the changes in the simulation
+        :type listener: SL.SimulationListener
+        :param listener: the listener to unregister
         """
-        self.buses.append(B.Bus(location, self.p_bus_advancement))
+        self.listeners.remove(listener)
 
-    def drop(self, bus, passengers_to_drop):
+    def drop(self, bus, passengers_to_drop, reason=SL.TIRED):
         """
         Drops all specified passengers from the bus and from the simulation too
         :type bus: B.Bus
         :type passengers_to_drop: list
         :param passengers_to_drop: the list of passengers to remove
         :param bus: the bus we need to remove the passengers from
+        :param reason: why the passengers are dropped, one of the reasons in SimulationListener
         """
         bus.drop_all_passengers(passengers_to_drop)
+        self.profiler.count(P.REMOVALS, len(passengers_to_drop))
+        self.trips.record(reason, passengers_to_drop)
         # Remove all dropped passengers from the simulation
         for passenger in passengers_to_drop:
-            self.actors.remove(passenger)
-        pass
+            del self.actors[passenger.id]
+            if passenger.mark != "T":
+                self.commuters_count = self.commuters_count - 1
+        for listener in self.listeners:
+            listener.actors_dropped(self, bus, passengers_to_drop, reason)
+
+    def collect(self, bus):
+        """
+        Collects all the actors waiting at the bus stop where the bus is, emptying the bus stop
+        :type bus: B.Bus
+        :param bus: the bus collecting the passengers
+        :return: the list of collected passengers
+        """
+        to_collect = self.waiting[bus.last_position]
+        self.waiting[bus.last_position] = list()
+        self.crowded_stops.discard(bus.last_position)
+        bus.collect_all_passengers(to_collect)
+        for listener in self.listeners:
+            listener.actors_boarded(self, bus, to_collect)
+        return to_collect
 
     def destroy_bus(self, bus):
         """
@@ -126,190 +365,487 @@ class TransportManagement(object):
         :param bus: the bus to destroy
         """
         for passenger in bus:
-            self.actors.remove(passenger)
+            del self.actors[passenger.id]
+            if passenger.mark != "T":
+                self.commuters_count = self.commuters_count - 1
+        self.trips.record(SL.RIOT, bus)
         self.buses.remove(bus)
-
-    def status_table(self):
+        self.profiler.count(P.REMOVALS, len(bus.passengers) + 1)
+        if self.listeners:
+            passengers = list(bus)
+            for listener in self.listeners:
+                listener.actors_dropped(self, bus, passengers, SL.RIOT)
+                listener.bus_destroyed(self, bus)
+
+    def status_table(self, limit=None, offset=0):
         """
-        Generates the table displaying information about actor and bus status
+        Generates the table displaying information about actor and bus status.
+        Rows are cached between calls and kept sorted by id, and only a page of them can be displayed
+        :param limit: maximum number of actors and buses to display, None to display all of them
+        :param offset: number of actors to skip, in order of id
         :return: the table displaying information about actor and bus status
         """
+        if not self.STATUS_TABLES:
+            raise ValueError("{} doesn't display status tables".format(type(self).__name__))
+        if self.status_view is None:
+            self.status_view = StatusView(self)
+        return self.status_view.render(self.global_time, limit, offset)
+
+    def status_report(self, limit=None):
+        # type: (int) -> str
+        """
+        Describes the current status in a fancy text-adventure and tabular form
+        :param limit: maximum number of actors and buses to display in the tables, None to display all of them
+        :return: the description of the current status
+        """
+        # Intro line
+        lines = ["\nBuses ran and ran, or rather crawled, over the jammed roads..."]
 
-        # Generate tables for actors and buses
-        self.actors.sort()
-        actors_table = PrettyTable()
-        actors_table.field_names = ["Id", "Name", "Hometown", "Position", "Travel time", "Ticket", "Mark"]
-        for a in self.actors:
-            actors_table.add_row([a.id, a.name, a.hometown, a.position, a.travel_time, a.has_ticket, a.mark])
-
-        self.buses.sort()
-        buses_table = PrettyTable()
-        buses_table.field_names = ["Id", "Last recorded position", "Is at a bus stop",
-                                   "Passengers", "Tricksters", "Inspectors"]
-        for b in self.buses:
-            buses_table.add_row([b.id, b.last_position, b.is_at_bus_stop,
-                                 len(b.passengers), len(b.get_tricksters()), len(b.get_inspectors())])
-
-        out = "\nSITUATION AT TIME {}".format(self.global_time) + "\nActors:\n" + str(
-            actors_table) + "\nBuses:\n" + str(buses_table)
+        # Event lines
+        lines.extend(self.event_strings)
 
-        return out
+        lines.append(self.status_table(limit))
+        return "\n".join(lines)
 
-    def print_status(self):
+    def print_status(self, limit=None):
         """
         Prints the current status in a fancy text-adventure and tabular form
+        :param limit: maximum number of actors and buses to display in the tables, None to display all of them
         """
-        # Intro line
-        print("\nBuses ran and ran, or rather crawled, over the jammed roads...")
+        print(self.status_report(limit))
 
-        # Event lines
-        for line in self.event_strings:
-            print(line)
+    def buses_at_stop(self):
+        # type: () -> list
+        """
+        Returns the buses which are at a bus stop in the current turn
+        :return: the list of buses at a bus stop, in order of creation
+        """
+        return [b for b in self.buses if b.is_at_bus_stop]
+
+    def tired_passengers(self, bus):
+        # type: (B.Bus) -> list
+        """
+        Returns the passengers of a bus who are tired, and the inspectors who have finished their job
+        :param bus: the bus
+        :return: the list of passengers who want to drop from the bus
+        """
+        self.profiler.count(P.ACTORS_SCANNED, len(bus.passengers))
+        return [p for p in bus if p.wants_to_drop()]
 
-        print(self.status_table())
+    def inspect_bus(self, bus):
+        """
+        Lets each inspector on a bus check the tricksters on board, in order of boarding, until they expel one of them.
+        Checks are independent, so the numbers of male and of female tricksters an inspector lets go before the first
+        one they would expel are geometrically distributed: both are drawn in a single batch for all the inspectors
+        of the bus, and each inspector expels the earlier of the two tricksters, as TicketInspector.expel_passenger
+        would have decided trickster by trickster. Tricksters are scanned only as far as the inspectors get, and the
+        expelled ones are dropped together at the end
+        :type bus: B.Bus
+        :param bus: the bus
+        """
+        if not bus.inspectors or not bus.tricksters:
+            return
+        events = self.events
+        time = self.global_time
+        inspectors = list(bus.inspectors.values())
+        draws = self.rng.inspection.batch(2 * len(inspectors))
+        unscanned = iter(bus.tricksters.values())
+        tricksters = list()
+        """Tricksters scanned so far, in order of boarding"""
+        males = list()
+        females = list()
+        """Positions in tricksters of the male and female tricksters scanned and not expelled yet"""
+        to_expel = list()
+        graced = 0
+        for i, inspector in enumerate(inspectors):
+            first_male = failures_before_success(inspector.p_male_trickster_expulsion, draws[2 * i])
+            first_female = failures_before_success(inspector.p_female_trickster_expulsion, draws[2 * i + 1])
+            while len(males) <= first_male and len(females) <= first_female:
+                trickster = next(unscanned, None)
+                if trickster is None:
+                    break
+                if trickster.mark == "M":
+                    males.append(len(tricksters))
+                else:
+                    females.append(len(tricksters))
+                tricksters.append(trickster)
+
+            male = males[first_male] if first_male < len(males) else len(tricksters)
+            female = females[first_female] if first_female < len(females) else len(tricksters)
+            if male < female:
+                position = males.pop(first_male)
+                graced_males = first_male
+                graced_females = bisect.bisect_left(females, position)
+            elif female < male:
+                position = females.pop(first_female)
+                graced_males = bisect.bisect_left(males, position)
+                graced_females = first_female
+            else:
+                position = len(tricksters)
+                graced_males = len(males)
+                graced_females = len(females)
+            graced = graced + graced_males + graced_females
+            if events.enabled:
+                for j in sorted(males[:graced_males] + females[:graced_females]):
+                    events.record(EL.GRACED, time, bus.id, (inspector, tricksters[j]))
+            if position < len(tricksters):
+                to_expel.append(tricksters[position])
+                events.record(EL.EXPELLED, time, bus.id, (inspector, tricksters[position]))
+
+        if to_expel:
+            self.drop(bus, to_expel, SL.EXPELLED)
+            self.expelled = self.expelled + len(to_expel)
+        self.profiler.count(P.ACTORS_SCANNED, graced + len(to_expel))
+        if graced > 0 and not to_expel:
+            events.record(EL.INSPECTION_SPARED, time, bus.id)
+        elif graced > 0 and to_expel:
+            events.record(EL.INSPECTION_MIXED, time, bus.id)
 
     def process_turn(self):
         """
         Analyzes the current situation and updates data structures.
-        Also prepares the event_strings for display.
+        Also records the events of the turn.
         """
 
-        # Resetting event strings
-        self.event_strings = list()
+        # Resetting events
+        events = self.events
+        events.clear()
+        time = self.global_time
+        profiler = self.profiler
+        profiler.start()
 
         # Eventually spawning a new actor
-        if (self.global_time - self.last_spawn_time) >= self.spawn_delay:
-            self.event_strings.append(self.spawn_actor())
+        for new_actor in self.spawn_due_actors():
+            events.record(EL.SPAWNED, time, actors=(new_actor,))
+        profiler.lap(P.SPAWN)
 
         # Check if we have buses at a bus stop
-        for bus in [b for b in self.buses if b.is_at_bus_stop]:
-            self.event_strings.append(
-                "\nAfter what felt like an eternity, bus {} made it to {}.".format(bus.id, bus.last_position)
-            )
+        buses_at_stop = self.buses_at_stop()
+        for bus in buses_at_stop:
+            events.record(EL.ARRIVED, time, bus.id, value=bus.last_position)
+            profiler.lap(P.ARRIVALS)
 
             # Check if the bus at the bus stop has reached the destination
-            if bus.last_position is Locations.LOCATIONS[0]:
-                if len(bus.passengers) > 0:
-                    self.event_strings.append("The final stop looked like a mirage. "
-                                              "Everyone felt relieved for a moment.")
-                else:
-                    self.event_strings.append("The final stop looked like a mirage. "
-                                              "What a shame no passenger was there to see it.")
+            if bus.is_at_destination():
+                events.record(EL.FINAL_STOP, time, bus.id, value=len(bus.passengers))
 
                 # Drop all passengers on the bus, since we're at the base station
+                profiler.count(P.ACTORS_SCANNED, len(bus.passengers))
                 passengers_to_drop = [p for p in bus if p.mark != "T"]
-                self.drop(bus, passengers_to_drop)
+                self.drop(bus, passengers_to_drop, SL.DELIVERED)
+                self.delivered = self.delivered + len(passengers_to_drop)
+                for p in passengers_to_drop:
+                    self.delivered_travel_time = self.delivered_travel_time + p.travel_time
                 if len(passengers_to_drop) > 0:
-                    self.event_strings.append(
-                        "But happiness is vain for those who are now gloomily proceeding to walk to their "
-                        "workplace:\n{} "
-                            .format(str([(p.name, p.id) for p in passengers_to_drop]))
-                    )
+                    events.record(EL.DELIVERED, time, bus.id, passengers_to_drop)
+                profiler.count(P.PASSENGERS_MOVED, len(passengers_to_drop))
+                profiler.lap(P.FINAL_STOP)
 
             else:  # If the bus is not at the destination, but it's at a bus stop
                 # If there is an inspector on board, check for tricksters and try to jettison one of them
                 if bus.has_inspector():
-                    graced = 0
-                    expelled = 0
-                    for inspector in bus.get_inspectors():
-                        for trickster in bus.get_tricksters():
-                            if inspector.expel_passenger(trickster):
-                                self.drop(bus, [trickster])
-                                self.event_strings.append(
-                                    "After a short quarrel, inspector"
-                                    + " {} managed to fine and jettison trickster {} ({:d}) from bus {:d}."
-                                    .format(inspector.name, trickster.name, trickster.id, bus.id)
-                                    + "\nGood riddance!"
-                                    + "\n(Also, the inspector seems to be satisfied and unwilling to check other "
-                                      "passengers for now.)"
-                                )
-                                expelled = expelled + 1
-                                break
-                            else:
-                                graced = graced + 1
-                                self.event_strings.append(
-                                    "{} ({:d}) on bus {:d} had no ticket, but inspector {} ({:d}) pretended not to notice."
-                                        .format(trickster.name, trickster.id, bus.id, inspector.name, inspector.id)
-                                )
-
-                    if graced > 0 and expelled == 0:
-                        self.event_strings.append("Sometimes fortune favours the brave, in this crazy world of ours.")
-                    elif graced > 0 and expelled > 0:
-                        self.event_strings.append("Some days you win, some days you lose."
-                                                  + "\nBut when all is said and done, having no ticket is just a calculated risk.")
+                    self.inspect_bus(bus)
+                    profiler.lap(P.INSPECTION)
 
                 # Collect new passengers from the bus stop
-                to_collect = [p for p in self.actors if p.position is bus.last_position]
-                bus.collect_all_passengers(to_collect)
-                len_to_collect = len(to_collect)
-                if len_to_collect > 1:
-                    self.event_strings.append(
-                        "{:d} lost souls were collected from the bus stop.".format(len_to_collect)
-                    )
-                elif len_to_collect == 1:
-                    self.event_strings.append("One lost soul was collected from the bus stop.")
+                to_collect = self.collect(bus)
+                if len(to_collect) > 0:
+                    events.record(EL.COLLECTED, time, bus.id, value=len(to_collect))
+                profiler.count(P.PASSENGERS_MOVED, len(to_collect))
+                profiler.lap(P.COLLECTION)
 
                 # Tired passengers and inspectors who have finished their job should be dropped right away
-                tired_passengers = [p for p in bus if p.wants_to_drop()]
-                self.drop(bus, tired_passengers)
+                tired_passengers = self.tired_passengers(bus)
+                self.drop(bus, tired_passengers, SL.TIRED)
+                self.tired = self.tired + len(tired_passengers)
                 if len(tired_passengers) > 0:
-                    self.event_strings.append(
-                        "{:d} passengers couldn't make it anymore, so they willingly left the bus. Let's wish them a good walk: {} "
-                            .format(len(tired_passengers), str([p.id for p in tired_passengers]))
-                    )
+                    events.record(EL.TIRED, time, bus.id, tired_passengers)
+                profiler.count(P.PASSENGERS_MOVED, len(tired_passengers))
+                profiler.lap(P.TIRED)
 
-        # Commuters' Rage Event: too many commuters on a bus
+        # Commuters' Rage Event: too many commuters on a bus.
+        # Passengers only get on a bus at a bus stop, so the buses which are not at a bus stop can't start a riot
         buses_to_destroy = list()
-        for bus in self.buses:
+        for bus in buses_at_stop:
             if len(bus.passengers) > self.commuters_rage_threshold:
-                self.event_strings.append("\nBus {} was a little too overcrowded.".format(bus.id) +
-                                          "\nThe {} passengers decided to go berserk and eventually destroy the bus."
-                                          .format(len(bus.passengers)) +
-                                          "\nLook at them, they've made a bonfire out of gasoline and bus chairs!"
-                                          "\nAren't they lively? Don't you wish you were having fun with them?")
+                events.record(EL.RIOT, time, bus.id, value=len(bus.passengers))
                 buses_to_destroy.append(bus)
+                self.riots = self.riots + 1
         for b in buses_to_destroy:
             self.destroy_bus(b)
+        profiler.lap(P.RIOTS)
 
         # Spawn new bus: too many commuters at a bus stop
-        spawn_new_bus = False
-        for bus_stop in Locations.LOCATIONS:
-            if len([c for c in self.actors if (c.position == bus_stop)]) > self.spawn_new_bus_threshold:
-                self.event_strings.append(
-                    "\nThe main office of the Public Transportation System noticed from its security cameras\n"
-                    "that the bus stop in {} was too crowded, so they decided to send a new bus from {} before anyone "
-                    .format(bus_stop, Locations.LOCATIONS[0]) +
-                    "got angry.\nAs if they weren't already..."
-                )
-                spawn_new_bus = True
-                break
-        if spawn_new_bus:
-            self.spawn_bus(Locations.LOCATIONS[0])
+        bus_stop = self.crowded_stop()
+        if bus_stop is not None:
+            self.send_bus(bus_stop)
+        profiler.lap(P.BUS_SPAWN)
+
+    def spawn_due_actors(self):
+        # type: () -> list
+        """
+        Spawns the actors due in the current turn: one actor every spawn_delay time units
+        :return: the new actors
+        """
+        if (self.global_time - self.last_spawn_time) >= self.spawn_delay:
+            return [self.spawn_actor()]
+        return []
+
+    def crowded_stop(self):
+        """
+        Chooses the crowded bus stop where to send a new bus in the current turn, if any
+        :return: the crowded bus stop with the lowest id, None if no bus stop is crowded
+        """
+        if self.crowded_stops:
+            return min(self.crowded_stops, key=self.network.stop_ids.get)
+        return None
+
+    def send_bus(self, bus_stop):
+        """
+        Sends a new bus to a crowded bus stop: the new bus starts from the beginning of the first line serving it
+        :param bus_stop: the crowded bus stop
+        """
+        slot = self.network.line_start(bus_stop)
+        self.events.record(EL.BUS_SENT, self.global_time, value=(bus_stop, self.network.slot_location[slot]))
+        self.spawn_bus(self.network.slot_location[slot], slot)
+        self.buses_spawned = self.buses_spawned + 1
 
     def step_forward(self):
         """
         Steps forward in the simulation: buses and global time will advance, actors will age by delta T.
         If the simulation has to stop, the self.simulation_on is set to False
         """
+        profiler = self.profiler
+        profiler.start()
 
         # After dropping passengers and collecting new passengers, all buses must try to advance
-        for bus in self.buses:
-            bus.try_to_advance()
+        for bus, draw in zip(self.buses, self.rng.movement.batch(len(self.buses))):
+            bus.try_to_advance(draw)
+        profiler.lap(P.MOVEMENT)
 
         # Increase simulation time
         self.global_time = self.global_time + self.delta_t
         # Age actors
-        for a in self.actors:
+        for a in self.actors.values():
             a.age(self.delta_t)
+        profiler.count(P.ACTORS_SCANNED, len(self.actors))
+        profiler.lap(P.AGING)
+
+        self.check_termination()
+        profiler.lap(P.TERMINATION)
+
+        for listener in self.listeners:
+            listener.turn_ended(self)
+        profiler.lap(P.LISTENERS)
+        profiler.turn_ended()
 
-        # Check if the simulation has to continue or not
+    def check_termination(self):
+        """
+        Checks if the simulation has to continue or not.
+        If the simulation has to stop, the self.simulation_on is set to False and the reason is stored in
+        self.end_strings
+        """
         if self.global_time > self.max_t:
-            print("Timeout!\nIf you're not at your office desk by now, "
-                  "you have won a free ride to the \"job market (TM)\". Congratulations!")
+            self.end_strings.append("Timeout!\nIf you're not at your office desk by now, "
+                                    "you have won a free ride to the \"job market (TM)\". Congratulations!")
             self.simulation_on = False
 
-        if len([c for c in self.actors if (c.mark != "T")]) == 0:
-            print("It appears that all the workers are producing GDP right now."
-                  "\nAnother incredible success story for Public Transportation!"
-                  "\n(This is _so_ going to be on all papers tomorrow!)")
+        if self.commuters_count == 0:
+            self.end_strings.append("It appears that all the workers are producing GDP right now."
+                                    "\nAnother incredible success story for Public Transportation!"
+                                    "\n(This is _so_ going to be on all papers tomorrow!)")
             self.simulation_on = False
+
+    def summary(self):
+        # type: () -> dict
+        """
+        Summarizes the outcome of the simulation so far
+        :return: a dictionary with the outcome counters and the mean travel time of the delivered commuters
+        (None if no commuter has been delivered yet)
+        """
+        return {
+            "delivered": self.delivered,
+            "expelled": self.expelled,
+            "tired": self.tired,
+            "riots": self.riots,
+            "buses_spawned": self.buses_spawned,
+            "mean_travel_time": float(self.delivered_travel_time) / self.delivered if self.delivered > 0 else None,
+            "global_time": self.global_time
+        }
+
+    def travel_time_stats(self):
+        # type: () -> tuple
+        """
+        Computes the mean and the maximum travel time of the actors in the simulation
+        :return: the mean and the maximum travel time, None and None if there are no actors
+        """
+        if not self.actors:
+            return None, None
+        # Actors age together, so the first one created is the one who has travelled the most
+        oldest = next(iter(self.actors.values()))
+        return float(sum(a.travel_time for a in self.actors.values())) / len(self.actors), oldest.travel_time
+
+    def metrics(self):
+        # type: () -> dict
+        """
+        Aggregates the current state of the simulation, see MetricsSink
+        :return: the number of actors waiting at each bus stop (in order of stop id), of passengers on each bus,
+        of tricksters on the buses and of actors, and the mean and maximum travel time of the actors
+        """
+        mean_travel_time, max_travel_time = self.travel_time_stats()
+        return {
+            "waiting": [len(self.waiting[location]) for location in self.network.stops],
+            "riders": [len(b.passengers) for b in self.buses],
+            "tricksters": sum(len(b.tricksters) for b in self.buses),
+            "actors": len(self.actors),
+            "mean_travel_time": mean_travel_time,
+            "max_travel_time": max_travel_time
+        }
+
+    def live_metrics(self):
+        # type: () -> dict
+        """
+        Counts what is shown by the live metrics, see LiveMetrics.
+        Unlike metrics, it doesn't scan the actors, so that it can be called at every turn
+        :return: the number of actors waiting at each bus stop (in order of stop id), of passengers on each bus,
+        of tricksters on the buses and of ticket inspectors in the simulation
+        """
+        return {
+            "waiting": [len(self.waiting[location]) for location in self.network.stops],
+            "riders": [len(b.passengers) for b in self.buses],
+            "tricksters": sum(len(b.tricksters) for b in self.buses),
+            "inspectors": len(self.actors) - self.commuters_count
+        }
+
+    def parameters(self):
+        # type: () -> dict
+        """
+        Returns the parameters of the simulation
+        :return: the keyword arguments of the constructor which set the simulation constants
+        """
+        return {
+            "max_t": self.max_t,
+            "delta_t": self.delta_t,
+            "p_inspector": self.p_inspector,
+            "p_bus_advancement": self.p_bus_advancement,
+            "initial_actors": self.initial_actors,
+            "initial_buses": self.initial_buses,
+            "spawn_delay": self.spawn_delay,
+            "commuters_rage_threshold": self.commuters_rage_threshold,
+            "spawn_new_bus_threshold": self.spawn_new_bus_threshold
+        }
+
+    def checkpoint_state(self):
+        # type: () -> tuple
+        """
+        Captures the state of the simulation between two turns, see Checkpoint.save.
+        Actors are saved as columns in order of id, bus stops as their id in the network and names as their index
+        in a table of names; the passengers of all buses are saved in a single column, bus after bus
+        :return: the scalar state (JSON serializable) and the columns of numbers (arrays), by name
+        """
+        state = dict((field, getattr(self, field)) for field in self.CHECKPOINT_FIELDS)
+        state["end_strings"] = list(self.end_strings)
+        state["crowded_stops"] = sorted(self.crowded_stops, key=self.network.stop_ids.get)
+
+        stop_ids = self.network.stop_ids
+        actors = list(self.actors.values())
+        names = list()
+        name_ids = dict()
+        for actor in actors:
+            if actor.name not in name_ids:
+                name_ids[actor.name] = len(names)
+                names.append(actor.name)
+        state["names"] = names
+        inspectors = [a if a.mark == "T" else None for a in actors]
+        columns = {
+            "actor_id": array.array("q", [a.id for a in actors]),
+            "actor_sex": array.array("b", [a.sex for a in actors]),
+            "actor_mark": array.array("b", [C.Commuter.MARKS.index(a.mark) for a in actors]),
+            "actor_name": array.array("i", [name_ids[a.name] for a in actors]),
+            "actor_hometown": array.array("i", [stop_ids[a.hometown] for a in actors]),
+            "actor_position": array.array("i", [stop_ids.get(a.position, NOWHERE) for a in actors]),
+            "actor_has_ticket": array.array("b", [a.has_ticket for a in actors]),
+            "actor_travel_time": number_column([a.travel_time for a in actors]),
+            "actor_p_female_trickster_expulsion":
+                array.array("d", [a.p_female_trickster_expulsion if a else 0.0 for a in inspectors]),
+            "actor_p_male_trickster_expulsion":
+                array.array("d", [a.p_male_trickster_expulsion if a else 0.0 for a in inspectors]),
+            "actor_time_no_violation": number_column([a.time_no_violation if a else 0 for a in inspectors]),
+            "bus_id": array.array("q", [b.id for b in self.buses]),
+            "bus_slot": array.array("q", [b.slot for b in self.buses]),
+            "bus_at_stop": array.array("b", [b.is_at_bus_stop for b in self.buses]),
+            "bus_passengers": array.array("q", [len(b.passengers) for b in self.buses]),
+            "passengers": array.array("q", [p_id for b in self.buses for p_id in b.passengers])
+        }
+        return state, columns
+
+    def restore_checkpoint_state(self, state, columns):
+        """
+        Replaces the state of the simulation with a state captured by checkpoint_state
+        :param state: the scalar state
+        :param columns: the columns of numbers (sequences), by name
+        """
+        for field in self.CHECKPOINT_FIELDS:
+            setattr(self, field, state[field])
+        self.end_strings = list(state["end_strings"])
+        self.crowded_stops = set(state["crowded_stops"])
+
+        stops = self.network.stops
+        names = state["names"]
+        self.actors = B.IdDict()
+        self.waiting = dict((location, list()) for location in stops)
+        for actor_id, sex, mark, name, hometown, position, has_ticket, travel_time, p_female, p_male, idle in zip(
+                *[columns[name].tolist() for name in (
+                    "actor_id", "actor_sex", "actor_mark", "actor_name", "actor_hometown", "actor_position",
+                    "actor_has_ticket", "actor_travel_time", "actor_p_female_trickster_expulsion",
+                    "actor_p_male_trickster_expulsion", "actor_time_no_violation")]):
+            location = stops[position] if position != NOWHERE else None
+            if C.Commuter.MARKS[mark] == "T":
+                actor = T.TicketInspector.restore(actor_id, sex, names[name], stops[hometown], location,
+                                                  bool(has_ticket), travel_time, p_female, p_male, idle)
+            else:
+                actor = C.Commuter.restore(actor_id, sex, names[name], stops[hometown], location, bool(has_ticket),
+                                           travel_time)
+            self.actors[actor_id] = actor
+            if location is not None:
+                self.waiting[location].append(actor)
+
+        self.buses = list()
+        passengers = columns["passengers"].tolist()
+        start = 0
+        for bus_id, slot, at_stop, count in zip(*[columns[name].tolist() for name in (
+                "bus_id", "bus_slot", "bus_at_stop", "bus_passengers")]):
+            bus = B.Bus.restore(bus_id, slot, bool(at_stop), self.p_bus_advancement, self.rng.movement,
+                                self.network)
+            bus.collect_all_passengers([self.actors[p_id] for p_id in passengers[start:start + count]])
+            start = start + count
+            self.buses.append(bus)
+
+        if self.status_view is not None:
+            self.remove_listener(self.status_view)
+            self.status_view = None
+        self.events.clear()
+
+    def run(self, max_turns=None):
+        # type: (int) -> int
+        """
+        Runs the simulation headlessly: turns are processed and stepped forward without printing or rendering
+        anything, until the simulation ends or max_turns turns have been run.
+        Termination messages are left in self.end_strings
+        :param max_turns: maximum number of turns to run, None to run until the simulation ends
+        :return: the number of turns that have been run
+        """
+        turns = 0
+        while self.simulation_on and (max_turns is None or turns < max_turns):
+            self.process_turn()
+            self.step_forward()
+            turns = turns + 1
+        return turns
+
+    def run_until_done(self):
+        # type: () -> int
+        """
+        Runs the simulation headlessly until it ends
+        :return: the number of turns that have been run
+        """
+        return self.run()
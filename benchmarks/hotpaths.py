@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+"""
+Hot path benchmark: times the setup of a simulation, process_turn, step_forward, status_table, the collection and
+drop of passengers and the inspection loop, for increasing numbers of actors and of buses.
+Every case is set up from the same seed, so runs are comparable across commits; each timing is repeated and
+reported as the best and the mean of the repetitions.
+
+    python benchmarks/hotpaths.py [--actors 10 1000 100000] [--buses 2 100 10000] [--engine objects|columnar|events]
+                                  [--repeat 3] [--json FILE]
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import Bus as B
+import Ensemble
+import Locations
+
+SEED = 1234
+FLEET_ACTORS = 10 ** 4
+"""Number of actors of the cases with increasing numbers of buses"""
+FULL_TABLE_LIMIT = 10 ** 4
+"""Largest population whose whole status table is rendered"""
+TABLE_ROWS = 100
+"""Rows of the paged status table"""
+
+
+def timed(function, *args):
+    # type: (callable, ...) -> float
+    """
+    Times a call with the garbage collector turned off, as timeit does
+    :param function: the function to call
+    :return: the elapsed time in seconds
+    """
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        function(*args)
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+def make_simulation(engine, actors, buses):
+    """
+    Sets up a simulation with the given numbers of actors and buses, which never times out and where no bus is
+    destroyed in a riot, so that the population stays large for all the turns that are timed.
+    Buses beyond the number of slots of the network are spawned at random slots
+    :param engine: "objects", "columnar" or "events", see Ensemble.make_simulation
+    :param actors: number of initial actors
+    :param buses: number of buses
+    :return: the simulation
+    """
+    slots = len(Locations.DEFAULT_NETWORK.slot_stop)
+    simulation = Ensemble.make_simulation(SEED, {"initial_actors": actors, "initial_buses": min(buses, slots),
+                                                 "max_t": 10 ** 9, "commuters_rage_threshold": 10 ** 9,
+                                                 "capture_events": False}, engine)
+    placement = random.Random(SEED)
+    for _ in range(buses - slots):
+        slot = placement.randrange(slots)
+        if engine == "columnar":
+            simulation.spawn_bus(slot)
+        else:
+            simulation.spawn_bus(simulation.network.slot_location[slot], slot)
+    return simulation
+
+
+def full_bus(actors):
+    """
+    Sets up a simulation whose actors are all on board a single bus, at a bus stop which is not the destination
+    :param actors: number of actors
+    :return: the simulation and the bus
+    """
+    simulation = make_simulation("objects", actors, 1)
+    bus = simulation.buses[0]
+    bus.slot = simulation.network.first_slot(simulation.network.sources[0])
+    bus.last_position = simulation.network.slot_location[bus.slot]
+    for location in simulation.waiting:
+        simulation.waiting[location] = list()
+    simulation.crowded_stops.clear()
+    bus.collect_all_passengers(list(simulation.actors.values()))
+    return simulation, bus
+
+
+def bench_init(engine, actors, buses, repeat):
+    return [timed(make_simulation, engine, actors, buses) for _ in range(repeat)]
+
+
+def bench_turn(engine, actors, buses, repeat):
+    """
+    Times process_turn and step_forward over repeat turns of the same simulation
+    :return: the timings of process_turn and of step_forward
+    """
+    simulation = make_simulation(engine, actors, buses)
+    process, step = list(), list()
+    for _ in range(repeat):
+        if not simulation.simulation_on:
+            break
+        process.append(timed(simulation.process_turn))
+        step.append(timed(simulation.step_forward))
+    return process, step
+
+
+def bench_status_table(engine, actors, buses, repeat):
+    """
+    Times the status table paged to TABLE_ROWS rows and, for small populations, the whole one
+    :return: the timings of the paged and of the whole table (empty if the population is too large)
+    """
+    simulation = make_simulation(engine, actors, buses)
+    paged = [timed(simulation.status_table, TABLE_ROWS) for _ in range(repeat)]
+    full = [timed(simulation.status_table) for _ in range(repeat)] if actors <= FULL_TABLE_LIMIT else []
+    return paged, full
+
+
+def bench_collect_drop(actors, repeat):
+    """
+    Times Bus.collect_all_passengers and Bus.drop_all_passengers with all the actors of a simulation
+    :return: the timings of the collection and of the drop
+    """
+    simulation = make_simulation("objects", actors, 1)
+    passengers = list(simulation.actors.values())
+    collect, drop = list(), list()
+    for _ in range(repeat):
+        bus = B.Bus(simulation.network.stops[0], 1.0)
+        collect.append(timed(bus.collect_all_passengers, passengers))
+        drop.append(timed(bus.drop_all_passengers, passengers))
+    return collect, drop
+
+
+def bench_inspection(actors, repeat):
+    """
+    Times the inspection of a bus carrying all the actors of a simulation
+    :return: the timings of the inspection
+    """
+    timings = list()
+    for _ in range(repeat):
+        simulation, bus = full_bus(actors)
+        timings.append(timed(simulation.inspect_bus, bus))
+    return timings
+
+
+def result(name, engine, actors, buses, timings):
+    # type: (str, str, int, int, list) -> dict
+    return {
+        "benchmark": name,
+        "engine": engine,
+        "actors": actors,
+        "buses": buses,
+        "repeat": len(timings),
+        "best": min(timings) if timings else None,
+        "mean": sum(timings) / len(timings) if timings else None
+    }
+
+
+def commit():
+    # type: () -> str
+    """
+    Gets the commit of the working tree, to tell runs apart
+    :return: the hash of the current commit, None if it is not known
+    """
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_case(engine, actors, buses, repeat, bus_benchmarks):
+    """
+    Runs all the benchmarks of a case
+    :param engine: the engine of the simulations
+    :param actors: number of actors
+    :param buses: number of buses
+    :param repeat: number of repetitions of each timing
+    :param bus_benchmarks: whether to run the benchmarks of Bus and of the inspection loop as well
+    :return: the list of results
+    """
+    results = [result("init", engine, actors, buses, bench_init(engine, actors, buses, repeat))]
+    process, step = bench_turn(engine, actors, buses, repeat)
+    results.append(result("process_turn", engine, actors, buses, process))
+    results.append(result("step_forward", engine, actors, buses, step))
+    paged, full = bench_status_table(engine, actors, buses, repeat)
+    results.append(result("status_table_paged", engine, actors, buses, paged))
+    results.append(result("status_table_full", engine, actors, buses, full))
+    if bus_benchmarks:
+        collect, drop = bench_collect_drop(actors, repeat)
+        results.append(result("collect_all_passengers", "objects", actors, 1, collect))
+        results.append(result("drop_all_passengers", "objects", actors, 1, drop))
+        results.append(result("inspect_bus", "objects", actors, 1, bench_inspection(actors, repeat)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Commuter simulation hot path benchmark")
+    parser.add_argument("--actors", type=int, nargs="+", default=[10, 100, 10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6],
+                        help="numbers of initial actors to measure, with 2 buses")
+    parser.add_argument("--buses", type=int, nargs="+", default=[2, 10, 100, 10 ** 3, 10 ** 4],
+                        help="numbers of buses to measure, with {:d} actors".format(FLEET_ACTORS))
+    parser.add_argument("--engine", choices=Ensemble.ENGINES, default="objects")
+    parser.add_argument("--repeat", type=int, default=3, help="repetitions of each timing")
+    parser.add_argument("--json", help="file where to write the results as JSON")
+    args = parser.parse_args()
+
+    results = list()
+    print("{:<24} {:>8} {:>6} {:>12} {:>12}".format("benchmark", "actors", "buses", "best (s)", "mean (s)"))
+    cases = [(actors, 2, args.engine != "columnar") for actors in args.actors] + \
+            [(FLEET_ACTORS, buses, False) for buses in args.buses]
+    for actors, buses, bus_benchmarks in cases:
+        for r in run_case(args.engine, actors, buses, args.repeat, bus_benchmarks):
+            results.append(r)
+            if r["best"] is not None:
+                print("{:<24} {:>8d} {:>6d} {:>12.6f} {:>12.6f}".format(r["benchmark"], r["actors"], r["buses"],
+                                                                      r["best"], r["mean"]))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "seed": SEED,
+                "engine": args.engine,
+                "commit": commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results": results
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
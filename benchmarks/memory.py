@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Memory benchmark: reports the bytes used per actor and the peak resident set size of a simulation set up with
+increasing numbers of initial actors. Every population size is measured in a fresh process.
+
+    python benchmarks/memory.py [--sizes 10000 100000 1000000] [--engine objects|columnar|events] [--json FILE]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import Ensemble
+
+SEED = 1234
+WARMUP_ACTORS = 100
+
+
+def measure(size, engine):
+    # type: (int, str) -> dict
+    """
+    Sets up a simulation with size initial actors and measures its memory
+    :param size: number of initial actors
+    :param engine: "objects", "columnar" or "events", see Ensemble.make_simulation
+    :return: the measures: traced bytes per actor and peak resident set size in bytes
+    """
+    # A throwaway simulation imports the modules loaded lazily (like NumPy), so that they aren't traced
+    Ensemble.make_simulation(SEED, {"initial_actors": WARMUP_ACTORS, "capture_events": False}, engine)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    simulation = Ensemble.make_simulation(SEED, {"initial_actors": size, "capture_events": False}, engine)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    return {
+        "engine": engine,
+        "actors": size,
+        "bytes_per_actor": float(after - before) / size,
+        "peak_rss": peak_rss,
+        "simulation": type(simulation).__name__
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Commuter simulation memory benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10 ** 4, 10 ** 5, 10 ** 6],
+                        help="numbers of initial actors to measure")
+    parser.add_argument("--engine", choices=Ensemble.ENGINES, default="objects")
+    parser.add_argument("--json", help="file where to write the results as JSON")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(measure(args.child, args.engine)))
+        return
+
+    results = list()
+    print("{:>10} {:>16} {:>14}".format("actors", "bytes per actor", "peak RSS (MB)"))
+    for size in args.sizes:
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+                                          "--engine", args.engine, "--child", str(size)])
+        result = json.loads(output.decode())
+        results.append(result)
+        print("{:>10d} {:>16.1f} {:>14.1f}".format(size, result["bytes_per_actor"], result["peak_rss"] / 2.0 ** 20))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,139 @@
 #!/usr/bin/env python
 
+import argparse
+
+import Locations
 import TransportManagement as tm
 
+# The modules of the optional features are imported by the branches using them, for a fast startup
+
+# Command line options
+parser = argparse.ArgumentParser(description="Commuter simulation")
+parser.add_argument("--headless", action="store_true",
+                    help="run the whole simulation without rendering turns or waiting for input")
+parser.add_argument("--max-turns", type=int, default=None,
+                    help="maximum number of turns to run in headless mode")
+parser.add_argument("--seed", type=int, default=None,
+                    help="seed of the random number streams, to replay the same simulation")
+parser.add_argument("--table-rows", type=int, default=None,
+                    help="maximum number of actors and buses to display in the status tables")
+parser.add_argument("--network", default=None,
+                    help="JSON file describing the network of bus lines (default: a single loop line)")
+parser.add_argument("--resume", default=None,
+                    help="checkpoint file to resume the simulation from, instead of starting a new one")
+parser.add_argument("--checkpoint", default=None,
+                    help="checkpoint file where to save the simulation in headless mode")
+parser.add_argument("--checkpoint-every", type=int, default=None,
+                    help="number of turns between checkpoints (default: only at the end)")
+parser.add_argument("--metrics", default=None,
+                    help="file where to write a row of metrics per turn (Parquet if it ends with .parquet, else CSV)")
+parser.add_argument("--profile", action="store_true",
+                    help="print the time spent in each phase of the turns at the end of the simulation")
+parser.add_argument("--trip-stats", action="store_true",
+                    help="print the distribution of the travel times of the commuters at the end of the simulation")
+parser.add_argument("--lookahead", action="store_true",
+                    help="compute the next turn in the background while waiting for input")
+parser.add_argument("--shards", type=int, default=None,
+                    help="number of worker processes sharing the bus stops, in headless mode (default: a single process)")
+parser.add_argument("--live", nargs="?", const="", default=None, metavar="NAME",
+                    help="publish live metrics in shared memory, to watch them with monitor.py NAME "
+                         "(default name: commuters-PID)")
+args = parser.parse_args()
+if args.shards and not args.headless:
+    parser.error("--shards requires --headless")
+if args.shards and (args.resume or args.checkpoint):
+    parser.error("--shards doesn't support checkpoints")
+
 # Setup
-simulation = tm.TransportManagement(
-            max_t=60*3,
-            delta_t=5,
-            p_inspector=0.1,
-            p_bus_advancement=0.75,
-            initial_actors=10,
-            initial_buses=2,
-            spawn_delay=10,
-            commuters_rage_threshold=10,
-            spawn_new_bus_threshold=5
-)
-
-print("Welcome to the Commuter simulation. Here's the current situation: " + simulation.status_table())
-
-not_stopped = True
-while not_stopped:
-    simulation.process_turn()
-    simulation.print_status()
-    simulation.step_forward()
-
-    # Get user input
-    user_choice = raw_input("\nHit Return to continue, anything else to quit: ")
-    if user_choice:
-        not_stopped = False
-        print("Even if you decided to close this Matrix, there's no guarantee you aren't trapped in a higher level "
-              "simulation."
-              "\nTake care...")
+if args.resume:
+    import Checkpoint
+    simulation = Checkpoint.load(args.resume, capture_events=not args.headless, profile=args.profile,
+                                 trip_statistics=args.trip_stats)
+else:
+    if args.shards:
+        import ShardedEngine
+        engine = ShardedEngine.ShardedTransportManagement
     else:
-        # See if the simulation has ended
-        not_stopped = simulation.simulation_on
+        engine = tm.TransportManagement
+    simulation = engine(
+                max_t=60*3,
+                delta_t=5,
+                p_inspector=0.1,
+                p_bus_advancement=0.75,
+                initial_actors=10,
+                initial_buses=2,
+                spawn_delay=10,
+                commuters_rage_threshold=10,
+                spawn_new_bus_threshold=5,
+                seed=args.seed,
+                capture_events=not args.headless,
+                network=Locations.RouteNetwork.load(args.network) if args.network else None,
+                profile=args.profile,
+                trip_statistics=args.trip_stats,
+                **({"shards": args.shards} if args.shards else {})
+    )
+
+metrics = None
+if args.metrics:
+    import MetricsSink
+    metrics = MetricsSink.MetricsSink(simulation, args.metrics)
+live = None
+if args.live is not None:
+    import LiveMetrics
+    live = LiveMetrics.LiveMetricsPublisher(simulation, args.live or None)
+    print("Publishing live metrics: python monitor.py {}".format(live.name))
+
+if args.headless:
+    if args.checkpoint:
+        import Checkpoint
+    turns = 0
+    while simulation.simulation_on and (args.max_turns is None or turns < args.max_turns):
+        chunk = args.checkpoint_every if args.checkpoint else None
+        if args.max_turns is not None:
+            chunk = args.max_turns - turns if chunk is None else min(chunk, args.max_turns - turns)
+        turns = turns + simulation.run(max_turns=chunk)
+        if args.checkpoint:
+            Checkpoint.save(simulation, args.checkpoint)
+    for line in simulation.end_strings:
+        print(line)
+    print("End of Commuter simulation after {:d} turns, at time {}.".format(turns, simulation.global_time))
+elif args.lookahead:
+    import InteractiveDriver
+    InteractiveDriver.InteractiveDriver(simulation, table_rows=args.table_rows).run()
+else:
+    import InteractiveDriver
+    print("Welcome to the Commuter simulation. Here's the current situation: " + simulation.status_table(args.table_rows))
+
+    not_stopped = True
+    while not_stopped:
+        simulation.process_turn()
+        simulation.print_status(args.table_rows)
+        simulation.step_forward()
+        for line in simulation.end_strings:
+            print(line)
+
+        # Get user input
+        try:
+            user_choice = input(InteractiveDriver.PROMPT)
+        except EOFError:
+            user_choice = "quit"
+        if user_choice:
+            not_stopped = False
+            print(InteractiveDriver.GOODBYE)
+        else:
+            # See if the simulation has ended
+            not_stopped = simulation.simulation_on
+
+    print("End of Commuter simulation.")
 
-print("End of Commuter simulation.")
\ No newline at end of file
+if args.shards:
+    # Stops the workers, keeping their trip statistics
+    simulation.close()
+if metrics is not None:
+    metrics.close()
+if live is not None:
+    live.close()
+if args.profile:
+    print(simulation.profiler.report())
+if args.trip_stats:
+    print(simulation.trips.report())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Watches a running simulation from another process, through the live metrics it publishes in shared memory
+(see LiveMetrics and the --live option of main.py). The simulation is never slowed down: the monitor only reads.
+
+    python monitor.py NAME [--interval SECONDS] [--once]
+"""
+
+import argparse
+import sys
+import time
+
+from prettytable import PrettyTable
+
+import LiveMetrics
+
+
+def render(name, snapshot):
+    # type: (str, dict) -> str
+    """
+    Renders a snapshot of the live metrics
+    :param name: the name of the block of shared memory
+    :param snapshot: the snapshot, see LiveMetrics.LiveMetricsReader.read
+    :return: the text to display
+    """
+    stops_table = PrettyTable()
+    stops_table.field_names = ["Bus stop", "Waiting"]
+    for stop, waiting in snapshot["waiting"].items():
+        stops_table.add_row([stop, waiting])
+    riders = " ".join(str(r) for r in snapshot["riders"]) or "-"
+    hidden = snapshot["buses"] - len(snapshot["riders"])
+    if hidden > 0:
+        riders = riders + " and {:d} more buses".format(hidden)
+    return "\n".join([
+        "{} at turn {:d}, time {:g}: {} (updated {:.1f} s ago)".format(
+            name, snapshot["turn"], snapshot["time"], "running" if snapshot["running"] else "ended",
+            max(0.0, time.time() - snapshot["updated"])),
+        str(stops_table),
+        "Buses: {:d}, passengers: {:d}, on each bus: {}".format(snapshot["buses"], snapshot["passengers"], riders),
+        "Commuters: {:d}, tricksters on board: {:d}, inspectors: {:d}".format(
+            snapshot["commuters"], snapshot["tricksters"], snapshot["inspectors"]),
+        "Delivered: {:d}, expelled: {:d}, tired: {:d}, riots: {:d}, buses sent: {:d}".format(
+            snapshot["delivered"], snapshot["expelled"], snapshot["tired"], snapshot["riots"],
+            snapshot["buses_spawned"])
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch the live metrics of a running Commuter simulation")
+    parser.add_argument("name", help="name of the block of shared memory, as printed by main.py --live")
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="seconds between two readings (default: 1)")
+    parser.add_argument("--once", action="store_true",
+                        help="print a single reading and exit")
+    args = parser.parse_args()
+
+    try:
+        reader = LiveMetrics.LiveMetricsReader(args.name)
+    except FileNotFoundError:
+        sys.exit("No simulation publishes live metrics as {}".format(args.name))
+
+    with reader:
+        last_update = None
+        while True:
+            snapshot = reader.read()
+            if snapshot["updated"] != last_update:
+                print(render(args.name, snapshot) + "\n")
+                last_update = snapshot["updated"]
+            if args.once or not snapshot["running"]:
+                break
+            if not reader.writer_alive():
+                print("The simulation process has ended without completing the simulation.")
+                break
+            time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import Bus
+import Checkpoint
+import Commuter
+import EventEngine as EE
+import Locations
+import TransportManagement as TM
+
+try:
+    import ColumnarEngine as CE
+except ImportError:
+    CE = None
+
+PARAMETERS = {"initial_actors": 40, "p_bus_advancement": 0.5, "commuters_rage_threshold": 8,
+              "spawn_new_bus_threshold": 3, "spawn_delay": 3, "delta_t": 2, "max_t": 400}
+ENGINES = [TM.TransportManagement, EE.EventDrivenTransportManagement] + \
+    ([CE.ColumnarTransportManagement] if CE is not None else [])
+
+
+def trace(simulation, turns):
+    """Runs turns of a simulation, recording its events and summary after each one"""
+    lines = list()
+    for _ in range(turns):
+        if not simulation.simulation_on:
+            break
+        simulation.process_turn()
+        lines.append(tuple(simulation.event_strings) if simulation.events.enabled else None)
+        simulation.step_forward()
+        lines.append(simulation.summary())
+    return lines
+
+
+class CheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "simulation.ckpt")
+        self.ids = (Commuter.Commuter.old_id, Bus.Bus.old_id)
+
+    def tearDown(self):
+        Commuter.Commuter.old_id, Bus.Bus.old_id = self.ids
+        shutil.rmtree(self.directory)
+
+    def test_resumed_simulation_continues_identically(self):
+        for engine in ENGINES:
+            with self.subTest(engine=engine.__name__):
+                simulation = engine(seed=5, **PARAMETERS)
+                simulation.run(max_turns=20)
+                Checkpoint.save(simulation, self.path)
+                saved_ids = (Commuter.Commuter.old_id, Bus.Bus.old_id)
+                expected = trace(simulation, 300)
+                status = simulation.status_table()
+
+                Commuter.Commuter.old_id, Bus.Bus.old_id = saved_ids
+                resumed = Checkpoint.load(self.path)
+                self.assertIs(type(resumed), engine)
+                self.assertEqual(trace(resumed, 300), expected)
+                self.assertEqual(resumed.status_table(), status)
+                self.assertFalse(os.path.exists(self.path + ".tmp"))
+
+    def test_new_seed_branches_from_the_saved_state(self):
+        network = Locations.RouteNetwork.from_dict(
+            {"lines": [{"stops": ["A", "B", "C", "D"], "destinations": ["A"], "loop": False}]})
+        simulation = TM.TransportManagement(seed=5, network=network, capture_events=False, **PARAMETERS)
+        simulation.run(max_turns=10)
+        Checkpoint.save(simulation, self.path)
+
+        first = Checkpoint.load(self.path, seed=1)
+        second = Checkpoint.load(self.path, seed=1)
+        self.assertEqual(first.network.to_dict(), network.to_dict())
+        self.assertEqual(first.global_time, simulation.global_time)
+        self.assertEqual(sorted(first.actors), sorted(simulation.actors))
+        self.assertEqual(trace(first, 50), trace(second, 50))
+
+    def test_other_files_are_rejected(self):
+        with open(self.path, "wb") as f:
+            f.write(b"not a checkpoint, but long enough for a header")
+        with self.assertRaises(ValueError):
+            Checkpoint.load(self.path)
+        with open(self.path, "wb") as f:
+            f.write(b"ab")
+        with self.assertRaises(ValueError):
+            Checkpoint.load(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import statistics
+import unittest
+
+import TransportManagement as TM
+
+try:
+    import ColumnarEngine as CE
+except ImportError:
+    CE = None
+
+PARAMETERS = {"max_t": 180, "delta_t": 5, "p_inspector": 0.1, "p_bus_advancement": 0.75, "initial_actors": 10,
+              "initial_buses": 2, "spawn_delay": 10, "commuters_rage_threshold": 10, "spawn_new_bus_threshold": 5,
+              "capture_events": False}
+SEEDS = range(100)
+
+
+def outcomes(engine, counter):
+    values = list()
+    for seed in SEEDS:
+        simulation = engine(seed=seed, **PARAMETERS)
+        simulation.run_until_done()
+        values.append(getattr(simulation, counter))
+    return values
+
+
+@unittest.skipIf(CE is None, "requires NumPy")
+class ColumnarEngineTest(unittest.TestCase):
+    def test_same_seed_same_simulation(self):
+        first = CE.ColumnarTransportManagement(seed=4, **PARAMETERS)
+        second = CE.ColumnarTransportManagement(seed=4, **PARAMETERS)
+        first.run_until_done()
+        second.run_until_done()
+        self.assertEqual(first.summary(), second.summary())
+
+    def test_metrics_count_every_actor_once(self):
+        simulation = CE.ColumnarTransportManagement(seed=6, trip_statistics=True,
+                                                    **dict(PARAMETERS, initial_actors=500))
+        while simulation.simulation_on:
+            simulation.run(max_turns=1)
+            metrics = simulation.metrics()
+            self.assertEqual(sum(metrics["waiting"]) + sum(metrics["riders"]), metrics["actors"])
+            self.assertEqual(metrics["riders"], simulation.live_metrics()["riders"])
+        if simulation.delivered:
+            self.assertAlmostEqual(simulation.trips.by_outcome["delivered"].stats.mean,
+                                   simulation.summary()["mean_travel_time"])
+
+    def test_outcomes_match_the_object_engine(self):
+        for counter in ("delivered", "expelled", "tired"):
+            objects = outcomes(TM.TransportManagement, counter)
+            columns = outcomes(CE.ColumnarTransportManagement, counter)
+            standard_error = (statistics.pvariance(objects) / len(objects) +
+                              statistics.pvariance(columns) / len(columns)) ** 0.5
+            self.assertLess(abs(statistics.mean(objects) - statistics.mean(columns)), 4 * standard_error + 0.1,
+                            counter)
+
+
+if __name__ == "__main__":
+    unittest.main()
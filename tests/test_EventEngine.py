@@ -0,0 +1,57 @@
+import statistics
+import unittest
+
+import EventEngine as EE
+import TransportManagement as TM
+
+PARAMETERS = {"max_t": 180, "delta_t": 5, "p_inspector": 0.1, "p_bus_advancement": 0.75, "initial_actors": 10,
+              "initial_buses": 2, "spawn_delay": 10, "commuters_rage_threshold": 10, "spawn_new_bus_threshold": 5,
+              "capture_events": False}
+SEEDS = range(100)
+
+
+def outcomes(engine, counter):
+    values = list()
+    for seed in SEEDS:
+        simulation = engine(seed=seed, **PARAMETERS)
+        simulation.run_until_done()
+        values.append(getattr(simulation, counter))
+    return values
+
+
+class EventEngineTest(unittest.TestCase):
+    def test_same_seed_same_simulation(self):
+        first = EE.EventDrivenTransportManagement(seed=4, **PARAMETERS)
+        second = EE.EventDrivenTransportManagement(seed=4, **PARAMETERS)
+        first.run_until_done()
+        second.run_until_done()
+        self.assertEqual(first.summary(), second.summary())
+
+    def test_turns_count_skipped_ticks(self):
+        simulation = EE.EventDrivenTransportManagement(seed=2, **PARAMETERS)
+        turns = simulation.run(max_turns=12)
+        self.assertEqual(turns, 12)
+        self.assertEqual(simulation.global_time, 12 * PARAMETERS["delta_t"])
+
+    def test_travel_times_are_synced_when_shown(self):
+        simulation = EE.EventDrivenTransportManagement(seed=3, **dict(PARAMETERS, initial_actors=200))
+        simulation.run(max_turns=8)
+        simulation.status_table()
+        spawn_times = simulation.spawn_times
+        for actor_id, actor in simulation.actors.items():
+            self.assertEqual(actor.travel_time, simulation.global_time - spawn_times[actor_id])
+        metrics = simulation.metrics()
+        self.assertEqual(sum(metrics["waiting"]) + sum(metrics["riders"]), metrics["actors"])
+
+    def test_outcomes_match_the_tick_engine(self):
+        for counter in ("delivered", "expelled", "tired"):
+            ticks = outcomes(TM.TransportManagement, counter)
+            events = outcomes(EE.EventDrivenTransportManagement, counter)
+            standard_error = (statistics.pvariance(ticks) / len(ticks) +
+                              statistics.pvariance(events) / len(events)) ** 0.5
+            self.assertLess(abs(statistics.mean(ticks) - statistics.mean(events)), 4 * standard_error + 0.1,
+                            counter)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+import EventEngine as EE
+import History
+import TransportManagement as TM
+
+try:
+    import ColumnarEngine as CE
+except ImportError:
+    CE = None
+
+PARAMETERS = {"initial_actors": 60, "initial_buses": 3, "spawn_delay": 5, "commuters_rage_threshold": 30,
+              "max_t": 400}
+
+
+def record(simulation, turns):
+    """Runs turns of a simulation, returning its live status table at the end of each one, from turn 0"""
+    tables = [simulation.status_table()]
+    events = [None]
+    for _ in range(turns):
+        if not simulation.simulation_on:
+            break
+        simulation.run(max_turns=1)
+        tables.append(simulation.status_table())
+        events.append(simulation.event_strings)
+    return tables, events
+
+
+class HistoryTest(unittest.TestCase):
+    def test_seek_matches_the_live_tables(self):
+        for engine in (TM.TransportManagement, EE.EventDrivenTransportManagement):
+            with self.subTest(engine=engine.__name__):
+                simulation = engine(seed=11, **PARAMETERS)
+                recorder = History.HistoryRecorder(simulation, keyframe_interval=7, record_events=True)
+                tables, events = record(simulation, 40)
+                self.assertGreater(len(tables), 3 * 7)
+                self.assertEqual(recorder.last_turn, len(tables) - 1)
+                for turn, table in enumerate(tables):
+                    state = recorder.seek(turn)
+                    self.assertEqual(state.turn, turn)
+                    self.assertEqual(state.status_table(), table)
+                    if turn > 0:
+                        self.assertEqual(state.events, events[turn])
+
+    def test_replay_matches_seek(self):
+        simulation = TM.TransportManagement(seed=3, capture_events=False, **PARAMETERS)
+        recorder = History.HistoryRecorder(simulation, keyframe_interval=5)
+        simulation.run(max_turns=30)
+        replayed = [(state.turn, state.status_table(10)) for state in recorder.replay(4, 23)]
+        self.assertEqual(replayed, [(turn, recorder.seek(turn).status_table(10)) for turn in range(4, 24)])
+
+    def test_oldest_turns_are_forgotten(self):
+        simulation = TM.TransportManagement(seed=3, capture_events=False, **PARAMETERS)
+        recorder = History.HistoryRecorder(simulation, keyframe_interval=5, max_keyframes=2)
+        simulation.run(max_turns=22)
+        self.assertEqual((recorder.first_turn, recorder.last_turn), (15, 22))
+        self.assertIsNone(recorder.delta(15))
+        with self.assertRaises(ValueError):
+            recorder.seek(14)
+        with self.assertRaises(ValueError):
+            recorder.seek(23)
+
+    @unittest.skipIf(CE is None, "requires NumPy")
+    def test_columnar_engine_is_rejected(self):
+        with self.assertRaises(ValueError):
+            History.HistoryRecorder(CE.ColumnarTransportManagement(seed=1))
+
+
+if __name__ == "__main__":
+    unittest.main()
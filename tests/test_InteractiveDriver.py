@@ -0,0 +1,49 @@
+import unittest
+
+import InteractiveDriver as ID
+import SimulationListener as SL
+import TransportManagement as TM
+
+
+class FailingListener(SL.SimulationListener):
+    def __init__(self, failing_turn):
+        self.failing_turn = failing_turn
+        self.turns = 0
+
+    def turn_ended(self, simulation):
+        self.turns = self.turns + 1
+        if self.turns == self.failing_turn:
+            raise RuntimeError("listener failed")
+
+
+def answers(*replies):
+    replies = list(replies)
+    return lambda prompt: replies.pop(0) if replies else "q"
+
+
+class InteractiveDriverTest(unittest.TestCase):
+    def simulation(self):
+        return TM.TransportManagement(seed=2, initial_actors=10, initial_buses=2)
+
+    def test_failing_turn_is_raised(self):
+        simulation = self.simulation()
+        simulation.add_listener(FailingListener(2))
+        output = list()
+        driver = ID.InteractiveDriver(simulation, input_function=answers("", ""), output_function=output.append)
+        with self.assertRaises(RuntimeError):
+            driver.run()
+        self.assertEqual(driver.turns_shown, 1)
+
+    def test_at_most_one_turn_ahead(self):
+        simulation = self.simulation()
+        counter = FailingListener(None)
+        simulation.add_listener(counter)
+        output = list()
+        driver = ID.InteractiveDriver(simulation, input_function=answers("", "q"), output_function=output.append)
+        self.assertEqual(driver.run(), 2)
+        self.assertLessEqual(counter.turns, 3)
+        self.assertEqual(output[-1], "End of Commuter simulation.")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+
+from Locations import RouteNetwork
+import TransportManagement as TM
+
+
+class RouteNetworkTest(unittest.TestCase):
+    def test_unserved_stop_is_rejected(self):
+        description = {"stops": ["A", "B", "C", "Z"],
+                       "lines": [{"stops": ["A", "B", "C"], "destinations": ["A"]}]}
+        with self.assertRaises(ValueError) as context:
+            RouteNetwork.from_dict(description)
+        self.assertIn("Z", str(context.exception))
+
+    def test_served_stops_start_simulation(self):
+        network = RouteNetwork.from_dict({"stops": ["A", "B", "C"],
+                                          "lines": [{"stops": ["A", "B", "C"], "destinations": ["A"]}]})
+        self.assertEqual(network.sources, ("B", "C"))
+        simulation = TM.TransportManagement(initial_actors=40, network=network, seed=1, capture_events=False)
+        simulation.run(max_turns=3)
+
+    def test_line_without_stops_is_rejected(self):
+        with self.assertRaises(ValueError):
+            RouteNetwork(["A"], [("empty", [], [], True)])
+
+
+if __name__ == "__main__":
+    unittest.main()
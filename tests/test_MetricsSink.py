@@ -0,0 +1,48 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+import MetricsSink as MS
+import TransportManagement as TM
+
+
+class MetricsSinkTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_simulation(self, path, batch_size):
+        # No initial actors nor buses: the first batch has null travel times and no riders
+        simulation = TM.TransportManagement(seed=5, initial_actors=0, initial_buses=0, spawn_delay=10,
+                                            capture_events=False)
+        sink = MS.MetricsSink(simulation, path, batch_size=batch_size)
+        simulation.run(max_turns=40)
+        sink.close()
+        return simulation, sink
+
+    def test_csv_has_a_row_per_turn(self):
+        path = os.path.join(self.directory, "metrics.csv")
+        simulation, sink = self.run_simulation(path, 7)
+        with open(path) as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(len(rows), sink.rows)
+        self.assertEqual(sum(int(row["delivered"]) for row in rows), simulation.delivered)
+
+    @unittest.skipIf(MS.pa is None, "requires pyarrow")
+    def test_parquet_batches_with_different_values_share_a_schema(self):
+        import pyarrow.parquet as pq
+        path = os.path.join(self.directory, "metrics.parquet")
+        simulation, sink = self.run_simulation(path, 1)
+        table = pq.read_table(path)
+        self.assertEqual(table.schema, sink.schema)
+        self.assertEqual(table.num_rows, sink.rows)
+        self.assertEqual(sum(table.column("delivered").to_pylist()), simulation.delivered)
+        self.assertIsNone(table.column("mean_travel_time").to_pylist()[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
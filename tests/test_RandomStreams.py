@@ -0,0 +1,57 @@
+import json
+import unittest
+
+import Checkpoint
+import RandomStreams as RS
+
+
+class RandomStreamTest(unittest.TestCase):
+    def test_large_batch_is_not_buffered(self):
+        stream = RS.RandomStream(5)
+        stream.batch(10)
+        stream.batch(7 * RS.BUFFER_SIZE)
+        self.assertLessEqual(len(stream.buffer), RS.BUFFER_SIZE)
+
+    def test_batch_sizes_give_the_same_numbers(self):
+        small, large = RS.RandomStream(5), RS.RandomStream(5)
+        draws = list()
+        for _ in range(30):
+            draws.extend(small.batch(100))
+        self.assertEqual(large.batch(10) + large.batch(2990), draws)
+
+
+
+class PythonRandomStreamTest(RandomStreamTest):
+    """The same tests, and the ones of the child generator, without NumPy"""
+
+    def setUp(self):
+        self.numpy = RS._numpy
+        RS._numpy = False
+
+    def tearDown(self):
+        RS._numpy = self.numpy
+
+    def test_batches_do_not_shift_direct_draws(self):
+        mixed, separate = RS.RandomStream(5), RS.RandomStream(5)
+        mixed_batches = mixed.batch(3)
+        mixed_draws = [mixed.random() for _ in range(5)]
+        mixed_batches = mixed_batches + mixed.batch(2000)
+        mixed_draws = mixed_draws + [mixed.randrange(100) for _ in range(5)]
+
+        separate_batches = separate.batch(2003)
+        separate_draws = [separate.random() for _ in range(5)] + [separate.randrange(100) for _ in range(5)]
+        self.assertEqual(mixed_batches, separate_batches)
+        self.assertEqual(mixed_draws, separate_draws)
+
+    def test_state_survives_checkpoints(self):
+        streams = RS.RandomStreams(7)
+        streams.spawning.batch(10)
+        state = json.loads(json.dumps(Checkpoint.rng_state_to_json(streams.getstate())))
+        restored = RS.RandomStreams()
+        restored.setstate(Checkpoint.rng_state_from_json(state))
+        self.assertEqual(restored.spawning.batch(2000), streams.spawning.batch(2000))
+        self.assertEqual(restored.spawning.random(), streams.spawning.random())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+
+import Checkpoint
+import InteractiveDriver as ID
+import ShardedEngine as SE
+import TransportManagement as TM
+
+PARAMETERS = {"initial_actors": 300, "initial_buses": 4, "spawn_delay": 5, "seed": 11, "capture_events": False,
+              "trip_statistics": True}
+
+
+class CountingSpawns(object):
+    """Counts the commuters spawned after the initial population"""
+    spawned_commuters = 0
+
+    def spawn_actor(self):
+        actor = super(CountingSpawns, self).spawn_actor()
+        if actor.mark != "T":
+            self.spawned_commuters = self.spawned_commuters + 1
+        return actor
+
+
+class CountingTransportManagement(CountingSpawns, TM.TransportManagement):
+    pass
+
+
+class CountingShardedTransportManagement(CountingSpawns, SE.ShardedTransportManagement):
+    pass
+
+
+def sharded_bus_ids(simulation):
+    ids = list()
+    for metrics in simulation.broadcast(SE.METRICS, [()] * simulation.shards):
+        ids.extend(metrics["bus_ids"])
+    for buses in simulation.in_transit:
+        ids.extend(bus[0] for bus in buses)
+    return ids
+
+
+class ShardedInvariantsTest(unittest.TestCase):
+    def check_invariants(self, simulation, initial_commuters, bus_ids):
+        # Every commuter is either still in the simulation or has left with a recorded outcome
+        self.assertEqual(initial_commuters + simulation.spawned_commuters,
+                         simulation.commuters_count + simulation.trips.overall.count)
+        # Buses are only sent and destroyed in riots, and never share an id
+        self.assertEqual(len(bus_ids), len(set(bus_ids)))
+        self.assertEqual(len(bus_ids), PARAMETERS["initial_buses"] + simulation.buses_spawned - simulation.riots)
+        self.assertEqual(len(simulation.live_metrics()["riders"]), len(bus_ids))
+
+    def test_invariants_hold_in_both_engines(self):
+        single = CountingTransportManagement(**PARAMETERS)
+        initial_commuters = single.commuters_count
+        while single.simulation_on:
+            single.run(max_turns=1)
+            self.check_invariants(single, initial_commuters, [b.id for b in single.buses])
+
+        with CountingShardedTransportManagement(shards=3, **PARAMETERS) as sharded:
+            initial_commuters = sharded.commuters_count
+            turns = 0
+            while sharded.simulation_on and turns < 60:
+                turns = turns + sharded.run(max_turns=1)
+                if sharded.simulation_on:
+                    # The workers are stopped once the simulation ends
+                    self.check_invariants(sharded, initial_commuters, sharded_bus_ids(sharded))
+            metrics = sharded.metrics()
+            self.assertEqual(metrics["actors"] - sharded.commuters_count, sharded.live_metrics()["inspectors"])
+
+    def test_outcomes_are_alike(self):
+        single = TM.TransportManagement(**PARAMETERS)
+        single.run(max_turns=30)
+        with SE.ShardedTransportManagement(shards=2, **PARAMETERS) as sharded:
+            sharded.run(max_turns=30)
+            # Different random streams, the same order of magnitude of outcomes
+            for counter in ("delivered", "expelled", "tired"):
+                self.assertLess(abs(getattr(single, counter) - getattr(sharded, counter)),
+                                max(getattr(single, counter), getattr(sharded, counter)) / 2 + 20, counter)
+
+
+class ShardedRestrictionsTest(unittest.TestCase):
+    def test_unsupported_uses_are_rejected(self):
+        with self.assertRaises(ValueError):
+            SE.ShardedTransportManagement(capture_events=True)
+        with SE.ShardedTransportManagement(seed=1, shards=2) as simulation:
+            with self.assertRaises(ValueError):
+                Checkpoint.snapshot(simulation)
+            with self.assertRaises(ValueError):
+                simulation.status_table()
+            with self.assertRaises(ValueError):
+                ID.InteractiveDriver(simulation)
+
+
+class ShardedTripStatisticsTest(unittest.TestCase):
+    def test_trips_are_merged_while_running(self):
+        with SE.ShardedTransportManagement(seed=3, capture_events=False, trip_statistics=True, shards=2) as simulation:
+            simulation.run(max_turns=20)
+            self.assertTrue(simulation.simulation_on)
+            running_count = simulation.trips.overall.count
+            self.assertGreater(running_count, 0)
+            simulation.close()
+            self.assertEqual(simulation.trips.overall.count, running_count)
+
+
+
+class ShardedProfileTest(unittest.TestCase):
+    def test_profiles_of_the_shards_are_merged(self):
+        with SE.ShardedTransportManagement(seed=3, capture_events=False, profile=True, shards=2) as simulation:
+            simulation.run(max_turns=5)
+            profile = simulation.profiler.as_dict()
+            self.assertEqual(profile["turns"], 5)
+            self.assertEqual(profile["phases"]["movement"]["laps"], 2 * 5)
+            simulation.close()
+            self.assertEqual(simulation.profiler.as_dict()["phases"]["movement"]["laps"], 2 * 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
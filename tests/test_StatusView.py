@@ -0,0 +1,34 @@
+import unittest
+
+import StatusView as SV
+import TransportManagement as TM
+
+
+class StatusViewTest(unittest.TestCase):
+    def test_cached_view_matches_a_new_one(self):
+        simulation = TM.TransportManagement(seed=8, initial_actors=400, initial_buses=3, capture_events=False)
+        simulation.status_table()
+        for _ in range(25):
+            simulation.run(max_turns=1)
+            if simulation.riots:
+                break
+        self.assertGreater(simulation.riots + simulation.delivered, 0)
+        cached = simulation.status_view
+        self.assertEqual(cached.render(simulation.global_time, 50, 10),
+                         SV.StatusView(simulation).render(simulation.global_time, 50, 10))
+        self.assertEqual(cached.actor_ids, sorted(simulation.actors))
+        self.assertEqual(cached.bus_ids, sorted(b.id for b in simulation.buses))
+
+    def test_removed_ids_are_compacted(self):
+        ids = list(range(10))
+        removed = set()
+        for old_id in range(0, 8, 2):
+            SV.StatusView.remove_sorted(ids, removed, old_id)
+        self.assertEqual(len(ids), 10)
+        SV.StatusView.remove_sorted(ids, removed, 8)
+        self.assertEqual(ids, [1, 3, 5, 7, 9])
+        self.assertEqual(removed, set())
+
+
+if __name__ == "__main__":
+    unittest.main()
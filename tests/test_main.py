@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+import unittest
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+
+def run_main(arguments, user_input):
+    return subprocess.run([sys.executable, MAIN] + arguments, input=user_input, stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE, universal_newlines=True, timeout=60)
+
+
+class InteractiveTest(unittest.TestCase):
+    def test_quit_after_first_turn(self):
+        result = run_main(["--seed", "2"], "q\n")
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("Take care...", result.stdout)
+        self.assertTrue(result.stdout.rstrip().endswith("End of Commuter simulation."))
+
+    def test_end_of_input_quits(self):
+        result = run_main(["--seed", "2"], "\n\n")
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("End of Commuter simulation.", result.stdout)
+
+    def test_lookahead(self):
+        result = run_main(["--seed", "2", "--lookahead"], "\nq\n")
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("Take care...", result.stdout)
+
+
+if __name__ == "__main__":
+    unittest.main()